@@ -1 +1,6 @@
 from .metafeatures.metafeatures import Metafeatures
+from .metafeatures.cache import MetafeatureCache
+from .metafeatures.cost_model import CostModel
+from .metafeatures.profiling import Profile
+from .metafeatures.plan import MetafeaturePlan
+from .metafeatures.session import MetafeatureSession
@@ -0,0 +1,146 @@
+import os
+import sys
+
+
+ARROW_FILE_FORMATS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather"
+}
+
+
+def is_arrow_input(X):
+    """
+    Returns whether X is a pyarrow.Table or the path of a Parquet or Feather
+    file. pyarrow is only imported when X is a path.
+    """
+    if isinstance(X, (str, os.PathLike)):
+        ext = os.path.splitext(os.fspath(X))[1].lower()
+        return ext in ARROW_FILE_FORMATS
+    # a table can only exist if pyarrow was already imported
+    pa = sys.modules.get("pyarrow")
+    return pa is not None and isinstance(X, pa.Table)
+
+
+class ArrowSource(object):
+    """
+    A pyarrow.Table or a Parquet/Feather file whose columns are read on
+    demand. Files are memory mapped, so that only the bytes of the columns
+    read are loaded.
+    """
+
+    def __init__(self, source):
+        """
+        Parameters
+        ----------
+        source: pyarrow.Table or path of a file with a .parquet, .pq,
+            .feather or .arrow extension
+        """
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("Reading Arrow data requires pyarrow")
+        self._source = source
+        self._parquet_file = None
+        if isinstance(source, pyarrow.Table):
+            self._format = None
+            schema = source.schema
+        else:
+            ext = os.path.splitext(os.fspath(source))[1].lower()
+            self._format = ARROW_FILE_FORMATS[ext]
+            if self._format == "parquet":
+                import pyarrow.parquet as pq
+                self._parquet_file = pq.ParquetFile(source, memory_map=True)
+                schema = self._parquet_file.schema_arrow
+            else:
+                import pyarrow.ipc as ipc
+                with pyarrow.memory_map(os.fspath(source)) as f:
+                    schema = ipc.open_file(f).schema
+        pandas_metadata = schema.pandas_metadata or {}
+        # a RangeIndex is stored as a dict, other indexes as columns
+        self._index_columns = [
+            col for col in pandas_metadata.get("index_columns", [])
+            if isinstance(col, str)
+        ]
+        self._types = {
+            field.name: field.type for field in schema
+            if not field.name in self._index_columns
+        }
+        self.column_names = list(self._types)
+
+    def read(self, columns):
+        """
+        Reads `columns`, in this order, as a pandas.DataFrame with the index
+        the data was stored with. Numeric columns without nulls are converted
+        without copies.
+        """
+        if self._format is None:
+            table = self._source.select(list(columns) + self._index_columns)
+            return table.to_pandas(split_blocks=True)
+        elif self._format == "parquet":
+            import pyarrow.parquet as pq
+            table = pq.read_table(
+                self._source, columns=list(columns), memory_map=True,
+                use_pandas_metadata=True
+            )
+        else:
+            import pyarrow.feather as feather
+            table = feather.read_table(
+                self._source, columns=list(columns), memory_map=True
+            )
+        # the table is not referenced anywhere else, so its buffers can be
+        # released as the columns are converted
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+
+    def get_columns_with_values(self):
+        """
+        Returns the list of the columns with at least one non missing value,
+        in the order of `column_names`, without reading the columns of
+        files. Returns None when this is unknown, i.e. a Parquet file without
+        statistics, or a Feather file.
+        """
+        import pyarrow.types as types
+        if self._format is None:
+            import pyarrow.compute as pc
+            columns_with_values = []
+            for col in self.column_names:
+                column = self._source.column(col)
+                if types.is_floating(self._types[col]):
+                    # NaN values are missing in pandas, nulls are ignored
+                    has_values = pc.any(pc.invert(pc.is_nan(column))).as_py()
+                else:
+                    has_values = column.null_count < len(column)
+                if has_values:
+                    columns_with_values.append(col)
+            return columns_with_values
+        elif self._format == "parquet":
+            metadata = self._parquet_file.metadata
+            has_values = dict.fromkeys(self.column_names, False)
+            statistics_columns = set()
+            for i in range(metadata.num_row_groups):
+                row_group = metadata.row_group(i)
+                for j in range(row_group.num_columns):
+                    column = row_group.column(j)
+                    col = column.path_in_schema
+                    if not col in has_values or has_values[col]:
+                        continue
+                    statistics_columns.add(col)
+                    statistics = column.statistics
+                    if statistics is None or not statistics.has_null_count:
+                        return None
+                    if types.is_floating(self._types[col]):
+                        # NaN values are not nulls and are excluded from the
+                        # min and max
+                        has_values[col] = statistics.has_min_max
+                    else:
+                        has_values[col] = \
+                            statistics.null_count < row_group.num_rows
+            if (
+                metadata.num_row_groups > 0 and
+                len(statistics_columns) < len(self.column_names)
+            ):
+                # nested columns are stored as several leaf columns
+                return None
+            return [col for col in self.column_names if has_values[col]]
+        return None
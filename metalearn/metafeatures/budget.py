@@ -0,0 +1,135 @@
+import math
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+
+class TimeBudget(object):
+    """
+    The time that computing metafeatures may take: a deadline for all of
+    them, and a budget shared by the metafeatures of each group, see the
+    `time_budget` and `group_time_budgets` arguments of
+    `Metafeatures.compute`.
+    """
+
+    def __init__(self, time_budget=None, group_budgets=None):
+        """
+        Parameters
+        ----------
+        time_budget: float, default None. The number of seconds from now
+            until the deadline, None indicating no deadline.
+        group_budgets: dict, default None. A dict from each group to a
+            (seconds, metafeature_ids) tuple of the number of seconds that
+            may be spent computing the set of metafeature_ids.
+        """
+        self.deadline = None
+        if time_budget is not None:
+            self.deadline = time.time() + time_budget
+        if group_budgets is None:
+            group_budgets = {}
+        self._group_budgets = {
+            group: {"ids": metafeature_ids, "remaining": seconds}
+            for group, (seconds, metafeature_ids) in group_budgets.items()
+        }
+
+    def is_limited(self):
+        return self.deadline is not None or len(self._group_budgets) > 0
+
+    def is_grouped(self, metafeature_id):
+        """ Returns whether `metafeature_id` has the budget of a group. """
+        return any(
+            metafeature_id in budget["ids"]
+            for budget in self._group_budgets.values()
+        )
+
+    def call(self, metafeature_id, f):
+        """
+        Calls `f` in the time left for `metafeature_id`, charging the time
+        taken to the budgets of its groups.
+
+        Returns
+        -------
+        (True, the result of f), or (False, None) when no time is left or f
+        was interrupted, see `time_limit`.
+        """
+        budgets = [
+            budget for budget in self._group_budgets.values()
+            if metafeature_id in budget["ids"]
+        ]
+        time_limits = [budget["remaining"] for budget in budgets]
+        if self.deadline is not None:
+            time_limits.append(self.deadline - time.time())
+        seconds = min(time_limits, default=math.inf)
+        if seconds <= 0:
+            return False, None
+        start_timestamp = time.time()
+        try:
+            with time_limit(seconds):
+                completed, result = True, f()
+        except TimeLimitExceeded:
+            completed, result = False, None
+        elapsed_time = time.time() - start_timestamp
+        for budget in budgets:
+            budget["remaining"] -= elapsed_time
+        return completed, result
+
+
+class TimeLimitExceeded(BaseException):
+    """
+    Derives from BaseException, so that the `except Exception` clauses of the
+    kernels, e.g. around each fold of the landmarkers, do not turn a timeout
+    into a NaN value.
+    """
+    pass
+
+# the delay, in seconds, by which a timeout raised during an import is
+# postponed
+_IMPORT_RETRY_DELAY = 0.01
+
+def _is_importing(frame):
+    while frame is not None:
+        if frame.f_code.co_filename.startswith("<frozen importlib"):
+            return True
+        frame = frame.f_back
+    return False
+
+@contextmanager
+def time_limit(seconds):
+    """
+    Interrupts the enclosed code with TimeLimitExceeded after `seconds`,
+    when possible, i.e. in the main thread of a platform with SIGALRM. A
+    timeout during an import is postponed until the import finishes. The
+    previous SIGALRM handler and ITIMER_REAL timer are restored on exit,
+    the timer with the time elapsed in the enclosed code deducted.
+    """
+    if (
+        seconds == math.inf or not hasattr(signal, "setitimer") or
+        threading.current_thread() is not threading.main_thread()
+    ):
+        yield
+        return
+
+    def handler(signum, frame):
+        if _is_importing(frame):
+            signal.setitimer(signal.ITIMER_REAL, _IMPORT_RETRY_DELAY)
+        else:
+            raise TimeLimitExceeded()
+
+    start_timestamp = time.time()
+    previous_handler = signal.signal(signal.SIGALRM, handler)
+    previous_delay, previous_interval = signal.setitimer(
+        signal.ITIMER_REAL, seconds
+    )
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+        if previous_delay > 0:
+            # a timer that expired meanwhile fires right away
+            signal.setitimer(
+                signal.ITIMER_REAL, max(
+                    previous_delay - (time.time() - start_timestamp), 1e-6
+                ), previous_interval
+            )
@@ -0,0 +1,189 @@
+import os
+import glob
+import json
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError: # not available on windows
+    fcntl = None
+
+
+class MetafeatureCache(object):
+    """
+    A persistent, content-addressed cache of computed metafeatures. Each entry
+    is a json file named by a fingerprint of the dataset, the compute
+    parameters and the version of the metafeature implementations, holding
+    the values of every metafeature computed so far for that key. Entries are
+    evicted least recently used first once the cache grows beyond `max_size`
+    bytes. Writes are atomic and serialized with a file lock, so the cache can
+    be shared by several processes.
+    """
+
+    EXTENSION = ".json"
+    LOCK_FILENAME = ".lock"
+
+    def __init__(self, cache_dir, max_size=2**30):
+        """
+        Parameters
+        ----------
+        cache_dir: str, the directory holding the cache entries. It is created
+            if it does not exist.
+        max_size: int, default 1GiB. The maximum total size of the entries in
+            bytes.
+        """
+        if not type(max_size) is int or max_size < 1:
+            raise ValueError(
+                f"`max_size` must be a positive integer, not {max_size}"
+            )
+        self.cache_dir = os.fspath(cache_dir)
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get_key(self, X, Y, parameters):
+        """
+        Returns the cache key of the dataset (X, Y), computed with the compute
+        arguments `parameters`, a json serializable dict.
+        """
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(get_version_hash().encode())
+        hasher.update(json.dumps(
+            parameters, sort_keys=True, default=_json_default
+        ).encode())
+        _update_dataframe_hash(hasher, X)
+        if Y is not None:
+            _update_dataframe_hash(hasher, Y.to_frame())
+        return hasher.hexdigest()
+
+    def get(self, key):
+        """
+        Returns a dict of the metafeatures cached under `key`, which is empty
+        when there is no entry for the key.
+        """
+        path = self._get_path(key)
+        try:
+            with open(path, "r") as f:
+                metafeatures = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        try:
+            os.utime(path) # mark as recently used
+        except FileNotFoundError:
+            pass
+        return metafeatures
+
+    def update(self, key, metafeatures):
+        """
+        Adds `metafeatures` to the entry for `key`, keeping any metafeatures
+        cached by other processes in the meantime, then evicts the least
+        recently used entries if the cache is over its size limit.
+        """
+        with self._lock():
+            cached_metafeatures = self.get(key)
+            cached_metafeatures.update(metafeatures)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=self.cache_dir, suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(cached_metafeatures, f)
+                os.replace(tmp_path, self._get_path(key))
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            self._evict()
+
+    def clear(self):
+        """ Removes every entry from the cache. """
+        with self._lock():
+            for path in self._get_entry_paths():
+                os.remove(path)
+
+    def _evict(self):
+        entries = []
+        for path in self._get_entry_paths():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            os.remove(path)
+            total_size -= size
+
+    def _get_path(self, key):
+        return os.path.join(self.cache_dir, key + self.EXTENSION)
+
+    def _get_entry_paths(self):
+        return glob.glob(os.path.join(self.cache_dir, "*" + self.EXTENSION))
+
+    @contextmanager
+    def _lock(self):
+        lock_path = os.path.join(self.cache_dir, self.LOCK_FILENAME)
+        with open(lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+_version_hash = None
+
+def get_version_hash():
+    """
+    Returns a hash of metafeatures.json, the source of the metafeature
+    implementations and the versions of the libraries they depend on, so
+    that cache entries are invalidated whenever any of them changes.
+    """
+    global _version_hash
+    if _version_hash is None:
+        import sklearn
+        import scipy
+        hasher = hashlib.blake2b(digest_size=20)
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        paths = sorted(
+            glob.glob(os.path.join(package_dir, "*.py")) +
+            glob.glob(os.path.join(package_dir, "*.json"))
+        )
+        for path in paths:
+            with open(path, "rb") as f:
+                hasher.update(f.read())
+        for module in [np, pd, sklearn, scipy]:
+            hasher.update(module.__version__.encode())
+        _version_hash = hasher.hexdigest()
+    return _version_hash
+
+def _update_dataframe_hash(hasher, dataframe):
+    hasher.update(str(dataframe.shape).encode())
+    hasher.update(pd.util.hash_pandas_object(dataframe.index).values.tobytes())
+    for col_name in dataframe.columns:
+        series = dataframe[col_name]
+        hasher.update(repr((col_name, str(series.dtype))).encode())
+        if (
+            isinstance(series.dtype, np.dtype) and
+            series.dtype.kind in "biufcmM"
+        ):
+            # hash the raw buffer of numpy numeric columns directly, while
+            # extension arrays, e.g. nullable integers or tz-aware datetimes,
+            # are hashed by value below
+            hasher.update(np.ascontiguousarray(series.values).view(np.uint8))
+        else:
+            hasher.update(
+                pd.util.hash_pandas_object(series, index=False).values
+            )
+
+def _json_default(obj):
+    if isinstance(obj, np.integer):
+        return int(obj)
+    return str(obj)
@@ -1,3 +1,7 @@
+import os
+import sys
+import tempfile
+
 import numpy as np
 import pandas as pd
 
@@ -22,6 +26,134 @@ def profile_distribution(data):
         dist_min, dist_quartile1, dist_quartile2, dist_quartile3, dist_max = np.percentile(data, [0,25,50,75,100])
     return (dist_mean, dist_stdev, dist_min, dist_quartile1, dist_quartile2, dist_quartile3, dist_max)
 
+def get_moments(values):
+    """
+    Computes the count, mean and the sums of the second, third and fourth
+    powers of the deviations from the mean of every column of a 2-D array,
+    ignoring NaNs. All columns are processed together, the mean in a first
+    sweep over the array and the central sums in a second one.
+
+    Parameters
+    ----------
+    values: 2-D array of real values, one column per feature
+
+    Returns
+    -------
+    (count, mean, m2, m3, m4), each an array with one entry per column
+    """
+    # column-major, so that each column is reduced as a contiguous block, in
+    # the same order as when reducing it on its own
+    values = np.array(values, dtype=np.float64, order="F")
+    mask = np.isnan(values)
+    count = values.shape[0] - mask.sum(axis=0)
+    np.putmask(values, mask, 0.)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = values.sum(axis=0) / count
+    values -= mean
+    np.putmask(values, mask, 0.)
+    adjusted2 = values**2
+    m2 = adjusted2.sum(axis=0)
+    m3 = (adjusted2 * values).sum(axis=0)
+    m4 = (adjusted2**2).sum(axis=0)
+    return (count, mean, m2, m3, m4)
+
+def merge_moments(moments_a, moments_b):
+    """
+    Combines the output of `get_moments` on two disjoint sets of rows into
+    the moments of their union, using the pairwise update formulas of Pebay
+    (2008).
+    """
+    count_a, mean_a, m2_a, m3_a, m4_a = moments_a
+    count_b, mean_b, m2_b, m3_b, m4_b = moments_b
+    count = count_a + count_b
+    with np.errstate(invalid="ignore", divide="ignore"):
+        delta = mean_b - mean_a
+        n = count.astype(np.float64)
+        mean = mean_a + delta * count_b / n
+        m2 = m2_a + m2_b + delta**2 * count_a * count_b / n
+        m3 = (
+            m3_a + m3_b +
+            delta**3 * count_a * count_b * (count_a - count_b) / n**2 +
+            3 * delta * (count_a * m2_b - count_b * m2_a) / n
+        )
+        m4 = (
+            m4_a + m4_b +
+            delta**4 * count_a * count_b * (
+                count_a**2 - count_a * count_b + count_b**2
+            ) / n**3 +
+            6 * delta**2 * (count_a**2 * m2_b + count_b**2 * m2_a) / n**2 +
+            4 * delta * (count_a * m3_b - count_b * m3_a) / n
+        )
+    merged = [mean, m2, m3, m4]
+    for i, (a, b) in enumerate(zip(moments_a[1:], moments_b[1:])):
+        merged[i] = np.where(
+            count_a == 0, b, np.where(count_b == 0, a, merged[i])
+        )
+    return (count,) + tuple(merged)
+
+def get_moment_statistics(count, mean, m2, m3, m4):
+    """
+    Computes the mean, the standard deviation and the bias corrected skewness
+    and kurtosis of each column from the output of `get_moments`, the same way
+    pandas.Series.mean, std, skew and kurtosis do.
+
+    Returns
+    -------
+    (mean, stdev, skewness, kurtosis), each an array with one entry per column
+    """
+    count = np.asarray(count, dtype=np.float64)
+    m2 = _zero_out_fperr(m2)
+    m3 = _zero_out_fperr(m3)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stdev = np.sqrt(m2 / (count - 1))
+        stdev[count <= 1] = np.nan
+
+        skewness = (count * (count - 1) ** 0.5 / (count - 2)) * (m3 / m2**1.5)
+        skewness = np.where(m2 == 0, 0, skewness)
+        skewness[count < 3] = np.nan
+
+        adj = 3 * (count - 1) ** 2 / ((count - 2) * (count - 3))
+        numerator = _zero_out_fperr(count * (count + 1) * (count - 1) * m4)
+        denominator = _zero_out_fperr((count - 2) * (count - 3) * m2**2)
+        kurtosis = numerator / denominator - adj
+        kurtosis = np.where(denominator == 0, 0, kurtosis)
+        kurtosis[count < 4] = np.nan
+    return (mean, stdev, skewness, kurtosis)
+
+def _zero_out_fperr(arg):
+    return np.where(np.abs(arg) < 1e-14, 0, arg)
+
+def get_codes(values):
+    """
+    Encodes a 1-D array-like of values as integer codes.
+
+    Returns
+    -------
+    (codes, n_values), where codes holds the index of each value among the
+    n_values distinct values, or -1 where the value is missing
+    """
+    codes, uniques = pd.factorize(values)
+    return (codes, len(uniques))
+
+def get_contingency_table_from_codes(codes_x, n_values_x, codes_y, n_values_y):
+    """
+    Counts the co-occurrences of the values of two encoded variables (see
+    `get_codes`) with a single bincount, ignoring the pairs where either value
+    is missing. Values that co-occur with no value of the other variable are
+    left out, as in sklearn.metrics.cluster.contingency_matrix.
+
+    Returns
+    -------
+    a 2-D array of counts, with one row per value of x and one column per
+    value of y
+    """
+    valid = (codes_x >= 0) & (codes_y >= 0)
+    table = np.bincount(
+        codes_x[valid] * n_values_y + codes_y[valid],
+        minlength=n_values_x * n_values_y
+    ).reshape(n_values_x, n_values_y)
+    return table[table.any(axis=1)][:, table.any(axis=0)]
+
 def get_numeric_features(dataframe, column_types):
     return [feature for feature in dataframe.columns if column_types[feature] == "NUMERIC"]
 
@@ -30,3 +162,56 @@ def get_categorical_features(dataframe, column_types):
 
 def dtype_is_numeric(dtype):
     return "int" in str(dtype) or "float" in str(dtype)
+
+def get_nbytes(value):
+    """
+    Estimates the number of bytes held by a resource: the buffers of numpy
+    arrays, pandas objects and scipy.sparse matrices, summed over lists,
+    tuples and dicts. Shared buffers are counted once per reference, arrays
+    memory-mapped by `spill` count for nothing, and other objects count for
+    their shallow size.
+    """
+    if isinstance(value, np.memmap):
+        return 0
+    elif isinstance(value, np.ndarray):
+        return value.nbytes
+    elif isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    elif isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=False))
+    elif hasattr(value, "nnz") and hasattr(value, "data"): # scipy.sparse
+        return sum(
+            getattr(value, attribute).nbytes
+            for attribute in ["data", "indices", "indptr"]
+            if hasattr(value, attribute)
+        )
+    elif isinstance(value, (list, tuple)):
+        return sum(get_nbytes(item) for item in value)
+    elif isinstance(value, dict):
+        return sum(get_nbytes(item) for item in value.values())
+    else:
+        return sys.getsizeof(value)
+
+def spill(value, directory):
+    """
+    Moves the numeric numpy arrays of a resource, possibly nested in lists,
+    tuples and dicts, to read-only memory-mapped files in `directory`, so
+    that the operating system pages them in from disk when they are used.
+    Other values are returned as they are.
+    """
+    if (
+        isinstance(value, np.ndarray) and not isinstance(value, np.memmap) and
+        value.dtype.kind in "biufc" and value.size > 0
+    ):
+        fd, path = tempfile.mkstemp(suffix=".npy", dir=directory)
+        os.close(fd)
+        np.save(path, value)
+        return np.load(path, mmap_mode="r")
+    elif isinstance(value, list):
+        return [spill(item, directory) for item in value]
+    elif isinstance(value, tuple):
+        return tuple(spill(item, directory) for item in value)
+    elif isinstance(value, dict):
+        return {key: spill(item, directory) for key, item in value.items()}
+    else:
+        return value
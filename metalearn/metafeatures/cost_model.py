@@ -0,0 +1,186 @@
+import os
+import json
+import math
+
+import numpy as np
+
+
+class CostModel(object):
+    """
+    Predicts the time taken to compute each resource of metafeatures.json
+    from the shape of the data it is computed on. The exclusive compute time
+    of a resource, without its arguments, is modeled as log-linear in the
+    number of rows, numeric features, categorical features and classes, the
+    mean cardinality of the categorical features and the fraction of missing
+    values. The coefficients are fit by least squares on observed compute
+    times, so the model can be recalibrated on any hardware by passing it to
+    `Metafeatures.compute` and calling `fit`.
+    """
+
+    DEFAULT_PATH = os.path.join(os.path.dirname(__file__), "cost_model.json")
+    # a model calibrated on this machine, used instead of the shipped one
+    # when it exists
+    USER_PATH = os.path.join(
+        os.environ.get(
+            "XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")
+        ), "metalearn", "cost_model.json"
+    )
+    FEATURE_NAMES = [
+        "n_rows", "n_numeric_features", "n_categorical_features",
+        "mean_cardinality", "missing_fraction", "n_classes"
+    ]
+    # observed times are clipped to this many seconds before taking the log
+    MIN_TIME = 1e-6
+
+    def __init__(self, coefficients=None, ridge=1e-3):
+        """
+        Parameters
+        ----------
+        coefficients: dict, default None. A dict from resource id to the
+            coefficients of its model, as returned by `get_coefficients`.
+            None loads the coefficients saved to `USER_PATH` when they
+            exist, e.g. by calibrating the model on this machine, and those
+            shipped with metalearn otherwise.
+        ridge: float, default 1e-3. The ridge penalty used by `fit`, which
+            keeps the fit stable when the observations do not vary some
+            feature.
+        """
+        if coefficients is None:
+            path = self.USER_PATH
+            if not os.path.isfile(path):
+                path = self.DEFAULT_PATH
+            with open(path, "r") as f:
+                coefficients = json.load(f)
+        self.coefficients = {
+            resource_id: np.asarray(resource_coefficients, dtype=np.float64)
+            for resource_id, resource_coefficients in coefficients.items()
+        }
+        self.ridge = ridge
+        self.observations = []
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.get_coefficients(), f, indent=4, sort_keys=True)
+
+    def get_coefficients(self):
+        return {
+            resource_id: resource_coefficients.tolist()
+            for resource_id, resource_coefficients in self.coefficients.items()
+        }
+
+    @classmethod
+    def get_dataset_features(cls, X, Y, column_types):
+        """
+        Returns the dict of the features of the cost model describing the
+        pandas.DataFrame X and the targets Y.
+        """
+        categorical_columns = [
+            col for col in X.columns if column_types[col] == "CATEGORICAL"
+        ]
+        cardinalities = [X[col].nunique() for col in categorical_columns]
+        n_values = X.shape[0] * X.shape[1]
+        return {
+            "n_rows": X.shape[0],
+            "n_numeric_features": X.shape[1] - len(categorical_columns),
+            "n_categorical_features": len(categorical_columns),
+            "mean_cardinality": float(np.mean(cardinalities))
+                if len(cardinalities) > 0 else 0.,
+            "missing_fraction": float(X.isnull().values.sum() / n_values)
+                if n_values > 0 else 0.,
+            "n_classes": 0 if Y is None else Y.nunique()
+        }
+
+    @classmethod
+    def get_sample_features(cls, dataset_features, sample_shape):
+        """
+        Returns the expected features of a uniform sample of `sample_shape`
+        drawn from a dataset with `dataset_features`. The cardinality of a
+        categorical feature in the sample is that of a column with uniformly
+        distributed values.
+        """
+        n_rows = dataset_features["n_rows"]
+        n_features = (
+            dataset_features["n_numeric_features"] +
+            dataset_features["n_categorical_features"]
+        )
+        features = dict(dataset_features)
+        if sample_shape[0] is not None and sample_shape[0] < n_rows:
+            features["n_rows"] = sample_shape[0]
+            cardinality = dataset_features["mean_cardinality"]
+            if cardinality > 1:
+                features["mean_cardinality"] = cardinality * (
+                    1 - (1 - 1 / cardinality)**sample_shape[0]
+                )
+        if sample_shape[1] is not None and sample_shape[1] < n_features:
+            fraction = sample_shape[1] / n_features
+            features["n_numeric_features"] = \
+                dataset_features["n_numeric_features"] * fraction
+            features["n_categorical_features"] = \
+                dataset_features["n_categorical_features"] * fraction
+        return features
+
+    def predict(self, resource_id, features):
+        """
+        Returns the predicted exclusive compute time in seconds of
+        `resource_id` on data with the given features, or 0 for resources the
+        model has no coefficients for.
+        """
+        if not resource_id in self.coefficients:
+            return 0.
+        return float(np.exp(
+            self._get_regressors(features) @ self.coefficients[resource_id]
+        ))
+
+    def observe(self, features, compute_times):
+        """
+        Records the exclusive compute time in seconds of each resource in the
+        dict `compute_times`, computed on data with the given features, for
+        the next call to `fit`.
+        """
+        self.observations.append((dict(features), dict(compute_times)))
+
+    def fit(self, observations=None):
+        """
+        Fits the model of every resource in `observations`, a list of
+        (features, compute_times) pairs as given to `observe`. Defaults to
+        the observations recorded so far. The models of resources that were
+        not observed are kept.
+        """
+        if observations is None:
+            observations = self.observations
+        resource_observations = {}
+        for features, compute_times in observations:
+            regressors = self._get_regressors(features)
+            for resource_id, compute_time in compute_times.items():
+                resource_observations.setdefault(resource_id, []).append(
+                    (regressors, math.log(max(compute_time, self.MIN_TIME)))
+                )
+        for resource_id, samples in resource_observations.items():
+            A = np.array([regressors for regressors, _ in samples])
+            b = np.array([log_time for _, log_time in samples])
+            # the intercept is not penalized
+            penalty = self.ridge * np.eye(A.shape[1])
+            penalty[0, 0] = 0.
+            self.coefficients[resource_id] = np.linalg.solve(
+                A.T @ A + penalty * len(samples), A.T @ b
+            )
+        return self
+
+    def _get_regressors(self, features):
+        return np.array([
+            1.,
+            math.log(max(features["n_rows"], 1)),
+            math.log1p(features["n_numeric_features"]),
+            math.log1p(features["n_categorical_features"]),
+            math.log1p(features["mean_cardinality"]),
+            math.log1p(features["n_classes"]),
+            features["missing_fraction"]
+        ])
@@ -1,9 +1,13 @@
+import numpy as np
 import pandas as pd
-from scipy.stats import entropy
-from sklearn.metrics import mutual_info_score
 
 from .common_operations import *
 
+def entropy(counts):
+    # scipy.stats takes long to import, so it is imported on first use
+    from scipy.stats import entropy
+    return entropy(counts)
+
 def get_entropy(col):
     return entropy(col.value_counts())
 
@@ -12,18 +16,33 @@ def get_class_entropy(Y_sample):
 
 def get_attribute_entropy(feature_array):
     entropies = [get_entropy(feature) for feature in feature_array]
-    mean_attribute_entropy, _, min_attribute_entropy, quartile1_attribute_entropy, quartile2_attribute_entropy, quartile3_attribute_entropy, max_attribute_entropy = profile_distribution(entropies)
-    return (mean_attribute_entropy, min_attribute_entropy, quartile1_attribute_entropy, quartile2_attribute_entropy, quartile3_attribute_entropy, max_attribute_entropy)
+    return profile_information_measures(entropies)
+
+def get_attribute_entropy_from_codes(feature_codes):
+    entropies = [entropy(np.bincount(codes[codes >= 0], minlength=n_values)) for codes, n_values in feature_codes]
+    return profile_information_measures(entropies)
 
 def get_joint_entropy(feature_class_array):
-    entropies = [get_entropy(feature_class_pair[0].astype(str) + feature_class_pair[1].astype(str)) for feature_class_pair in feature_class_array]
-    mean_joint_entropy, _, min_joint_entropy, quartile1_joint_entropy, quartile2_joint_entropy, quartile3_joint_entropy, max_joint_entropy = profile_distribution(entropies)
-    return (mean_joint_entropy, min_joint_entropy, quartile1_joint_entropy, quartile2_joint_entropy, quartile3_joint_entropy, max_joint_entropy)
+    return get_joint_entropy_from_contingency_tables(_get_contingency_tables(feature_class_array))
+
+def get_joint_entropy_from_contingency_tables(contingency_tables):
+    entropies = [entropy(table.ravel()) for table in contingency_tables]
+    return profile_information_measures(entropies)
 
 def get_mutual_information(feature_class_array):
-    mi_scores = [mutual_info_score(*feature_class_pair) for feature_class_pair in feature_class_array]
-    mean_mutual_information, _, min_mutual_information, quartile1_mutual_information, quartile2_mutual_information, quartile3_mutual_information, max_mutual_information = profile_distribution(mi_scores)
-    return (mean_mutual_information, min_mutual_information, quartile1_mutual_information, quartile2_mutual_information, quartile3_mutual_information, max_mutual_information)
+    return get_mutual_information_from_contingency_tables(_get_contingency_tables(feature_class_array))
+
+def get_mutual_information_from_contingency_tables(contingency_tables):
+    from sklearn.metrics import mutual_info_score
+    mi_scores = [mutual_info_score(None, None, contingency=table) for table in contingency_tables]
+    return profile_information_measures(mi_scores)
+
+def _get_contingency_tables(feature_class_array):
+    return [get_contingency_table_from_codes(*get_codes(feature), *get_codes(labels)) for feature, labels in feature_class_array]
+
+def profile_information_measures(values):
+    mean_value, _, min_value, quartile1_value, quartile2_value, quartile3_value, max_value = profile_distribution(values)
+    return (mean_value, min_value, quartile1_value, quartile2_value, quartile3_value, max_value)
 
 def get_equivalent_number_features(class_entropy, mutual_information):
     if mutual_information == 0:
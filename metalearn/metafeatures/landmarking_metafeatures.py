@@ -1,9 +1,11 @@
+import warnings
+
 import numpy as np
 from pandas import DataFrame
+from scipy.sparse import csr_matrix, issparse
+from sklearn.base import clone
 from sklearn.pipeline import Pipeline
-from sklearn.model_selection import cross_validate, StratifiedKFold
-from sklearn.metrics import make_scorer, accuracy_score, cohen_kappa_score
-from sklearn.neighbors import KNeighborsClassifier
+from sklearn.model_selection import StratifiedKFold
 from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
 from sklearn.naive_bayes import GaussianNB
 from sklearn.tree import DecisionTreeClassifier
@@ -20,50 +22,340 @@ Decision Node, Random Node.
 
 '''
 
-def run_pipeline(X, Y, pipeline, n_folds, cv_seed):
-    accuracy_scorer = make_scorer(accuracy_score)
-    kappa_scorer = make_scorer(cohen_kappa_score)
+# the maximum size in bytes of a block of the distance matrix
+NEAREST_NEIGHBORS_BLOCK_SIZE = 2**26
+NEAREST_NEIGHBORS_RECALL_SAMPLE_SIZE = 1000
+APPROXIMATE_NEAREST_NEIGHBORS_PROBES = 8
+
+class SparseGaussianNB(GaussianNB):
+    """
+    GaussianNB that also fits and predicts scipy.sparse matrices, without
+    densifying them.
+    """
+
+    def fit(self, X, y):
+        if not issparse(X):
+            return super().fit(X, y)
+        X = csr_matrix(X, dtype=np.float64)
+        self.classes_, y_codes = np.unique(y, return_inverse=True)
+        n_classes = len(self.classes_)
+        class_indicators = csr_matrix(
+            (np.ones(len(y_codes)), (y_codes, np.arange(len(y_codes)))),
+            shape=(n_classes, len(y_codes))
+        )
+        self.class_count_ = np.bincount(y_codes, minlength=n_classes).astype(
+            np.float64
+        )
+        self.class_prior_ = self.class_count_ / self.class_count_.sum()
+        class_means = (class_indicators @ X).toarray() / \
+            self.class_count_[:, np.newaxis]
+        class_square_means = (class_indicators @ X.multiply(X)).toarray() / \
+            self.class_count_[:, np.newaxis]
+        mean = np.asarray(X.mean(axis=0)).ravel()
+        square_mean = np.asarray(X.multiply(X).mean(axis=0)).ravel()
+        self.epsilon_ = self.var_smoothing * np.max(square_mean - mean**2)
+        self.theta_ = class_means
+        self.var_ = np.maximum(class_square_means - class_means**2, 0) + \
+            self.epsilon_
+        return self
+
+    def predict(self, X):
+        if not issparse(X):
+            return super().predict(X)
+        X = csr_matrix(X, dtype=np.float64)
+        # the gaussian log likelihood, expanding (x - theta)**2 so that only
+        # the non-zero entries of X are visited
+        joint_log_likelihood = (
+            np.log(self.class_prior_) -
+            0.5 * np.sum(np.log(2. * np.pi * self.var_), axis=1) -
+            0.5 * np.sum(self.theta_**2 / self.var_, axis=1) -
+            0.5 * (X.multiply(X) @ (1. / self.var_).T) +
+            X @ (self.theta_ / self.var_).T
+        )
+        return self.classes_[np.argmax(joint_log_likelihood, axis=1)]
+
+
+def get_cv_folds(X, Y, n_folds, cv_seed):
+    """
+    Converts the landmarking data to arrays, encodes the classes as integer
+    codes and splits the data into stratified cross validation folds, once
+    for all the landmarkers.
+
+    Returns
+    -------
+    a dict holding the features "X", the class codes "Y", the number of
+    classes "n_classes" and the (train indices, test indices) of each fold
+    "folds"
+    """
+    if not issparse(X):
+        X = X.values
+    # sorted like the classes_ of the sklearn classifiers, so that ties are
+    # broken the same way as when fitting the labels themselves
+    classes, Y_codes = np.unique(Y.values, return_inverse=True)
     cv = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=cv_seed)
-    scores = cross_validate(
-        pipeline, X.values, Y.values, cv=cv, n_jobs=1, scoring={
-            'accuracy': accuracy_scorer, 'kappa': kappa_scorer
-        }
-    )
-    err_rate = 1. - np.mean(scores['test_accuracy'])
-    kappa = np.mean(scores['test_kappa'])
+    return {
+        "X": X, "Y": Y_codes, "n_classes": len(classes),
+        "folds": list(cv.split(np.zeros(len(Y_codes)), Y_codes))
+    }
+
+def get_confusion_matrix(Y_true, Y_pred, n_classes):
+    return np.bincount(
+        Y_true * n_classes + Y_pred, minlength=n_classes**2
+    ).reshape(n_classes, n_classes)
+
+def get_kappa(confusion_matrix):
+    """ Cohen's kappa, as sklearn.metrics.cohen_kappa_score """
+    n_classes = confusion_matrix.shape[0]
+    expected = np.outer(
+        confusion_matrix.sum(axis=1), confusion_matrix.sum(axis=0)
+    ) / confusion_matrix.sum()
+    weights = np.ones((n_classes, n_classes)) - np.eye(n_classes)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k = np.sum(weights * confusion_matrix) / np.sum(weights * expected)
+    return 1 - k
+
+def run_pipeline(pipeline, cv_folds, accepts_sparse=True):
+    """
+    Fits a clone of pipeline on the training data of each fold and derives
+    the error rate and Cohen's kappa from the confusion matrix of a single
+    prediction of the test data. As in sklearn.model_selection.cross_validate,
+    a fold whose fit fails scores NaN with a warning.
+    """
+    X, Y, n_classes = cv_folds["X"], cv_folds["Y"], cv_folds["n_classes"]
+    if issparse(X) and not accepts_sparse:
+        X = X.toarray()
+    accuracies = []
+    kappas = []
+    fit_errors = []
+    for train_indices, test_indices in cv_folds["folds"]:
+        try:
+            estimator = clone(pipeline).fit(X[train_indices], Y[train_indices])
+            Y_pred = estimator.predict(X[test_indices])
+        except Exception as e:
+            fit_errors.append(e)
+            accuracies.append(np.nan)
+            kappas.append(np.nan)
+            continue
+        confusion_matrix = get_confusion_matrix(
+            Y[test_indices], Y_pred, n_classes
+        )
+        accuracies.append(np.trace(confusion_matrix) / confusion_matrix.sum())
+        kappas.append(get_kappa(confusion_matrix))
+    if len(fit_errors) == len(cv_folds["folds"]):
+        raise fit_errors[-1]
+    elif len(fit_errors) > 0:
+        warnings.warn(
+            f"{len(fit_errors)} fits failed out of {len(accuracies)}: " +
+            repr(fit_errors[-1])
+        )
+    err_rate = 1. - np.mean(accuracies)
+    kappa = np.mean(kappas)
     return (err_rate, kappa)
 
-def get_naive_bayes(X, Y, n_folds, cv_seed):
-    pipeline = Pipeline([('naive_bayes', GaussianNB())])
-    return run_pipeline(X, Y, pipeline, n_folds, cv_seed)
+def get_naive_bayes(cv_folds):
+    pipeline = Pipeline([('naive_bayes', SparseGaussianNB())])
+    return run_pipeline(pipeline, cv_folds)
 
-def get_knn_1(X, Y, n_folds, cv_seed):
-    pipeline = Pipeline([(
-        'knn_1', KNeighborsClassifier(n_neighbors = 1, n_jobs=1)
-    )])
-    return run_pipeline(X, Y, pipeline, n_folds, cv_seed)
+def get_knn_1(cv_folds, nearest_neighbors):
+    Y, n_classes = cv_folds["Y"], cv_folds["n_classes"]
+    Y_pred = Y[nearest_neighbors["neighbors"]]
+    accuracies = []
+    kappas = []
+    for _, test_indices in cv_folds["folds"]:
+        confusion_matrix = get_confusion_matrix(
+            Y[test_indices], Y_pred[test_indices], n_classes
+        )
+        accuracies.append(np.trace(confusion_matrix) / confusion_matrix.sum())
+        kappas.append(get_kappa(confusion_matrix))
+    err_rate = 1. - np.mean(accuracies)
+    kappa = np.mean(kappas)
+    return (err_rate, kappa)
+
+def get_nearest_neighbors(cv_folds, approximate, seed):
+    """
+    Finds the euclidean nearest neighbor of every instance among the training
+    instances of its cross validation fold, i.e. the instances of the other
+    folds, for all the folds at once. The exact search computes blocks of
+    the distances from the instances of each fold to the instances of the
+    other folds of at most NEAREST_NEIGHBORS_BLOCK_SIZE bytes, and breaks
+    ties as sklearn's brute force search, by the lowest index.
+
+    The approximate search is an inverted file index: the instances are
+    assigned to the nearest of sqrt(n) centroids drawn at random, and each
+    instance is compared only with the instances of its
+    APPROXIMATE_NEAREST_NEIGHBORS_PROBES nearest centroids. Its recall, the
+    fraction of instances whose neighbor is a true nearest neighbor, is
+    estimated on a random sample of NEAREST_NEIGHBORS_RECALL_SAMPLE_SIZE
+    instances searched exactly.
+
+    Returns
+    -------
+    a dict holding the index of the neighbor of every instance "neighbors",
+    and the estimated "recall", None for the exact search
+    """
+    X = cv_folds["X"].astype(np.float64, copy=False)
+    n_instances = X.shape[0]
+    fold_ids = np.empty(n_instances, dtype=np.intp)
+    for fold_id, (_, test_indices) in enumerate(cv_folds["folds"]):
+        fold_ids[test_indices] = fold_id
+    squared_norms = _get_squared_norms(X)
+    if not approximate:
+        neighbors, _ = _search_exact(
+            X, squared_norms, fold_ids, np.arange(n_instances)
+        )
+        return {"neighbors": neighbors, "recall": None}
+
+    random_state = np.random.RandomState(seed)
+    neighbors, distances = _search_approximate(
+        X, squared_norms, fold_ids, random_state
+    )
+    sample_indices = random_state.choice(
+        n_instances, min(n_instances, NEAREST_NEIGHBORS_RECALL_SAMPLE_SIZE),
+        replace=False
+    )
+    _, exact_distances = _search_exact(
+        X, squared_norms, fold_ids, sample_indices
+    )
+    recall = np.mean(np.isclose(
+        distances[sample_indices] + squared_norms[sample_indices],
+        exact_distances + squared_norms[sample_indices],
+        rtol=1e-7, atol=1e-12
+    ))
+    return {"neighbors": neighbors, "recall": float(recall)}
+
+def _get_squared_norms(X):
+    if issparse(X):
+        return np.asarray(X.multiply(X).sum(axis=1)).ravel()
+    return np.einsum("ij,ij->i", X, X)
+
+def _get_distances(X_queries, X_candidates, candidate_squared_norms):
+    # the squared euclidean distances, less the squared norm of the query,
+    # which does not change the nearest candidate
+    if issparse(X_queries):
+        # sparse times dense is much faster than sparse times sparse
+        products = (X_candidates @ X_queries.T.toarray()).T
+    else:
+        products = X_queries @ X_candidates.T
+    return candidate_squared_norms[np.newaxis, :] - 2 * products
+
+def _get_block_size(X, n_candidates):
+    # bounds both the distances and the densified sparse queries
+    return max(1, NEAREST_NEIGHBORS_BLOCK_SIZE // (
+        8 * max(n_candidates, X.shape[1] if issparse(X) else 1)
+    ))
+
+def _search_exact(X, squared_norms, fold_ids, query_indices):
+    neighbors = np.empty(len(query_indices), dtype=np.intp)
+    distances = np.empty(len(query_indices))
+    for fold_id in np.unique(fold_ids[query_indices]):
+        fold_queries = np.flatnonzero(fold_ids[query_indices] == fold_id)
+        # in increasing order, so that ties go to the lowest index
+        candidates = np.flatnonzero(fold_ids != fold_id)
+        X_candidates = X[candidates]
+        block_size = _get_block_size(X, len(candidates))
+        for start in range(0, len(fold_queries), block_size):
+            block = fold_queries[start:start+block_size]
+            block_distances = _get_distances(
+                X[query_indices[block]], X_candidates,
+                squared_norms[candidates]
+            )
+            nearest = np.argmin(block_distances, axis=1)
+            neighbors[block] = candidates[nearest]
+            distances[block] = block_distances[np.arange(len(block)), nearest]
+    return neighbors, distances
+
+def _search_approximate(X, squared_norms, fold_ids, random_state):
+    n_instances = X.shape[0]
+    n_lists = max(1, int(np.sqrt(n_instances)))
+    n_probes = min(n_lists, APPROXIMATE_NEAREST_NEIGHBORS_PROBES)
+    centroid_indices = random_state.choice(n_instances, n_lists, replace=False)
+    centroids = X[centroid_indices]
+    centroid_squared_norms = squared_norms[centroid_indices]
+
+    assignments = np.empty(n_instances, dtype=np.intp)
+    probes = np.empty((n_instances, n_probes), dtype=np.intp)
+    block_size = _get_block_size(X, n_lists)
+    for start in range(0, n_instances, block_size):
+        centroid_distances = _get_distances(
+            X[start:start+block_size], centroids, centroid_squared_norms
+        )
+        assignments[start:start+block_size] = np.argmin(
+            centroid_distances, axis=1
+        )
+        probes[start:start+block_size] = np.argpartition(
+            centroid_distances, n_probes - 1, axis=1
+        )[:, :n_probes]
+
+    members_order = np.argsort(assignments, kind="stable")
+    members_bounds = np.searchsorted(
+        assignments[members_order], np.arange(n_lists + 1)
+    )
+    probe_lists = probes.ravel()
+    probes_order = np.argsort(probe_lists, kind="stable")
+    probe_queries = np.repeat(np.arange(n_instances), n_probes)[probes_order]
+    probes_bounds = np.searchsorted(
+        probe_lists[probes_order], np.arange(n_lists + 1)
+    )
+
+    neighbors = np.full(n_instances, -1, dtype=np.intp)
+    distances = np.full(n_instances, np.inf)
+    for list_id in range(n_lists):
+        members = members_order[
+            members_bounds[list_id]:members_bounds[list_id+1]
+        ]
+        queries = probe_queries[
+            probes_bounds[list_id]:probes_bounds[list_id+1]
+        ]
+        if len(members) == 0 or len(queries) == 0:
+            continue
+        block_size = _get_block_size(X, len(members))
+        for start in range(0, len(queries), block_size):
+            block = queries[start:start+block_size]
+            block_distances = _get_distances(
+                X[block], X[members], squared_norms[members]
+            )
+            block_distances[
+                fold_ids[block][:, np.newaxis] ==
+                fold_ids[members][np.newaxis, :]
+            ] = np.inf
+            nearest = np.argmin(block_distances, axis=1)
+            nearest_distances = block_distances[
+                np.arange(len(block)), nearest
+            ]
+            closer = nearest_distances < distances[block]
+            neighbors[block[closer]] = members[nearest[closer]]
+            distances[block[closer]] = nearest_distances[closer]
+
+    # instances without any probed training instance are searched exactly
+    not_found = np.flatnonzero(neighbors == -1)
+    if len(not_found) > 0:
+        neighbors[not_found], distances[not_found] = _search_exact(
+            X, squared_norms, fold_ids, not_found
+        )
+    return neighbors, distances
 
-def get_decision_stump(X, Y, seed, n_folds, cv_seed):
+def get_decision_stump(cv_folds, seed):
     pipeline = Pipeline([(
         'decision_stump', DecisionTreeClassifier(
             criterion='entropy', splitter='best', max_depth=1, random_state=seed
         )
     )])
-    return run_pipeline(X, Y, pipeline, n_folds, cv_seed)
+    return run_pipeline(pipeline, cv_folds)
 
-def get_random_tree(X, Y, depth, seed, n_folds, cv_seed):
+def get_random_tree(cv_folds, depth, seed):
     pipeline = Pipeline([(
         'random_tree', DecisionTreeClassifier(
             criterion='entropy', splitter='random', max_depth=depth,
             random_state=seed
         )
     )])
-    return run_pipeline(X, Y, pipeline, n_folds, cv_seed)
+    return run_pipeline(pipeline, cv_folds)
 
-def get_lda(X, Y, n_folds, cv_seed):
+def get_lda(cv_folds):
     pipeline = Pipeline([(
         'lda', LinearDiscriminantAnalysis(
             solver='lsqr', shrinkage='auto'
         )
     )])
-    return run_pipeline(X, Y, pipeline, n_folds, cv_seed)
+    # the shrunk covariance estimate needs dense inputs
+    return run_pipeline(pipeline, cv_folds, accepts_sparse=False)
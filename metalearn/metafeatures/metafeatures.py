@@ -1,20 +1,65 @@
 import os
 import math
+import shutil
+import tempfile
+import importlib
 import json
 import time
 import io
+import traceback
+import warnings
+from functools import lru_cache
+from multiprocessing import Pool
+from concurrent.futures import (
+    ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+)
 from typing import Dict, List
 
 import numpy as np
 import pandas as pd
 from pandas import DataFrame, Series
-from sklearn.model_selection import StratifiedShuffleSplit
 
 from .common_operations import *
-from .simple_metafeatures import *
-from .statistical_metafeatures import *
-from .information_theoretic_metafeatures import *
-from .landmarking_metafeatures import *
+from .cache import MetafeatureCache
+from .sketches import HyperLogLog, hash_columns
+from .cost_model import CostModel
+from .profiling import Profile, ResourceProfile, call_resource_function
+from .plan import MetafeaturePlan
+from .arrow import ArrowSource, is_arrow_input
+from .budget import TimeBudget
+from .session import MetafeatureSession
+
+warnings.filterwarnings("ignore", category=RuntimeWarning) # suppress sklearn warnings
+warnings.filterwarnings("ignore", category=UserWarning) # suppress sklearn warnings
+
+
+class _lazy_class_attribute(object):
+    """
+    A class attribute computed by the decorated function of the class the
+    first time it is accessed.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.name = f.__name__
+
+    def __get__(self, instance, owner):
+        value = self.f(owner)
+        setattr(owner, self.name, value)
+        return value
+
+@lru_cache(maxsize=None)
+def _load_metadata(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+# the number of plans returned by `Metafeatures.plan` that are memoized,
+# the least recently used being evicted first
+PLAN_CACHE_SIZE = 128
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _get_plan(metafeatures_class, metafeature_ids, has_targets):
+    return metafeatures_class._build_plan(metafeature_ids, has_targets)
 
 
 class Metafeatures(object):
@@ -27,18 +72,96 @@ class Metafeatures(object):
 
     VALUE_KEY = 'value'
     COMPUTE_TIME_KEY = 'compute_time'
+    RECALL_KEY = 'recall'
+    PREDICTED_COMPUTE_TIME_KEY = 'predicted_compute_time'
+    STALE_KEY = 'stale'
     NUMERIC = "NUMERIC"
     CATEGORICAL = "CATEGORICAL"
     NO_TARGETS = "NO_TARGETS"
     NUMERIC_TARGETS = "NUMERIC_TARGETS"
+    TIMEOUT = "TIMEOUT"
+    AUTO = "auto"
+    THREAD = "thread"
+    PROCESS = "process"
+    # the number of rows hashed at a time by the cardinality sketches
+    SKETCH_BLOCK_SIZE = 2**16
 
     _metadata_path = os.path.splitext(__file__)[0] + ".json"
-    with open(_metadata_path, 'r') as f:
-        _metadata = json.load(f)
-    IDS = list(_metadata["metafeatures"].keys())
-    _resources_info = {}
-    _resources_info.update(_metadata["resources"])
-    _resources_info.update(_metadata["metafeatures"])
+    # the module defining each kernel function named in metafeatures.json.
+    # modules are imported the first time one of their functions is needed,
+    # so that their dependencies are only loaded when they are used
+    _KERNEL_MODULES = {
+        "simple_metafeatures": [
+            "get_dataset_stats", "get_dimensionality", "get_missing_values",
+            "get_class_stats", "get_categorical_cardinalities",
+            "get_numeric_cardinalities"
+        ],
+        "statistical_metafeatures": [
+            "get_numeric_means", "get_numeric_stdev", "get_numeric_skewness",
+            "get_numeric_kurtosis", "get_pca"
+        ],
+        "information_theoretic_metafeatures": [
+            "get_class_entropy", "get_attribute_entropy",
+            "get_attribute_entropy_from_codes", "get_joint_entropy",
+            "get_joint_entropy_from_contingency_tables",
+            "get_mutual_information",
+            "get_mutual_information_from_contingency_tables",
+            "get_equivalent_number_features", "get_noise_signal_ratio"
+        ],
+        "landmarking_metafeatures": [
+            "get_naive_bayes", "get_knn_1", "get_decision_stump",
+            "get_random_tree", "get_lda"
+        ]
+    }
+
+    @_lazy_class_attribute
+    def _metadata(cls):
+        return _load_metadata(cls._metadata_path)
+
+    @_lazy_class_attribute
+    def IDS(cls):
+        return list(cls._metadata["metafeatures"].keys())
+
+    @_lazy_class_attribute
+    def _resources_info(cls):
+        resources_info = {}
+        resources_info.update(cls._metadata["resources"])
+        resources_info.update(cls._metadata["metafeatures"])
+        return resources_info
+
+    @_lazy_class_attribute
+    def _target_dependent_ids(cls):
+        # resolved once for the whole graph, each resource visited once
+        is_target_dependent = {"Y": True, "XSample": False}
+
+        def resolve(resource_id):
+            if not resource_id in is_target_dependent:
+                is_target_dependent[resource_id] = any(
+                    argument in cls._resources_info and resolve(argument)
+                    for argument in
+                    cls._resources_info[resource_id]["arguments"].values()
+                )
+            return is_target_dependent[resource_id]
+
+        for resource_id in cls._resources_info:
+            resolve(resource_id)
+        return frozenset(
+            resource_id for resource_id, target_dependent in
+            is_target_dependent.items() if target_dependent
+        )
+
+    @_lazy_class_attribute
+    def _metafeature_groups(cls):
+        return {
+            "landmarking": [
+                mf_id for mf_id in cls.IDS
+                if "ErrRate" in mf_id or "Kappa" in mf_id
+            ],
+            "target_dependent": [
+                mf_id for mf_id in cls.IDS
+                if mf_id in cls._target_dependent_ids
+            ]
+        }
 
     @classmethod
     def list_metafeatures(cls, group="all"):
@@ -48,37 +171,125 @@ class Metafeatures(object):
         # todo make group for intractable metafeatures for wide datasets or
         # datasets with high cardinality categorical columns:
         # PredPCA1, PredPCA2, PredPCA3, PredEigen1, PredEigen2, PredEigen3,
-        # PredDet, kNN1NErrRate, kNN1NKappa, LinearDiscriminantAnalysisKappa,
+        # PredDet, LinearDiscriminantAnalysisKappa,
         # LinearDiscriminantAnalysisErrRate
         if group == "all":
             return cls.IDS
-        elif group == "landmarking":
-            return list(filter(
-                lambda mf_id: "ErrRate" in mf_id or "Kappa" in mf_id, cls.IDS
-            ))
-        elif group == "target_dependent":
-            return list(filter(
-                cls._resource_is_target_dependent, cls.IDS
-            ))
+        elif group in cls._metafeature_groups:
+            return list(cls._metafeature_groups[group])
         else:
             raise ValueError(f"Unknown group {group}")
 
+    @classmethod
+    def plan(cls, metafeature_ids: List = None, has_targets=True):
+        """
+        Resolves the dependency graph of metafeatures.json for
+        `metafeature_ids` once, see `MetafeaturePlan`. The returned plan can
+        be passed as the `plan` argument of any number of `compute` calls on
+        datasets with targets when `has_targets` is True, or without targets
+        otherwise. The most recently used plans are memoized, so planning
+        the same request again is free, see `clear_plans`.
+
+        Parameters
+        ----------
+        metafeature_ids: list, the metafeatures to compute. default of None
+            indicates to compute all metafeatures
+        has_targets: bool, default True. Whether the plan is for datasets
+            with targets. Without targets, the target dependent metafeatures
+            are skipped.
+        """
+        if not type(has_targets) is bool:
+            raise ValueError("`has_targets` must be of type bool.")
+        if metafeature_ids is None:
+            metafeature_ids = cls.IDS
+        cls._check_metafeature_ids(metafeature_ids)
+        return _get_plan(cls, tuple(metafeature_ids), has_targets)
+
+    @staticmethod
+    def clear_plans():
+        """
+        Clears the plans memoized by `plan`, of at most PLAN_CACHE_SIZE
+        requests.
+        """
+        _get_plan.cache_clear()
+
+    @classmethod
+    def _build_plan(cls, metafeature_ids, has_targets):
+        target_dependent_ids = [
+            mf_id for mf_id in metafeature_ids
+            if mf_id in cls._target_dependent_ids
+        ]
+        skipped_ids = [] if has_targets else target_dependent_ids
+        # depth first post-order, so that every resource follows its
+        # arguments
+        resource_ids = []
+        dependencies = {}
+        groups = {}
+
+        def visit(resource_id):
+            if cls._resources_info[resource_id]["function"] == "":
+                return
+            resource_id = cls._resources_info[resource_id]["returns"][0]
+            if resource_id in dependencies:
+                return
+            dependencies[resource_id] = tuple(
+                cls._get_dependencies(resource_id)
+            )
+            for dependency in dependencies[resource_id]:
+                visit(dependency)
+            groups[resource_id] = tuple(
+                cls._resources_info[resource_id]["returns"]
+            )
+            resource_ids.append(resource_id)
+
+        for mf_id in metafeature_ids:
+            if not mf_id in skipped_ids:
+                visit(mf_id)
+        landmarking_ids = set(cls._metafeature_groups["landmarking"])
+        return MetafeaturePlan(
+            metafeature_ids, has_targets, target_dependent_ids, skipped_ids,
+            resource_ids, dependencies, groups,
+            any(mf_id in landmarking_ids for mf_id in metafeature_ids)
+        )
+
     def compute(
         self, X: DataFrame, Y: Series = None,
         column_types: Dict[str, str] = None, metafeature_ids: List = None,
-        sample_shape=None, seed=None, n_folds=2, verbose=False
+        sample_shape=None, seed=None, n_folds=2, verbose=False, n_jobs=1,
+        backend="thread", cache_dir=None, cardinality_error=None,
+        sparse_threshold=2**30, approximate_knn=False, time_budget=None,
+        group_time_budgets=None, target_seconds=None, cost_model=None,
+        profile=None, plan=None, max_memory=None, release_intermediates=False,
+        spill_dir=None
     ) -> dict:
         """
         Parameters
         ----------
-        X: pandas.DataFrame, the dataset features
-        Y: pandas.Seris, the dataset targets
+        X: pandas.DataFrame, the dataset features. Also a pyarrow.Table or
+            the path of a Parquet (.parquet, .pq) or Feather (.feather,
+            .arrow) file, which requires pyarrow. Files are memory mapped and
+            only the columns that the requested metafeatures need are read:
+            none when they only need the targets, and only the sampled
+            columns when they do not need the whole of X and both the number
+            of columns of `sample_shape` and `seed` are given.
+            X can also be a 2-D numpy.ndarray, which is wrapped without a
+            copy in a pandas.DataFrame whose columns are named by their
+            positions.
+        Y: pandas.Seris, the dataset targets. With Arrow input X, also the
+            name of the column of X holding the targets. With numpy.ndarray
+            X, also a 1-D numpy.ndarray, named by the position following the
+            last column of X.
         column_types: Dict[str, str], dict from column name to column type as
-            "NUMERIC" or "CATEGORICAL", must include Y column
+            "NUMERIC" or "CATEGORICAL", must include Y column. With
+            numpy.ndarray X, also a list of the types of the columns of X in
+            order, followed by the type of Y when Y is given.
         metafeature_ids: list, the metafeatures to compute. default of None
             indicates to compute all metafeatures
         sample_shape: tuple, the shape of X after sampling (X,Y) uniformly.
             Default is (None, None), indicate not to sample rows or columns.
+            "auto" uses the largest sample that the cost model predicts can
+            be computed in `target_seconds`, reducing the number of rows
+            before the number of columns.
         seed: int, the seed used to generate psuedo-random numbers. when None
             is given, a seed will be generated psuedo-randomly. this can be
             used for reproducibility of metafeatures. a generated seed can be
@@ -87,6 +298,89 @@ class Metafeatures(object):
             landmarking metafeatures. also affects the sample_shape validation
         verbose: bool, default False. When True, prints the ID of each
             metafeature right before it is about to be computed.
+        n_jobs: int, default 1. The number of workers used to compute
+            independent resources concurrently. When greater than 1, the
+            resources in metafeatures.json are scheduled as a dependency graph
+            and each resource is computed as soon as its arguments are
+            available. -1 uses all available cores. Results and seeds are
+            identical to the serial computation.
+        backend: str, default "thread". Either "thread" or "process", the kind
+            of worker pool used when n_jobs is greater than 1.
+        cache_dir: str or MetafeatureCache, default None. When given,
+            metafeatures are read from and written to a persistent cache in
+            this directory, keyed by the contents of X and Y, the compute
+            arguments that affect the values and the version of the
+            metafeature implementations. Only the requested metafeatures
+            missing from the cache are computed. Since the seed is part of the
+            key, pass `seed` to reuse cached values across calls.
+        cardinality_error: float, default None. When given, the cardinality
+            metafeatures are estimated with HyperLogLog sketches of this
+            relative standard error, e.g. 0.01, using a fixed amount of memory
+            per column instead of building the set of distinct values of
+            every column. None computes the exact cardinalities.
+        sparse_threshold: int, default 1GiB. When the one-hot encoded,
+            imputed features used by PCA and the landmarkers would take more
+            than this many bytes as a dense float64 array, they are built as
+            a scipy.sparse CSR matrix instead. PCA is then computed with a
+            sparse eigensolver and the landmarkers that cannot use sparse
+            inputs (LDA) densify them. None never uses sparse features.
+        approximate_knn: bool, default False. When True, the neighbors of the
+            1-NN landmarker are found with an approximate index instead of an
+            exact blocked search, which makes kNN1NErrRate and kNN1NKappa
+            feasible on very large samples. Their results then also hold the
+            estimated `recall` of the search, the fraction of instances whose
+            neighbor is a true nearest neighbor.
+        time_budget: float, default None. The number of seconds the
+            computation may take. Metafeatures needing the fewest resources
+            that are not computed yet are computed first. Those that cannot be
+            computed in time are skipped, or interrupted, and get the value
+            "TIMEOUT", while all that finished are returned. Running
+            computations can only be interrupted when compute is called from
+            the main thread of a platform with SIGALRM, otherwise the budget
+            is only checked between metafeatures. With n_jobs greater than 1,
+            the resources still running at the deadline are abandoned rather
+            than interrupted: their workers keep running in the background
+            until they finish, and their results are discarded. Interrupted
+            or abandoned metafeatures are never written to `cache_dir`.
+        group_time_budgets: dict, default None. The number of seconds that may
+            be spent computing each group of metafeatures, given by a group of
+            `list_metafeatures` (e.g. "landmarking") or a metafeature id.
+            Metafeatures exceeding the budget of one of their groups get the
+            value "TIMEOUT", as with `time_budget`.
+        target_seconds: float, default None. The predicted compute time of the
+            sample chosen when sample_shape is "auto".
+        cost_model: CostModel, default None. The model predicting the compute
+            time of each resource, which defaults to the model calibrated on
+            the benchmark datasets. When given, the exclusive compute time of
+            every resource computed is recorded in the model, which can then
+            be recalibrated with `cost_model.fit()`. When given or when
+            sample_shape is "auto", the results also hold the
+            `predicted_compute_time` of each metafeature computed, predicted
+            as `compute_time` is measured.
+        profile: Profile, default None. When given, it is cleared and filled
+            with the exclusive and inclusive time, peak memory and cache
+            status of every resource, see `Profile`.
+        plan: MetafeaturePlan, default None. A plan returned by
+            `Metafeatures.plan`, which saves resolving the metafeatures to
+            compute on every call. Replaces `metafeature_ids`, so they cannot
+            both be given.
+        max_memory: int, default None. The number of bytes the intermediate
+            resources (samples, preprocessed features, folds, ...) may hold.
+            After each metafeature, the intermediates that the remaining
+            metafeatures do not need are released first, then the largest
+            ones, until they fit. Released intermediates that are needed
+            again are recomputed, which gives the same values but longer
+            compute times. Resources computed concurrently with n_jobs are
+            only released once they are all computed.
+        release_intermediates: bool, default False. Whether to release each
+            intermediate resource as soon as every resource and metafeature
+            computed from it is computed, which lowers the peak memory of the
+            computation without changing its results. By default, every
+            intermediate is kept until the next call to compute.
+        spill_dir: str, default None. With `max_memory`, a directory where
+            the numeric arrays of intermediates that are still needed are
+            moved to memory-mapped files, instead of being released and
+            recomputed. The files are deleted before compute returns.
 
         Returns
         -------
@@ -95,59 +389,672 @@ class Metafeatures(object):
         metafeature. The value is typically a number, but can be a string
         indicating a reason why the value could not be computed.
         """
-        self._validate_compute_arguments(
+        if is_arrow_input(X):
+            X, Y = self._read_arrow_input(
+                X, Y, metafeature_ids, sample_shape, seed, plan
+            )
+        elif isinstance(X, np.ndarray):
+            X, Y, column_types = self._wrap_array_input(X, Y, column_types)
+        self._validate_X(
             X, Y, column_types, metafeature_ids, sample_shape, seed, n_folds,
             verbose
         )
+        self._validate_Y(
+            X, Y, column_types, metafeature_ids, sample_shape, seed, n_folds,
+            verbose
+        )
+        self._validate_plan(Y, metafeature_ids, plan)
+        if plan is None:
+            self._validate_metafeature_ids(
+                X, Y, column_types, metafeature_ids, sample_shape, seed,
+                n_folds, verbose
+            )
+            plan = self.plan(metafeature_ids, Y is not None)
+        metafeature_ids = list(plan.metafeature_ids)
         if column_types is None:
             column_types = self._infer_column_types(X, Y)
-        if metafeature_ids is None:
-            metafeature_ids = self.list_metafeatures()
+        else:
+            self._validate_column_types(
+                X, Y, column_types, metafeature_ids, sample_shape, seed,
+                n_folds, verbose
+            )
+        for f in [
+            self._validate_sample_shape, self._validate_n_folds,
+            self._validate_verbose
+        ]:
+            f(
+                X, Y, column_types, metafeature_ids, sample_shape, seed,
+                n_folds, verbose
+            )
+        self._validate_cost_model_arguments(
+            sample_shape, target_seconds, cost_model
+        )
+        if profile is not None and not isinstance(profile, Profile):
+            raise TypeError("`profile` must be a Profile")
+        if Y is not None and column_types[Y.name] == self.NUMERIC:
+            skipped_ids = plan.target_dependent_ids
+        else:
+            skipped_ids = plan.skipped_ids
         if sample_shape is None:
             sample_shape = (None, None)
+        if cost_model is None and sample_shape == self.AUTO:
+            cost_model = CostModel()
+        if cost_model is not None:
+            dataset_features = CostModel.get_dataset_features(
+                X, Y, column_types
+            )
+        if sample_shape == self.AUTO:
+            sample_shape = self._get_auto_sample_shape(
+                X, Y, [
+                    mf_id for mf_id in metafeature_ids
+                    if not mf_id in skipped_ids
+                ], n_folds, target_seconds, cost_model, dataset_features
+            )
         if seed is None:
             seed = np.random.randint(2**32)
-        self._validate_compute_arguments(
-            X, Y, column_types, metafeature_ids, sample_shape, seed, n_folds,
-            verbose
+        self._validate_scheduler_arguments(n_jobs, backend)
+        self._validate_cardinality_error(cardinality_error)
+        self._validate_sparse_threshold(sparse_threshold)
+        self._validate_approximate_knn(approximate_knn)
+        self._validate_time_budgets(time_budget, group_time_budgets)
+        self._validate_max_memory(max_memory)
+        self._validate_release_arguments(
+            release_intermediates, spill_dir, max_memory
         )
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+
+        cached_metafeatures = {}
+        if cache_dir is not None:
+            cache = self._get_cache(cache_dir)
+            cache_key = cache.get_key(X, Y, {
+                "column_types": sorted(
+                    [repr(col), col_type]
+                    for col, col_type in column_types.items()
+                ),
+                "sample_shape": list(sample_shape),
+                "seed": seed,
+                "n_folds": n_folds,
+                "cardinality_error": cardinality_error,
+                "sparse_threshold": sparse_threshold,
+                "approximate_knn": approximate_knn
+            })
+            cached_metafeatures = cache.get(cache_key)
+        requested_metafeature_ids = metafeature_ids
+        metafeature_ids = [
+            mf_id for mf_id in metafeature_ids
+            if mf_id not in cached_metafeatures
+        ]
 
         self._init_resources(
-            X, Y, column_types, metafeature_ids, sample_shape, seed, n_folds
+            X, Y, column_types, metafeature_ids, sample_shape, seed, n_folds,
+            cardinality_error, sparse_threshold, approximate_knn
         )
 
-        computed_metafeatures = {}
-        for metafeature_id in metafeature_ids:
-            if verbose == True:
-                print(metafeature_id)
-            if self._resource_is_target_dependent(metafeature_id) and (
-                Y is None or column_types[Y.name] == self.NUMERIC
-            ):
-                if Y is None:
-                    value = self.NO_TARGETS
-                else:
-                    value = self.NUMERIC_TARGETS
-                compute_time = None
-            else:
-                value, compute_time = self._get_resource(metafeature_id)
+        if spill_dir is not None:
+            self._spill_dir = tempfile.mkdtemp(dir=spill_dir)
+        try:
+            computed_metafeatures = self._compute_metafeatures(
+                metafeature_ids, skipped_ids, verbose, n_jobs, backend,
+                time_budget, group_time_budgets, approximate_knn, profile,
+                max_memory, release_intermediates
+            )
+        finally:
+            if self._spill_dir is not None:
+                # the memory-mapped intermediates are released with their
+                # files
+                self._release_resources(list(self._get_intermediate_sizes()))
+                shutil.rmtree(self._spill_dir, ignore_errors=True)
+                self._spill_dir = None
+        if profile is not None:
+            for mf_id, result in cached_metafeatures.items():
+                if mf_id in requested_metafeature_ids:
+                    profile.add(ResourceProfile(
+                        mf_id, 0., result[self.COMPUTE_TIME_KEY],
+                        cache_hit=True
+                    ))
+
+        if cost_model is not None:
+            self._add_predicted_compute_times(
+                computed_metafeatures, dataset_features, sample_shape,
+                cost_model
+            )
 
-            computed_metafeatures[metafeature_id] = {
-                self.VALUE_KEY: value,
-                self.COMPUTE_TIME_KEY: compute_time
+        if cache_dir is not None:
+            uncached_metafeatures = {
+                mf_id: result
+                for mf_id, result in computed_metafeatures.items()
+                if result[self.VALUE_KEY] != self.TIMEOUT
             }
+            if len(uncached_metafeatures) > 0:
+                cache.update(cache_key, uncached_metafeatures)
+        computed_metafeatures.update(cached_metafeatures)
+        return {
+            mf_id: computed_metafeatures[mf_id]
+            for mf_id in requested_metafeature_ids
+        }
+
+    def _compute_metafeatures(
+        self, metafeature_ids, skipped_ids, verbose, n_jobs, backend,
+        time_budget, group_time_budgets, approximate_knn, profile,
+        max_memory=None, release_intermediates=False
+    ):
+        """
+        Computes `metafeature_ids` from the resources set by
+        `_init_resources`, reusing the resources that were already computed.
+        The metafeatures in `skipped_ids` get the reason they cannot be
+        computed as their value. After each metafeature, intermediate
+        resources are released until they hold at most `max_memory` bytes.
+        With `release_intermediates`, each intermediate is released once all
+        of its consumers are computed.
+        """
+        Y = self._resources["Y"][self.VALUE_KEY]
+        if release_intermediates:
+            self._pending_consumers = self._count_consumers(
+                [
+                    mf_id for mf_id in metafeature_ids
+                    if not mf_id in skipped_ids
+                ], approximate_knn
+            )
+        if time_budget is not None or group_time_budgets is not None:
+            # an interrupted import would leave a partially initialized
+            # module in sys.modules, so kernels are imported before any timer
+            # is set
+            self._import_kernel_modules([
+                mf_id for mf_id in metafeature_ids if not mf_id in skipped_ids
+            ])
+        budget = TimeBudget(
+            time_budget, self._get_group_budgets(group_time_budgets)
+        )
+        is_budgeted = budget.is_limited()
 
+        self._profile = profile
+        if profile is not None:
+            profile.start()
+        try:
+            if n_jobs > 1:
+                # metafeatures with a group budget are computed one at a time
+                # below, so that their budget can be enforced
+                self._compute_resources_concurrently(
+                    [
+                        mf_id for mf_id in metafeature_ids
+                        if not mf_id in skipped_ids and
+                        not budget.is_grouped(mf_id)
+                    ], n_jobs, backend, verbose, budget.deadline
+                )
+
+            computed_metafeatures = {}
+            remaining_metafeature_ids = list(metafeature_ids)
+            while len(remaining_metafeature_ids) > 0:
+                if is_budgeted:
+                    # the metafeatures needing the fewest resources not
+                    # computed yet first, so that the most metafeatures
+                    # finish in time
+                    metafeature_id = min(
+                        remaining_metafeature_ids, key=lambda mf_id: len(
+                            self._get_resource_graph([mf_id])
+                        )
+                    )
+                else:
+                    metafeature_id = remaining_metafeature_ids[0]
+                remaining_metafeature_ids.remove(metafeature_id)
+                if verbose == True and n_jobs == 1:
+                    print(metafeature_id)
+                if metafeature_id in skipped_ids:
+                    if Y is None:
+                        value = self.NO_TARGETS
+                    else:
+                        value = self.NUMERIC_TARGETS
+                    compute_time = None
+                elif is_budgeted and not metafeature_id in self._resources:
+                    completed, result = budget.call(
+                        metafeature_id,
+                        lambda: self._get_resource(metafeature_id)
+                    )
+                    if completed:
+                        value, compute_time = result
+                    else:
+                        value, compute_time = self.TIMEOUT, None
+                else:
+                    value, compute_time = self._get_resource(metafeature_id)
+
+                computed_metafeatures[metafeature_id] = {
+                    self.VALUE_KEY: value,
+                    self.COMPUTE_TIME_KEY: compute_time
+                }
+                if (
+                    approximate_knn and compute_time is not None and
+                    "NearestNeighbors" in
+                    self._get_dependencies(metafeature_id)
+                ):
+                    nearest_neighbors, _ = self._get_resource(
+                        "NearestNeighbors"
+                    )
+                    computed_metafeatures[metafeature_id][self.RECALL_KEY] = \
+                        nearest_neighbors["recall"]
+                    self._consume("NearestNeighbors")
+                if max_memory is not None:
+                    self._limit_memory(max_memory, remaining_metafeature_ids)
+        finally:
+            self._pending_consumers = None
+            if profile is not None:
+                profile.stop()
         return computed_metafeatures
 
+    def compute_streaming(
+        self, chunks, target_name: str = None,
+        column_types: Dict[str, str] = None, metafeature_ids: List = None,
+        seed=None, n_folds=2, verbose=False, reservoir_size=100000,
+        chunksize=100000, cardinality_error=None
+    ) -> dict:
+        """
+        Computes metafeatures on a dataset too large to be held in memory,
+        reading it in a single pass one chunk of rows at a time. Metafeatures
+        that can be merged across chunks (dataset statistics, missing values,
+        class statistics, cardinalities, numeric moments and categorical
+        entropies) are accumulated over every row. The remaining metafeatures
+        are computed with `compute` on a uniform random sample of
+        `reservoir_size` rows drawn during the same pass.
+
+        Parameters
+        ----------
+        chunks: an iterable of pandas.DataFrame chunks holding the features
+            and the target column, or the path of a csv or parquet file to read
+            in chunks of `chunksize` rows. Reading parquet files requires
+            pyarrow. To pass options to the reader, pass its chunk iterator,
+            e.g. pandas.read_csv(path, index_col=0, chunksize=10000).
+        target_name: str, the name of the target column, or None when the
+            dataset has no targets
+        column_types: Dict[str, str], dict from column name to column type as
+            "NUMERIC" or "CATEGORICAL", must include the target column. When
+            None, the types are inferred from the first chunk.
+        metafeature_ids: list, the metafeatures to compute. default of None
+            indicates to compute all metafeatures
+        seed: int, the seed of the random sample and of `compute`
+        n_folds: int, the number of cross validation folds used by the
+            landmarking metafeatures
+        verbose: bool, default False. Passed to `compute`.
+        reservoir_size: int, default 100000. The number of rows sampled for
+            the metafeatures that cannot be merged across chunks. When the
+            dataset has no more rows than this, every metafeature is computed
+            as by `compute` on the whole dataset.
+        chunksize: int, default 100000. The number of rows per chunk when
+            reading `chunks` from a file.
+        cardinality_error: float, default None. When given, the cardinalities
+            are estimated with HyperLogLog sketches of this relative standard
+            error, as in `compute`, instead of holding every distinct value of
+            every column in memory.
+
+        Returns
+        -------
+        A dictionary mapping the metafeature id to another dictionary
+        containing the `value` and `compute_time`, as `compute` does. The
+        compute time of every accumulated metafeature is the time spent
+        reading and accumulating the chunks.
+        """
+        self._validate_metafeature_ids(
+            None, None, column_types, metafeature_ids, None, seed, n_folds,
+            verbose
+        )
+        self._validate_cardinality_error(cardinality_error)
+        from .streaming import DatasetAccumulator, read_chunks
+        if metafeature_ids is None:
+            metafeature_ids = self.list_metafeatures()
+        if seed is None:
+            seed = np.random.randint(2**32)
+        if isinstance(chunks, (str, os.PathLike)):
+            chunks = read_chunks(chunks, chunksize)
+
+        start_timestamp = time.time()
+        accumulator = None
+        for chunk in chunks:
+            if accumulator is None:
+                if column_types is None:
+                    if target_name is None:
+                        X, Y = chunk, None
+                    else:
+                        X = chunk.drop(columns=target_name)
+                        Y = chunk[target_name]
+                    column_types = self._infer_column_types(X, Y)
+                accumulator = DatasetAccumulator(
+                    column_types, target_name, reservoir_size, seed,
+                    cardinality_error
+                )
+            accumulator.update(chunk)
+        if accumulator is None:
+            raise ValueError("`chunks` must contain at least one chunk")
+        accumulated_metafeatures = self._get_accumulated_metafeatures(
+            accumulator, start_timestamp
+        )
+
+        X_sample, Y_sample = accumulator.get_sample()
+        sampled_metafeature_ids = [
+            mf_id for mf_id in metafeature_ids
+            if mf_id not in accumulated_metafeatures
+        ]
+        computed_metafeatures = self.compute(
+            X_sample, Y_sample, column_types, sampled_metafeature_ids,
+            seed=seed, n_folds=n_folds, verbose=verbose
+        )
+        computed_metafeatures.update(accumulated_metafeatures)
+        return {
+            mf_id: computed_metafeatures[mf_id] for mf_id in metafeature_ids
+        }
+
+    def init_state(
+        self, X: DataFrame, Y: Series = None,
+        column_types: Dict[str, str] = None, metafeature_ids: List = None,
+        seed=None, n_folds=2, cardinality_error=None
+    ):
+        """
+        Computes metafeatures on a dataset that grows by appending rows and
+        returns the MetafeatureState from which `update_state` refreshes them
+        as rows are appended. The parameters are those of `compute`.
+        """
+        from .streaming import DatasetAccumulator, MetafeatureState
+        for f in [
+            self._validate_X, self._validate_Y, self._validate_column_types,
+            self._validate_metafeature_ids
+        ]:
+            f(X, Y, column_types, metafeature_ids, None, seed, n_folds, False)
+        self._validate_cardinality_error(cardinality_error)
+        if column_types is None:
+            column_types = self._infer_column_types(X, Y)
+        if metafeature_ids is None:
+            metafeature_ids = self.list_metafeatures()
+
+        start_timestamp = time.time()
+        # the state only holds statistics, no sample of the rows
+        accumulator = DatasetAccumulator(
+            column_types, None if Y is None else Y.name, None,
+            cardinality_error=cardinality_error, track_missing_rows=True
+        )
+        accumulator.update(self._get_chunk(X, Y))
+        accumulated_metafeatures = self._get_accumulated_metafeatures(
+            accumulator, start_timestamp
+        )
+        mergeable_ids = [
+            mf_id for mf_id in metafeature_ids
+            if mf_id in accumulated_metafeatures
+        ]
+        computed_metafeatures = self.compute(
+            X, Y, column_types, [
+                mf_id for mf_id in metafeature_ids
+                if not mf_id in accumulated_metafeatures
+            ], seed=seed, n_folds=n_folds, cardinality_error=cardinality_error
+        )
+        computed_metafeatures.update(accumulated_metafeatures)
+        return MetafeatureState(
+            accumulator, {
+                mf_id: dict(computed_metafeatures[mf_id], **{
+                    self.STALE_KEY: False
+                }) for mf_id in metafeature_ids
+            }, mergeable_ids
+        )
+
+    def update_state(self, state, X: DataFrame, Y: Series = None) -> dict:
+        """
+        Appends the rows of X and Y to the dataset of `state`, a
+        MetafeatureState returned by `init_state`, in time proportional to
+        the number of appended rows. The mergeable metafeatures are refreshed
+        to their values on every row. The others, such as the landmarkers and
+        PCA, keep their values and are marked stale, with `stale` True in
+        their results, until they are computed again.
+
+        Returns
+        -------
+        The latest results of every metafeature of the state, as `compute`
+        returns them, each with a `stale` flag.
+        """
+        from .streaming import MetafeatureState
+        if not isinstance(state, MetafeatureState):
+            raise TypeError("`state` must be a MetafeatureState")
+        for f in [self._validate_X, self._validate_Y]:
+            f(X, Y, None, None, None, None, None, False)
+        accumulator = state.accumulator
+        if list(X.columns) != accumulator.columns:
+            raise ValueError("X must have the columns of the state")
+        if (None if Y is None else Y.name) != accumulator.target_name:
+            raise ValueError(
+                f"Y must be the target {accumulator.target_name} of the state"
+            )
+
+        start_timestamp = time.time()
+        accumulator.update(self._get_chunk(X, Y))
+        return self._refresh_state(state, start_timestamp)
+
+    def extend_state(
+        self, state, X: DataFrame, Y: Series = None,
+        column_types: Dict[str, str] = None
+    ) -> dict:
+        """
+        Adds the columns of X to the dataset of `state`, a MetafeatureState
+        returned by `init_state`. Only the per-column statistics of the new
+        columns are computed, in time proportional to the number of values
+        they hold, and the mergeable metafeatures are aggregated again over
+        every column. The others are marked stale, as by `update_state`.
+
+        Parameters
+        ----------
+        X: pandas.DataFrame, the new columns of every row of the state, in the
+            order the rows were accumulated
+        Y: pandas.Series, the targets of the state, which the entropies and
+            mutual information of new categorical columns are computed with
+        column_types: Dict[str, str], the types of the new columns, inferred
+            when None
+        """
+        from .streaming import DatasetAccumulator, MetafeatureState
+        if not isinstance(state, MetafeatureState):
+            raise TypeError("`state` must be a MetafeatureState")
+        for f in [self._validate_X, self._validate_Y]:
+            f(X, Y, None, None, None, None, None, False)
+        accumulator = state.accumulator
+        if X.shape[0] != state.n_rows:
+            raise ValueError(
+                f"X must have the {state.n_rows} rows of the state, not " +
+                f"{X.shape[0]}"
+            )
+        if (None if Y is None else Y.name) != accumulator.target_name:
+            raise ValueError(
+                f"Y must be the target {accumulator.target_name} of the state"
+            )
+        if column_types is None:
+            column_types = self._infer_column_types(X, None)
+        if Y is not None:
+            column_types = {
+                **column_types, Y.name: accumulator.column_types[Y.name]
+            }
+        self._validate_column_types(
+            X, Y, column_types, None, None, None, None, False
+        )
+
+        start_timestamp = time.time()
+        added_accumulator = DatasetAccumulator(
+            column_types, accumulator.target_name, None,
+            cardinality_error=accumulator.cardinality_error,
+            track_missing_rows=True
+        )
+        added_accumulator.update(self._get_chunk(X, Y))
+        accumulator.add_columns(added_accumulator)
+        return self._refresh_state(state, start_timestamp)
+
+    def _refresh_state(self, state, start_timestamp):
+        """
+        Refreshes the mergeable metafeatures of `state` from its accumulator
+        and marks the others stale.
+        """
+        accumulated_metafeatures = self._get_accumulated_metafeatures(
+            state.accumulator, start_timestamp
+        )
+        for mf_id, result in state.metafeatures.items():
+            if mf_id in state.mergeable_ids:
+                state.metafeatures[mf_id] = dict(
+                    accumulated_metafeatures[mf_id], **{self.STALE_KEY: False}
+                )
+            elif not result[self.VALUE_KEY] in [
+                self.NO_TARGETS, self.NUMERIC_TARGETS
+            ]:
+                result[self.STALE_KEY] = True
+                state.stale_ids.add(mf_id)
+        return dict(state.metafeatures)
+
+    def _get_chunk(self, X, Y):
+        if Y is None:
+            return X
+        chunk = X.copy(deep=False)
+        chunk[Y.name] = Y.values
+        return chunk
+
+    def _get_accumulated_metafeatures(self, accumulator, start_timestamp):
+        """
+        Returns the results of the metafeatures computed from the statistics
+        of `accumulator`, whose compute time is the time elapsed since
+        `start_timestamp`.
+        """
+        accumulated_groups = accumulator.get_metafeatures()
+        accumulate_time = time.time() - start_timestamp
+        accumulated_metafeatures = {}
+        for group, values in accumulated_groups.items():
+            for mf_id, value in zip(
+                self._resources_info[group]["returns"], values
+            ):
+                accumulated_metafeatures[mf_id] = {
+                    self.VALUE_KEY: value,
+                    self.COMPUTE_TIME_KEY: accumulate_time
+                }
+        return accumulated_metafeatures
+
+    def _get_cache(self, cache_dir):
+        if isinstance(cache_dir, MetafeatureCache):
+            return cache_dir
+        elif isinstance(cache_dir, (str, os.PathLike)):
+            return MetafeatureCache(cache_dir)
+        else:
+            raise TypeError(
+                "`cache_dir` must be a path or a MetafeatureCache"
+            )
+
+    def compute_many(self, datasets, n_jobs=1, chunksize=1, **compute_kwargs):
+        """
+        Computes metafeatures on many datasets using a pool of worker
+        processes that persists for the whole batch, so each worker pays the
+        import and start up cost once rather than once per dataset.
+
+        Parameters
+        ----------
+        datasets: iterable, each item is either a (X, Y, column_types) tuple
+            or a callable taking no arguments that returns such a tuple.
+            Callables are called in the worker, which avoids sending the data
+            between processes, but they must be picklable when n_jobs > 1.
+        n_jobs: int, default 1. The number of worker processes. -1 uses all
+            available cores. When 1, datasets are computed in this process.
+        chunksize: int, default 1. The number of datasets sent to a worker
+            at a time.
+        compute_kwargs: keyword arguments passed to `compute` for every
+            dataset, e.g. metafeature_ids, sample_shape, seed or n_folds.
+
+        Returns
+        -------
+        A generator of (index, metafeatures, error) tuples in the order the
+        datasets finish, where index is the position of the dataset in
+        `datasets`. When computing a dataset raises an exception, metafeatures
+        is None and error is the formatted traceback, otherwise error is None.
+        """
+        self._validate_scheduler_arguments(n_jobs, self.PROCESS)
+        if not type(chunksize) is int or chunksize < 1:
+            raise ValueError(
+                f"`chunksize` must be a positive integer, not {chunksize}"
+            )
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+        # the arguments are validated above, when compute_many is called,
+        # rather than when the generator is first iterated
+        return self._compute_many(datasets, n_jobs, chunksize, compute_kwargs)
+
+    def _compute_many(self, datasets, n_jobs, chunksize, compute_kwargs):
+        tasks = (
+            (index, dataset, type(self), compute_kwargs)
+            for index, dataset in enumerate(datasets)
+        )
+        if n_jobs == 1:
+            yield from map(_compute_many_task, tasks)
+        else:
+            with Pool(
+                n_jobs, initializer=_init_compute_many_worker, initargs=(
+                    type(self), compute_kwargs.get("metafeature_ids")
+                )
+            ) as pool:
+                yield from pool.imap_unordered(
+                    _compute_many_task, tasks, chunksize=chunksize
+                )
+
+    def session(
+        self, X: DataFrame, Y: Series = None,
+        column_types: Dict[str, str] = None, sample_shape=None, seed=None,
+        n_folds=2, cardinality_error=None, sparse_threshold=2**30,
+        approximate_knn=False, max_memory=None
+    ) -> MetafeatureSession:
+        """
+        Binds a dataset to a MetafeatureSession, whose `compute` method can be
+        called any number of times to compute metafeatures incrementally. The
+        intermediate resources computed by a call are reused by the next
+        ones, e.g. the samples and preprocessed features computed for
+        PredPCA1 are reused when kNN1NErrRate is requested later.
+
+        Parameters
+        ----------
+        X, Y, column_types, sample_shape, seed, n_folds, cardinality_error,
+        sparse_threshold, approximate_knn: as in `compute`, except that
+            sample_shape cannot be "auto" since the metafeatures to compute
+            are not known in advance. A generated seed can be accessed
+            through the 'seed' property of the session.
+        max_memory: int, default None. The number of bytes the intermediate
+            resources kept by the session may hold, see `MetafeatureSession`.
+        """
+        for f in [
+            self._validate_X, self._validate_Y, self._validate_column_types,
+            self._validate_sample_shape, self._validate_n_folds
+        ]:
+            f(X, Y, column_types, None, sample_shape, seed, n_folds, False)
+        if sample_shape == self.AUTO:
+            raise ValueError("`sample_shape` cannot be \"auto\" in a session")
+        self._validate_cardinality_error(cardinality_error)
+        self._validate_sparse_threshold(sparse_threshold)
+        self._validate_approximate_knn(approximate_knn)
+        self._validate_max_memory(max_memory)
+        if column_types is None:
+            column_types = self._infer_column_types(X, Y)
+        if sample_shape is None:
+            sample_shape = (None, None)
+        if seed is None:
+            seed = np.random.randint(2**32)
+
+        metafeatures = type(self)()
+        metafeatures._init_resources(
+            X, Y, column_types, None, sample_shape, seed, n_folds,
+            cardinality_error, sparse_threshold, approximate_knn
+        )
+        return MetafeatureSession(metafeatures, max_memory)
+
     def _init_resources(
-        self, X, Y, column_types, metafeature_ids, sample_shape, seed, n_folds
+        self, X, Y, column_types, metafeature_ids, sample_shape, seed, n_folds,
+        cardinality_error=None, sparse_threshold=2**30, approximate_knn=False
     ):
+        # the compute time of each resource computed, excluding the time taken
+        # to compute its arguments
+        self._resource_compute_times = {}
+        self._profile = None
+        # the number of consumers of each intermediate resource that are not
+        # computed yet, when intermediates are released once consumed
+        self._pending_consumers = None
+        self._spill_dir = None
         self._resources = {
             "X_raw": {
                 self.VALUE_KEY: X,
                 self.COMPUTE_TIME_KEY: 0.
             },
             "X": {
-                self.VALUE_KEY: X.dropna(axis=1, how="all"),
+                self.VALUE_KEY: self._drop_missing_columns(X),
                 self.COMPUTE_TIME_KEY: 0.
             },
             "Y": {
@@ -169,42 +1076,558 @@ class Metafeatures(object):
             "n_folds": {
                 self.VALUE_KEY: n_folds,
                 self.COMPUTE_TIME_KEY: 0.
+            },
+            "cardinality_error": {
+                self.VALUE_KEY: cardinality_error,
+                self.COMPUTE_TIME_KEY: 0.
+            },
+            "sparse_threshold": {
+                self.VALUE_KEY: sparse_threshold,
+                self.COMPUTE_TIME_KEY: 0.
+            },
+            "approximate_knn": {
+                self.VALUE_KEY: approximate_knn,
+                self.COMPUTE_TIME_KEY: 0.
             }
         }
 
+    def _get_intermediate_sizes(self):
+        """
+        Returns a dict from the first resource returned by each function
+        whose results are held, other than metafeatures, to the estimated
+        number of bytes they hold.
+        """
+        sizes = {}
+        for resource_id, resource in self._resources.items():
+            resource_info = self._resources_info.get(resource_id)
+            if (
+                resource_info is None or resource_info["function"] == "" or
+                resource_id in self.IDS
+            ):
+                continue
+            first_resource_id = resource_info["returns"][0]
+            sizes[first_resource_id] = sizes.get(first_resource_id, 0) + \
+                get_nbytes(resource[self.VALUE_KEY])
+        return sizes
+
+    def _release_resources(self, resource_ids):
+        """
+        Releases the results of the functions of `resource_ids`, which are
+        computed again when needed.
+        """
+        for resource_id in resource_ids:
+            resource_id = self._resources_info[resource_id]["returns"][0]
+            if (
+                self._pending_consumers is not None and
+                resource_id in self._resources and
+                self._pending_consumers.get(resource_id, 0) > 0
+            ):
+                # computing the resource again consumes its arguments again
+                for dependency in self._get_intermediate_dependencies(
+                    resource_id
+                ):
+                    self._pending_consumers[dependency] = \
+                        self._pending_consumers.get(dependency, 0) + 1
+            for returned_id in self._resources_info[resource_id]["returns"]:
+                self._resources.pop(returned_id, None)
+
+    def _count_consumers(self, metafeature_ids, approximate_knn):
+        """
+        Returns a dict from each intermediate resource needed to compute
+        `metafeature_ids` to the number of its consumers, the resources
+        computed from it. With `approximate_knn`, the metafeatures computed
+        from NearestNeighbors also read its recall.
+        """
+        pending_consumers = {}
+        for resource_id in self._get_resource_graph(metafeature_ids):
+            for dependency in self._get_intermediate_dependencies(
+                resource_id
+            ):
+                pending_consumers[dependency] = \
+                    pending_consumers.get(dependency, 0) + 1
+        if approximate_knn:
+            for mf_id in metafeature_ids:
+                if "NearestNeighbors" in self._get_dependencies(mf_id):
+                    pending_consumers["NearestNeighbors"] = \
+                        pending_consumers.get("NearestNeighbors", 0) + 1
+        return pending_consumers
+
+    def _get_intermediate_dependencies(self, resource_id):
+        """
+        Returns the set of the first resources returned by the functions
+        computing the arguments of `resource_id`.
+        """
+        return set(
+            self._resources_info[dependency]["returns"][0]
+            for dependency in self._get_dependencies(resource_id)
+            if self._resources_info[dependency]["function"] != ""
+        )
+
+    def _release_consumed(self, resource_id):
+        """ Counts `resource_id` as computed by each of its arguments. """
+        if self._pending_consumers is None:
+            return
+        for dependency in self._get_intermediate_dependencies(resource_id):
+            self._consume(dependency)
+
+    def _consume(self, resource_id):
+        """
+        Counts one consumer of `resource_id` as computed and releases it when
+        none is pending, unless it is a metafeature.
+        """
+        if (
+            self._pending_consumers is None or
+            not resource_id in self._pending_consumers
+        ):
+            return
+        self._pending_consumers[resource_id] -= 1
+        # the count is negative when consumers of a released resource are
+        # computed again
+        if (
+            self._pending_consumers[resource_id] <= 0 and
+            not resource_id in self.IDS
+        ):
+            self._release_resources([resource_id])
+
+    def _spill_resource(self, resource_id):
+        """
+        Moves the arrays of the results of the function of `resource_id` to
+        memory-mapped files, see `spill`. Returns the number of bytes freed.
+        """
+        freed_memory = 0
+        for returned_id in self._resources_info[resource_id]["returns"]:
+            if returned_id in self._resources:
+                resource = self._resources[returned_id]
+                memory = get_nbytes(resource[self.VALUE_KEY])
+                resource[self.VALUE_KEY] = spill(
+                    resource[self.VALUE_KEY], self._spill_dir
+                )
+                freed_memory += memory - get_nbytes(resource[self.VALUE_KEY])
+        return freed_memory
+
+    def _limit_memory(self, max_memory, remaining_metafeature_ids=()):
+        """
+        Releases intermediate resources until they hold at most `max_memory`
+        bytes, first those that `remaining_metafeature_ids` do not need, then
+        the largest ones. When spilling, the arrays of the intermediates that
+        are still needed are moved to memory-mapped files instead.
+        """
+        sizes = self._get_intermediate_sizes()
+        memory_usage = sum(sizes.values())
+        if memory_usage <= max_memory:
+            return
+        needed_ids = self._get_resource_graph(
+            remaining_metafeature_ids, skip_computed=False
+        )
+        released_ids = []
+        for resource_id in sorted(
+            sizes, key=lambda resource_id: (
+                resource_id in needed_ids, -sizes[resource_id]
+            )
+        ):
+            if memory_usage <= max_memory:
+                break
+            if self._spill_dir is not None and resource_id in needed_ids:
+                freed_memory = self._spill_resource(resource_id)
+                if freed_memory > 0:
+                    memory_usage -= freed_memory
+                    continue
+            released_ids.append(resource_id)
+            memory_usage -= sizes[resource_id]
+        self._release_resources(released_ids)
+
+    def _drop_missing_columns(self, X):
+        """
+        Drops the columns of X without any value, copying X only when there
+        are such columns.
+        """
+        # one column at a time, so that no mask of the whole of X is built
+        has_values = np.array([
+            not X[col].hasnans or X[col].notnull().any() for col in X.columns
+        ], dtype=bool)
+        if has_values.all():
+            return X
+        return X.loc[:, has_values]
+
     @classmethod
     def _resource_is_target_dependent(cls, resource_id):
-        if resource_id=='Y':
-            return True
-        elif resource_id=='XSample':
-            return False
-        else:
-            resource_info = cls._resources_info[resource_id]
-            function = resource_info["function"]
-            args = resource_info["arguments"]
-            for parameter, argument in args.items():
-                if (argument in cls._resources_info and
-                    cls._resource_is_target_dependent(argument)
-                ):
-                    return True
-            return False
+        return resource_id in cls._target_dependent_ids
 
     def _get_cv_seed(self, seed_base, seed_offset):
         return (seed_base + seed_offset,)
 
-    def _validate_compute_arguments(
-        self, X, Y, column_types, metafeature_ids, sample_shape, seed, n_folds,
-        verbose
+    def _get_cv_folds(self, X_preprocessed, Y_sample, n_folds, cv_seed):
+        from .landmarking_metafeatures import get_cv_folds
+        return (get_cv_folds(X_preprocessed, Y_sample, n_folds, cv_seed),)
+
+    def _get_nearest_neighbors(self, cv_folds, approximate, seed):
+        from .landmarking_metafeatures import get_nearest_neighbors
+        return (get_nearest_neighbors(cv_folds, approximate, seed),)
+
+    def _validate_scheduler_arguments(self, n_jobs, backend):
+        if (
+            not dtype_is_numeric(type(n_jobs)) or n_jobs != int(n_jobs) or
+            not (n_jobs >= 1 or n_jobs == -1)
+        ):
+            raise ValueError(
+                f"`n_jobs` must be a positive integer or -1, not {n_jobs}"
+            )
+        if not backend in [self.THREAD, self.PROCESS]:
+            raise ValueError(
+                f"`backend` must be one of {self.THREAD} or {self.PROCESS}, " +
+                f"not {backend}"
+            )
+
+    def _validate_cardinality_error(self, cardinality_error):
+        if cardinality_error is not None and (
+            not dtype_is_numeric(type(cardinality_error)) or
+            not 0 < cardinality_error < 1
+        ):
+            raise ValueError(
+                "`cardinality_error` must be None or a number between 0 and " +
+                f"1, not {cardinality_error}"
+            )
+
+    def _validate_sparse_threshold(self, sparse_threshold):
+        if sparse_threshold is not None and (
+            not dtype_is_numeric(type(sparse_threshold)) or
+            sparse_threshold < 0
+        ):
+            raise ValueError(
+                "`sparse_threshold` must be None or a non-negative number, " +
+                f"not {sparse_threshold}"
+            )
+
+    def _validate_max_memory(self, max_memory):
+        if max_memory is not None and (
+            not dtype_is_numeric(type(max_memory)) or max_memory < 0
+        ):
+            raise ValueError(
+                "`max_memory` must be None or a non-negative number, " +
+                f"not {max_memory}"
+            )
+
+    def _validate_release_arguments(
+        self, release_intermediates, spill_dir, max_memory
     ):
-        for f in [
-            self._validate_X, self._validate_Y, self._validate_column_types,
-            self._validate_metafeature_ids, self._validate_sample_shape,
-            self._validate_n_folds, self._validate_verbose
+        if not type(release_intermediates) is bool:
+            raise ValueError("`release_intermediates` must be of type bool.")
+        if spill_dir is not None:
+            if not isinstance(spill_dir, (str, os.PathLike)):
+                raise TypeError("`spill_dir` must be a path")
+            if max_memory is None:
+                raise ValueError("`spill_dir` requires `max_memory`")
+
+    def _validate_approximate_knn(self, approximate_knn):
+        if not isinstance(approximate_knn, bool):
+            raise ValueError(
+                f"`approximate_knn` must be a bool, not {approximate_knn}"
+            )
+
+    def _validate_time_budgets(self, time_budget, group_time_budgets):
+        if group_time_budgets is None:
+            group_time_budgets = {}
+        elif not isinstance(group_time_budgets, dict):
+            raise ValueError(
+                "`group_time_budgets` must be a dict, not " +
+                f"{group_time_budgets}"
+            )
+        budgets = [("time_budget", time_budget)] + [
+            (f"group_time_budgets[{group!r}]", budget)
+            for group, budget in group_time_budgets.items()
+        ]
+        for name, budget in budgets:
+            if budget is not None and (
+                not dtype_is_numeric(type(budget)) or budget <= 0
+            ):
+                raise ValueError(
+                    f"`{name}` must be a positive number, not {budget}"
+                )
+        for group in group_time_budgets:
+            if not group in self.IDS:
+                try:
+                    self.list_metafeatures(group)
+                except ValueError:
+                    raise ValueError(
+                        f"Unknown group or metafeature {group} in " +
+                        "`group_time_budgets`"
+                    )
+
+    def _validate_cost_model_arguments(
+        self, sample_shape, target_seconds, cost_model
+    ):
+        if sample_shape == self.AUTO:
+            if (
+                not dtype_is_numeric(type(target_seconds)) or
+                not target_seconds > 0
+            ):
+                raise ValueError(
+                    "`target_seconds` must be a positive number when " +
+                    f"`sample_shape` is \"auto\", not {target_seconds}"
+                )
+        elif target_seconds is not None:
+            raise ValueError(
+                "`target_seconds` can only be given when `sample_shape` is " +
+                "\"auto\""
+            )
+        if cost_model is not None and not isinstance(cost_model, CostModel):
+            raise TypeError("`cost_model` must be a CostModel")
+
+    def _get_auto_sample_shape(
+        self, X, Y, metafeature_ids, n_folds, target_seconds, cost_model,
+        dataset_features
+    ):
+        """
+        Returns the largest sample shape whose predicted compute time of the
+        metafeatures that are not skipped, `metafeature_ids`, is at most
+        `target_seconds`, searching over the number of rows with every column
+        first, then over the number of columns with the fewest rows that can
+        be cross validated.
+        """
+        def fits(sample_shape):
+            return sum(self._get_predicted_compute_times(
+                metafeature_ids, dataset_features, sample_shape, cost_model
+            ).values()) <= target_seconds
+
+        def get_largest_fit(sizes, get_sample_shape):
+            for size in sorted(set(sizes), reverse=True):
+                if fits(get_sample_shape(size)):
+                    return size
+            return None
+
+        if fits((None, None)):
+            return (None, None)
+        n_rows, n_columns = X.shape
+        if Y is None:
+            min_rows, max_rows = 1, n_rows - 1
+        else:
+            # every training fold has more instances than classes, and the
+            # stratified sampling drops at least one instance of each class
+            n_classes = Y.nunique()
+            min_rows, max_rows = 2 * n_classes * n_folds, n_rows - n_classes
+        if max_rows < min_rows:
+            return (None, None)
+        n_sample_rows = get_largest_fit(
+            np.geomspace(min_rows, max_rows, 64).astype(int),
+            lambda size: (size, None)
+        )
+        if n_sample_rows is not None or n_columns <= 1:
+            return (n_sample_rows or min_rows, None)
+        n_sample_columns = get_largest_fit(
+            np.geomspace(1, n_columns - 1, 64).astype(int),
+            lambda size: (min_rows, size)
+        )
+        return (min_rows, n_sample_columns or 1)
+
+    def _get_predicted_compute_times(
+        self, resource_ids, dataset_features, sample_shape, cost_model
+    ):
+        """
+        Returns a dict from each resource that must be computed to obtain
+        `resource_ids`, as in `_get_resource_graph`, to its predicted
+        exclusive compute time. Resources computed on the sample of the
+        dataset are predicted from the expected features of the sample.
+        """
+        sample_features = CostModel.get_sample_features(
+            dataset_features, sample_shape
+        )
+        return {
+            resource_id: cost_model.predict(
+                resource_id,
+                sample_features if self._resource_is_sampled(resource_id)
+                else dataset_features
+            )
+            for resource_id in self._get_resource_graph(
+                resource_ids, skip_computed=False
+            )
+        }
+
+    def _add_predicted_compute_times(
+        self, computed_metafeatures, dataset_features, sample_shape,
+        cost_model
+    ):
+        """
+        Adds the predicted compute time of each computed metafeature to its
+        result and records the compute time of each resource in the cost
+        model.
+        """
+        computed_ids = [
+            mf_id for mf_id, result in computed_metafeatures.items()
+            if result[self.COMPUTE_TIME_KEY] is not None
+        ]
+        predicted_compute_times = self._get_predicted_compute_times(
+            computed_ids, dataset_features, sample_shape, cost_model
+        )
+        predicted_metafeature_times = \
+            self._get_predicted_metafeature_compute_times(
+                computed_ids, predicted_compute_times
+            )
+        for mf_id, predicted_time in predicted_metafeature_times.items():
+            computed_metafeatures[mf_id][
+                self.PREDICTED_COMPUTE_TIME_KEY
+            ] = predicted_time
+
+        sample_features = CostModel.get_sample_features(
+            dataset_features, sample_shape
+        )
+        for is_sampled, features in [
+            (False, dataset_features), (True, sample_features)
         ]:
-            f(
-                X, Y, column_types, metafeature_ids, sample_shape, seed,
-                n_folds, verbose
+            compute_times = {
+                resource_id: compute_time for resource_id, compute_time
+                in self._resource_compute_times.items()
+                if self._resource_is_sampled(resource_id) == is_sampled
+            }
+            if len(compute_times) > 0:
+                cost_model.observe(features, compute_times)
+
+    def _get_predicted_metafeature_compute_times(
+        self, metafeature_ids, predicted_compute_times
+    ):
+        """
+        Accumulates the predicted exclusive compute times of the resources
+        over their dependencies, as `compute_time` is in `_get_resource`.
+        """
+        predicted_times = {}
+
+        def get_predicted_time(resource_id):
+            if self._resources_info[resource_id]["function"] == "":
+                return 0.
+            resource_id = self._resources_info[resource_id]["returns"][0]
+            if not resource_id in predicted_times:
+                predicted_times[resource_id] = (
+                    predicted_compute_times[resource_id] + sum(
+                        get_predicted_time(dependency)
+                        for dependency in self._get_dependencies(resource_id)
+                    )
+                )
+            return predicted_times[resource_id]
+
+        return {
+            mf_id: get_predicted_time(mf_id) for mf_id in metafeature_ids
+        }
+
+    @classmethod
+    def _resource_is_sampled(cls, resource_id):
+        """
+        Whether `resource_id` is computed on the sample of the dataset rather
+        than on the whole dataset.
+        """
+        return any(
+            argument in ["XSample", "YSample"] or (
+                argument in cls._resources_info and
+                cls._resource_is_sampled(argument)
             )
+            for argument in cls._resources_info[resource_id][
+                "arguments"
+            ].values()
+        )
+
+    def _get_group_budgets(self, group_time_budgets):
+        """
+        Returns the group budgets of a TimeBudget, resolving each group of
+        `group_time_budgets` to its metafeatures.
+        """
+        group_budgets = {}
+        if group_time_budgets is not None:
+            for group, seconds in group_time_budgets.items():
+                if group in self.IDS:
+                    group_ids = {group}
+                else:
+                    group_ids = set(self.list_metafeatures(group))
+                group_budgets[group] = (seconds, group_ids)
+        return group_budgets
+
+    def _read_arrow_input(
+        self, X, Y, metafeature_ids, sample_shape, seed, plan
+    ):
+        """
+        Reads the Arrow input X as a pandas.DataFrame, and Y as its column
+        named Y when Y is a str. Only the columns of X that the requested
+        metafeatures need are read. When they only need the sampled columns
+        of X, the columns that `_sample_columns` would sample are found from
+        the metadata of X and read, so that the sample is unchanged.
+        """
+        source = ArrowSource(X)
+        target_name = Y if isinstance(Y, str) else None
+        if not target_name is None and not target_name in source.column_names:
+            raise ValueError(f"Y column {target_name} is not a column of X")
+        feature_names = [
+            col for col in source.column_names if col != target_name
+        ]
+        if plan is None:
+            plan = self.plan(metafeature_ids, Y is not None)
+        feature_consumers = set(
+            resource_id
+            for resource_id, dependencies in plan.dependencies.items()
+            if "X_raw" in dependencies or "X" in dependencies
+        )
+        read_names = feature_names
+        if len(feature_consumers) == 0:
+            read_names = []
+        elif (
+            feature_consumers == {"XSampledColumns"} and
+            type(sample_shape) in [tuple, list] and len(sample_shape) == 2 and
+            isinstance(sample_shape[1], (int, np.integer)) and
+            sample_shape[1] >= 1 and isinstance(seed, (int, np.integer))
+        ):
+            columns_with_values = source.get_columns_with_values()
+            if not columns_with_values is None:
+                # the columns of X_raw with values are X, see
+                # _drop_missing_columns
+                X_names = pd.Index([
+                    col for col in columns_with_values if col != target_name
+                ])
+                seed_offset = self._resources_info["XSampledColumns"][
+                    "arguments"
+                ]["seed"]
+                read_names = list(self._sample_columns(
+                    pd.DataFrame(columns=X_names), sample_shape,
+                    seed + seed_offset
+                )[0].columns)
+        if target_name is None:
+            X = source.read(read_names)
+        else:
+            X = source.read(read_names + [target_name])
+            Y = X.pop(target_name)
+        if (
+            read_names != feature_names and len(read_names) > 0 and
+            len(self._drop_missing_columns(X).columns) < len(read_names)
+        ):
+            # missing values the metadata does not count, e.g. NaN values
+            # that are not nulls, change the sampled columns
+            X = source.read(feature_names)
+        return X, Y
+
+    def _wrap_array_input(self, X, Y, column_types):
+        """
+        Wraps the 2-D numpy.ndarray X, and Y when it is a numpy.ndarray, in
+        pandas objects that share their memory. The columns of X are named
+        by their positions, and Y by the position following them, which are
+        the positions of their types in a column_types list.
+        """
+        if X.ndim != 2:
+            raise ValueError("X must be a 2-dimensional numpy.ndarray")
+        X = pd.DataFrame(X, copy=False)
+        if isinstance(Y, np.ndarray):
+            if Y.shape != (X.shape[0],):
+                raise ValueError(
+                    "Y must be a 1-dimensional numpy.ndarray with one value " +
+                    "per row of X"
+                )
+            Y = pd.Series(Y, name=X.shape[1], copy=False)
+        if type(column_types) in [list, tuple]:
+            n_columns = X.shape[1] + (0 if Y is None else 1)
+            if len(column_types) != n_columns:
+                raise ValueError(
+                    f"Expected {n_columns} column types, one per column of " +
+                    "X followed by the type of Y when Y is given"
+                )
+            column_types = dict(enumerate(column_types))
+            if not Y is None:
+                # Y keeps its name when given as a pandas.Series
+                column_types[Y.name] = column_types.pop(X.shape[1])
+        return X, Y, column_types
 
     def _validate_X(
         self, X, Y, column_types, metafeature_ids, sample_shape, seed, n_folds,
@@ -248,20 +1671,39 @@ class Metafeatures(object):
         verbose
     ):
         if metafeature_ids is not None:
-            invalid_metafeature_ids = [
-                mf for mf in metafeature_ids if mf not in self._resources_info
-            ]
-            if len(invalid_metafeature_ids) > 0:
-                raise ValueError(
-                    'One or more requested metafeatures are not valid: {}'.
-                    format(invalid_metafeature_ids)
-                )
+            self._check_metafeature_ids(metafeature_ids)
+
+    @classmethod
+    def _check_metafeature_ids(cls, metafeature_ids):
+        invalid_metafeature_ids = [
+            mf for mf in metafeature_ids if mf not in cls._resources_info
+        ]
+        if len(invalid_metafeature_ids) > 0:
+            raise ValueError(
+                'One or more requested metafeatures are not valid: {}'.
+                format(invalid_metafeature_ids)
+            )
+
+    def _validate_plan(self, Y, metafeature_ids, plan):
+        if plan is None:
+            return
+        if not isinstance(plan, MetafeaturePlan):
+            raise TypeError("`plan` must be a MetafeaturePlan")
+        if metafeature_ids is not None:
+            raise ValueError(
+                "`metafeature_ids` cannot be given with a `plan`"
+            )
+        if plan.has_targets != (Y is not None):
+            raise ValueError(
+                "The plan is for datasets " +
+                ("with" if plan.has_targets else "without") + " targets"
+            )
 
     def _validate_sample_shape(
         self, X, Y, column_types, metafeature_ids, sample_shape, seed, n_folds,
         verbose
     ):
-        if not sample_shape is None:
+        if not sample_shape is None and not sample_shape == self.AUTO:
             if not type(sample_shape) in [tuple, list]:
                 raise ValueError(
                     "`sample_shape` must be of type `tuple` or `list`"
@@ -290,10 +1732,8 @@ class Metafeatures(object):
         if not Y is None and metafeature_ids is not None:
             # when computing landmarking metafeatures, there must be at least
             # n_folds instances of each class of Y
-            landmarking_mfs = self.list_metafeatures(group="landmarking")
-            if len(list(filter(
-                lambda mf_id: mf_id in landmarking_mfs,metafeature_ids
-            ))):
+            landmarking_mfs = self._metafeature_groups["landmarking"]
+            if any(mf_id in landmarking_mfs for mf_id in metafeature_ids):
                 Y_grouped = Y.groupby(Y)
                 for group_id, group in Y_grouped:
                     if group.shape[0] < n_folds:
@@ -329,27 +1769,199 @@ class Metafeatures(object):
             resource_info = self._resources_info[resource_id]
             f_name = resource_info["function"]
             f = self._get_function(f_name)
-            args, total_time = self._get_arguments(resource_id)
-            return_resources = resource_info["returns"]
             start_timestamp = time.time()
-            computed_resources = f(**args)
-            compute_time = time.time() - start_timestamp
-            total_time += compute_time
-            for res_id, computed_resource in zip(
-                return_resources, computed_resources
-            ):
-                self._resources[res_id] = {
-                    self.VALUE_KEY: computed_resource,
-                    self.COMPUTE_TIME_KEY: total_time
-                }
+            args, total_time = self._get_arguments(resource_id)
+            computed_resources, compute_time, trace = call_resource_function(
+                f, args, self._profile is not None and
+                self._profile.trace_memory
+            )
+            self._set_resources(
+                resource_id, computed_resources, total_time + compute_time,
+                compute_time
+            )
+            self._add_resource_profile(
+                resource_id, start_timestamp, time.time(), trace
+            )
+            self._release_consumed(resource_id)
+        elif (
+            self._profile is not None and
+            self._resources_info[resource_id]["function"] != ""
+        ):
+            self._profile.add_reuse(
+                self._resources_info[resource_id]["returns"][0]
+            )
         resource = self._resources[resource_id]
         return resource[self.VALUE_KEY], resource[self.COMPUTE_TIME_KEY]
 
+    def _set_resources(
+        self, resource_id, computed_resources, total_time, compute_time
+    ):
+        return_resources = self._resources_info[resource_id]["returns"]
+        self._resource_compute_times[return_resources[0]] = compute_time
+        for res_id, computed_resource in zip(
+            return_resources, computed_resources
+        ):
+            self._resources[res_id] = {
+                self.VALUE_KEY: computed_resource,
+                self.COMPUTE_TIME_KEY: total_time
+            }
+
+    def _add_resource_profile(self, resource_id, start, end, trace):
+        if self._profile is None:
+            return
+        resource_id = self._resources_info[resource_id]["returns"][0]
+        self._profile.add(ResourceProfile(
+            resource_id, self._resource_compute_times[resource_id],
+            self._resources[resource_id][self.COMPUTE_TIME_KEY],
+            memory=trace["memory"], start=start, end=end, pid=trace["pid"],
+            tid=trace["tid"]
+        ))
+
+    @classmethod
+    def _get_dependencies(cls, resource_id):
+        dependencies = []
+        args = cls._resources_info[resource_id]["arguments"]
+        for parameter, argument in args.items():
+            if parameter == "seed":
+                dependencies.append("seed_base")
+            elif type(argument) is str and argument in cls._resources_info:
+                dependencies.append(argument)
+        return dependencies
+
+    def _get_resource_graph(self, resource_ids, skip_computed=True):
+        """
+        Returns a dict from each resource that must be computed to obtain
+        `resource_ids` to the resources it depends on. Resources returned by
+        the same function call are represented by the first resource that the
+        function returns. When `skip_computed` is False, resources that were
+        already computed are included too.
+        """
+        graph = {}
+        stack = list(resource_ids)
+        while len(stack) > 0:
+            resource_id = stack.pop()
+            if (
+                skip_computed and resource_id in self._resources or
+                self._resources_info[resource_id]["function"] == ""
+            ):
+                continue
+            resource_id = self._resources_info[resource_id]["returns"][0]
+            if resource_id in graph:
+                continue
+            graph[resource_id] = self._get_dependencies(resource_id)
+            stack.extend(graph[resource_id])
+        return graph
+
+    def _compute_resources_concurrently(
+        self, resource_ids, n_jobs, backend, verbose, deadline=None
+    ):
+        """
+        Computes `resource_ids` and all of their dependencies using a pool of
+        `n_jobs` workers. A resource is submitted to the pool as soon as all of
+        its arguments have been computed, so independent branches of the
+        resource graph run concurrently. Compute times are accumulated over
+        dependencies exactly as in `_get_resource`. When the `deadline`
+        timestamp passes, returns without waiting for the running resources,
+        which are left uncomputed.
+        """
+        pending = self._get_resource_graph(resource_ids)
+        running = {}
+        if backend == self.THREAD:
+            executor_class = ThreadPoolExecutor
+        else:
+            executor_class = ProcessPoolExecutor
+        executor = executor_class(max_workers=n_jobs)
+        timed_out = False
+        try:
+            while len(pending) > 0 or len(running) > 0:
+                if deadline is not None and time.time() >= deadline:
+                    timed_out = True
+                    break
+                ready = [
+                    resource_id for resource_id in self._resources_info
+                    if resource_id in pending and all(
+                        dependency in self._resources
+                        for dependency in pending[resource_id]
+                    )
+                ]
+                if len(ready) == 0 and len(running) == 0:
+                    raise Exception(
+                        f"unresolvable resource dependencies: {list(pending)}"
+                    )
+                for resource_id in ready:
+                    del pending[resource_id]
+                    if verbose == True:
+                        print(resource_id)
+                    args, total_time = self._get_arguments(resource_id)
+                    future = executor.submit(
+                        _compute_resource_function, type(self),
+                        self._resources_info[resource_id]["function"], args,
+                        self._profile is not None and
+                        self._profile.trace_memory
+                    )
+                    running[future] = (resource_id, total_time)
+                timeout = None
+                if deadline is not None:
+                    timeout = max(deadline - time.time(), 0)
+                done, _ = wait(
+                    running, timeout=timeout, return_when=FIRST_COMPLETED
+                )
+                if len(done) == 0:
+                    timed_out = True
+                    break
+                for future in done:
+                    resource_id, total_time = running.pop(future)
+                    computed_resources, compute_time, trace = future.result()
+                    self._set_resources(
+                        resource_id, computed_resources,
+                        total_time + compute_time, compute_time
+                    )
+                    self._add_resource_profile(
+                        resource_id, trace["start"],
+                        trace["start"] + compute_time, trace
+                    )
+                    self._release_consumed(resource_id)
+        finally:
+            executor.shutdown(wait=not timed_out, cancel_futures=True)
+
     def _get_function(self, f_name):
         if f_name.startswith("self."):
             return getattr(self, f_name[len("self."):])
         else:
-            return globals()[f_name]
+            return getattr(self._import_kernel_module(f_name), f_name)
+
+    @classmethod
+    def _import_kernel_module(cls, f_name):
+        for module_name, f_names in cls._KERNEL_MODULES.items():
+            if f_name in f_names:
+                return importlib.import_module(
+                    f".{module_name}", __package__
+                )
+        raise ValueError(f"Unknown kernel function {f_name}")
+
+    @classmethod
+    def _import_kernel_modules(cls, metafeature_ids=None):
+        """
+        Imports the kernel modules needed to compute `metafeature_ids`, by
+        default all metafeatures, and their dependencies.
+        """
+        if metafeature_ids is None:
+            metafeature_ids = cls.IDS
+        stack = list(metafeature_ids)
+        visited = set()
+        while len(stack) > 0:
+            resource_id = stack.pop()
+            if resource_id in visited:
+                continue
+            visited.add(resource_id)
+            resource_info = cls._resources_info[resource_id]
+            f_name = resource_info["function"]
+            if f_name != "" and not f_name.startswith("self."):
+                cls._import_kernel_module(f_name)
+            stack.extend(
+                argument for argument in resource_info["arguments"].values()
+                if type(argument) is str and argument in cls._resources_info
+            )
 
     def _get_arguments(self, resource_id):
         resource_info = self._resources_info[resource_id]
@@ -374,19 +1986,59 @@ class Metafeatures(object):
             total_time += compute_time
         return (resolved_parameters, total_time)
 
-    def _get_preprocessed_data(self, X_sample, X_sampled_columns, column_types, seed):
-        series_array = []
+    def _get_preprocessed_data(
+        self, X_sample, X_sampled_columns, column_types, sparse_threshold, seed
+    ):
+        """
+        Imputes the missing values of X_sample with values drawn from their
+        column and one-hot encodes the categorical features. The result is a
+        pandas.DataFrame, or a scipy.sparse CSR matrix when its dense float64
+        representation would take more than `sparse_threshold` bytes.
+        """
+        imputed_series = []
         for feature in X_sample.columns:
-            feature_series = X_sample[feature].copy()
-            col = feature_series.values
-            dropped_nan_series = X_sampled_columns[feature].dropna(
-                axis=0,how='any'
-            )
-            num_nan = np.sum(feature_series.isnull())
-            np.random.seed(seed)
-            col[feature_series.isnull()] = np.random.choice(
-                dropped_nan_series, size=num_nan
-            )
+            feature_series = X_sample[feature]
+            is_missing = feature_series.isnull().values
+            num_nan = np.sum(is_missing)
+            if num_nan > 0:
+                # only the columns with missing values are copied
+                feature_series = feature_series.copy()
+                dropped_nan_series = X_sampled_columns[feature].dropna(
+                    axis=0,how='any'
+                )
+                feature_series.values[is_missing] = np.random.RandomState(
+                    seed
+                ).choice(dropped_nan_series, size=num_nan)
+            imputed_series.append(feature_series)
+
+        n_encoded_features = sum(
+            feature_series.nunique()
+            if column_types[feature_series.name] == self.CATEGORICAL else 1
+            for feature_series in imputed_series
+        )
+        dense_size = X_sample.shape[0] * n_encoded_features * 8
+        if sparse_threshold is not None and dense_size > sparse_threshold:
+            from scipy.sparse import csr_matrix, hstack as sparse_hstack
+            blocks = []
+            for feature_series in imputed_series:
+                if column_types[feature_series.name] == self.CATEGORICAL:
+                    # columns in the order of pd.get_dummies
+                    codes, uniques = pd.factorize(feature_series, sort=True)
+                    block = csr_matrix(
+                        (
+                            np.ones(codes.shape[0]),
+                            (np.arange(codes.shape[0]), codes)
+                        ), shape=(codes.shape[0], len(uniques))
+                    )
+                else:
+                    block = csr_matrix(
+                        feature_series.values.astype(np.float64).reshape(-1, 1)
+                    )
+                blocks.append(block)
+            return (sparse_hstack(blocks, format="csr"),)
+
+        series_array = []
+        for feature_series in imputed_series:
             if column_types[feature_series.name] == self.CATEGORICAL:
                 feature_series = pd.get_dummies(feature_series)
             series_array.append(feature_series)
@@ -396,8 +2048,7 @@ class Metafeatures(object):
         if sample_shape[1] is None or X.shape[1] <= sample_shape[1]:
             X_sample = X
         else:
-            np.random.seed(seed)
-            sampled_column_indices = np.random.choice(
+            sampled_column_indices = np.random.RandomState(seed).choice(
                 X.shape[1], size=sample_shape[1], replace=False
             )
             sampled_columns = X.columns[sampled_column_indices]
@@ -413,12 +2064,12 @@ class Metafeatures(object):
         if sample_shape[0] is None or X.shape[0] <= sample_shape[0]:
             X_sample, Y_sample = X, Y
         elif Y is None:
-            np.random.seed(seed)
-            row_indices = np.random.choice(
+            row_indices = np.random.RandomState(seed).choice(
                 X.shape[0], size=sample_shape[0], replace=False
             )
             X_sample, Y_sample = X.iloc[row_indices], Y
         else:
+            from sklearn.model_selection import StratifiedShuffleSplit
             drop_size = X.shape[0] - sample_shape[0]
             sample_size = sample_shape[0]
             sss = StratifiedShuffleSplit(
@@ -428,48 +2079,105 @@ class Metafeatures(object):
             X_sample, Y_sample = X.iloc[row_indices], Y.iloc[row_indices]
         return (X_sample, Y_sample)
 
-    def _get_categorical_features_with_no_missing_values(
-        self, X_sample, column_types
-    ):
-        categorical_features_with_no_missing_values = []
+    def _get_categorical_feature_codes(self, X_sample, column_types):
+        categorical_feature_codes = []
         for feature in X_sample.columns:
             if column_types[feature] == self.CATEGORICAL:
-                no_nan_series = X_sample[feature].dropna(
-                    axis=0, how='any'
-                )
-                categorical_features_with_no_missing_values.append(
-                    no_nan_series
-                )
-        return (categorical_features_with_no_missing_values,)
+                categorical_feature_codes.append(get_codes(X_sample[feature]))
+        return (categorical_feature_codes,)
 
-    def _get_categorical_features_and_class_with_no_missing_values(
-        self, X_sample, Y_sample, column_types
+    def _get_class_codes(self, Y_sample):
+        return (get_codes(Y_sample),)
+
+    def _get_categorical_contingency_tables(
+        self, categorical_feature_codes, class_codes
     ):
-        categorical_features_and_class_with_no_missing_values = []
-        for feature in X_sample.columns:
-            if column_types[feature] == self.CATEGORICAL:
-                df = pd.concat([X_sample[feature],Y_sample], axis=1).dropna(
-                    axis=0, how='any'
-                )
-                categorical_features_and_class_with_no_missing_values.append(
-                    (df[feature],df[Y_sample.name])
-                )
-        return (categorical_features_and_class_with_no_missing_values,)
+        """
+        Builds the contingency table of every categorical feature and the
+        class from their integer codes, ignoring the instances where either
+        is missing.
+        """
+        contingency_tables = [
+            get_contingency_table_from_codes(*feature_codes, *class_codes)
+            for feature_codes in categorical_feature_codes
+        ]
+        return (contingency_tables,)
+
+    def _get_numeric_feature_values(self, X_sample, column_types):
+        """
+        Copies the numeric features of X_sample once into a column-major
+        float64 array, shared by the resources computed on the numeric
+        features, along with the boolean mask of its values that are not
+        missing. When every feature is numeric and X_sample already holds a
+        single float64 array, e.g. a wrapped numpy.ndarray, that array is
+        used without a copy.
+        """
+        numeric_features = get_numeric_features(X_sample, column_types)
+        if (
+            len(numeric_features) == X_sample.shape[1] and
+            all(isinstance(dtype, np.dtype) for dtype in X_sample.dtypes)
+        ):
+            # no copy for a single float64 block, the resources computed from
+            # the values never modify them
+            values = np.asarray(X_sample.values, dtype=np.float64)
+            return (values, ~np.isnan(values))
+        values = np.empty(
+            (X_sample.shape[0], len(numeric_features)), dtype=np.float64,
+            order="F"
+        )
+        for i, feature in enumerate(numeric_features):
+            values[:, i] = X_sample[feature].values
+        return (values, ~np.isnan(values))
 
     def _get_numeric_features_with_no_missing_values(
-        self, X_sample, column_types
+        self, numeric_feature_values, numeric_feature_mask
     ):
+        """
+        Returns the values of each numeric feature that are not missing, as
+        a view of the shared array for the features without missing values.
+        """
         numeric_features_with_no_missing_values = []
-        for feature in X_sample.columns:
-            if column_types[feature] == self.NUMERIC:
-                no_nan_series = X_sample[feature].dropna(
-                    axis=0, how='any'
-                )
-                numeric_features_with_no_missing_values.append(
-                    no_nan_series
-                )
+        for i in range(numeric_feature_values.shape[1]):
+            is_valid = numeric_feature_mask[:, i]
+            if is_valid.all():
+                feature_values = numeric_feature_values[:, i]
+            else:
+                feature_values = numeric_feature_values[is_valid, i]
+            numeric_features_with_no_missing_values.append(feature_values)
         return (numeric_features_with_no_missing_values,)
 
+    def _get_numeric_feature_moments(self, numeric_feature_values):
+        """
+        Computes the mean, standard deviation, skewness and kurtosis of every
+        numeric feature, ignoring missing values, in one vectorized pass over
+        the numeric columns.
+        """
+        mean, stdev, skewness, kurtosis = get_moment_statistics(
+            *get_moments(numeric_feature_values)
+        )
+        return ({
+            "mean": mean, "stdev": stdev, "skewness": skewness,
+            "kurtosis": kurtosis
+        },)
+
+    def _get_column_cardinalities(self, X, column_types, cardinality_error):
+        """
+        Returns a pandas.Series of the number of distinct values of every
+        column of X, counting missing values as one value. When
+        `cardinality_error` is given, the counts are estimated with
+        HyperLogLog sketches, hashing blocks of rows of all columns at once.
+        """
+        if cardinality_error is None:
+            cardinalities = [X[col].unique().shape[0] for col in X.columns]
+        else:
+            sketch = HyperLogLog(X.shape[1], cardinality_error)
+            for start in range(0, X.shape[0], self.SKETCH_BLOCK_SIZE):
+                sketch.update(hash_columns(
+                    X.iloc[start:start+self.SKETCH_BLOCK_SIZE], column_types
+                ))
+            cardinalities = sketch.estimate()
+        return (pd.Series(cardinalities, index=X.columns),)
+
     def _get_binned_numeric_features_with_no_missing_values(
         self, numeric_features_array
     ):
@@ -482,17 +2190,16 @@ class Metafeatures(object):
         return (binned_feature_array,)
 
     def _get_binned_numeric_features_and_class_with_no_missing_values(
-        self, X_sample, Y_sample, column_types
+        self, numeric_feature_values, numeric_feature_mask, Y_sample
     ):
+        labels = Y_sample.values
+        class_is_valid = Y_sample.notnull().values
         numeric_features_and_class_with_no_missing_values = []
-        for feature in X_sample.columns:
-            if column_types[feature] == self.NUMERIC:
-                df = pd.concat([X_sample[feature],Y_sample], axis=1).dropna(
-                    axis=0, how='any'
-                )
-                numeric_features_and_class_with_no_missing_values.append(
-                    (df[feature],df[Y_sample.name])
-                )
+        for i in range(numeric_feature_values.shape[1]):
+            is_valid = numeric_feature_mask[:, i] & class_is_valid
+            numeric_features_and_class_with_no_missing_values.append(
+                (numeric_feature_values[is_valid, i], labels[is_valid])
+            )
         binned_feature_class_array = [
             (
                 pd.cut(feature_class_pair[0],
@@ -501,3 +2208,35 @@ class Metafeatures(object):
             ) for feature_class_pair in numeric_features_and_class_with_no_missing_values
         ]
         return (binned_feature_class_array,)
+
+
+def _compute_resource_function(
+    metafeatures_class, f_name, args, trace_memory=False
+):
+    """
+    Computes a single resource in a worker of the concurrent scheduler. Defined
+    at module level so that it can be sent to a process pool without pickling
+    the resources held by the calling Metafeatures instance.
+    """
+    f = metafeatures_class()._get_function(f_name)
+    return call_resource_function(f, args, trace_memory)
+
+
+def _init_compute_many_worker(metafeatures_class, metafeature_ids):
+    # import the kernel modules needed by the batch and their dependencies
+    # once, when the worker starts, instead of when it receives its first
+    # dataset
+    metafeatures_class._import_kernel_modules(metafeature_ids)
+
+def _compute_many_task(task):
+    index, dataset, metafeatures_class, compute_kwargs = task
+    try:
+        if callable(dataset):
+            dataset = dataset()
+        X, Y, column_types = dataset
+        computed_metafeatures = metafeatures_class().compute(
+            X, Y, column_types, **compute_kwargs
+        )
+        return index, computed_metafeatures, None
+    except Exception:
+        return index, None, traceback.format_exc()
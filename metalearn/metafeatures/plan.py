@@ -0,0 +1,47 @@
+class MetafeaturePlan(object):
+    """
+    The dependency graph of metafeatures.json resolved for a request of
+    metafeatures, see `Metafeatures.plan`. A plan is immutable and can be
+    passed to any number of `Metafeatures.compute` calls, which then skip
+    resolving and validating the request.
+
+    Attributes
+    ----------
+    metafeature_ids: tuple, the requested metafeatures, in the order their
+        results are returned
+    has_targets: bool, whether the plan is for datasets with targets
+    target_dependent_ids: frozenset, the requested metafeatures that depend
+        on the targets
+    skipped_ids: frozenset, the requested metafeatures that cannot be
+        computed because the datasets have no targets
+    resource_ids: tuple, the minimal set of resources computed to obtain the
+        metafeatures that are not skipped, sorted so that every resource
+        comes after its arguments. Resources returned by the same function
+        call are represented by the first resource the function returns.
+    dependencies: dict, from each resource of `resource_ids` to the tuple of
+        resources it takes as arguments
+    groups: dict, from each resource of `resource_ids` to the tuple of all
+        resources returned by its function
+    includes_landmarking: bool, whether a landmarking metafeature is
+        requested
+    """
+
+    def __init__(
+        self, metafeature_ids, has_targets, target_dependent_ids, skipped_ids,
+        resource_ids, dependencies, groups, includes_landmarking
+    ):
+        self.metafeature_ids = tuple(metafeature_ids)
+        self.has_targets = has_targets
+        self.target_dependent_ids = frozenset(target_dependent_ids)
+        self.skipped_ids = frozenset(skipped_ids)
+        self.resource_ids = tuple(resource_ids)
+        self.dependencies = dependencies
+        self.groups = groups
+        self.includes_landmarking = includes_landmarking
+
+    def __repr__(self):
+        return (
+            f"MetafeaturePlan({len(self.metafeature_ids)} metafeatures, " +
+            f"{len(self.resource_ids)} resources, " +
+            f"has_targets={self.has_targets})"
+        )
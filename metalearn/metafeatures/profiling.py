@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import threading
+import tracemalloc
+
+import pandas as pd
+
+
+class ResourceProfile(object):
+    """
+    The measurements of a single resource of metafeatures.json, see `Profile`.
+    Times are in seconds, memory is in bytes and timestamps are as returned by
+    time.time().
+
+    Attributes
+    ----------
+    resource_id: str, the resource, or the first resource returned by its
+        function
+    exclusive_time: float, the time spent in the function of the resource,
+        excluding the time taken to compute its arguments
+    inclusive_time: float, the `compute_time` of the resource, which also
+        includes the time taken to compute all of its upstream dependencies
+    memory: int, the peak memory allocated by the function of the resource
+        above the memory allocated when it was called, or None when memory is
+        not traced
+    cache_hit: bool, whether the resource was read from the persistent cache
+        instead of being computed
+    n_reuses: int, the number of times the computed resource was reused by
+        other resources or metafeatures
+    start, end: float, the timestamps of the start and end of the
+        computation, including the arguments computed for this resource
+    pid, tid: int, the process and thread that computed the resource
+    """
+
+    def __init__(
+        self, resource_id, exclusive_time, inclusive_time, memory=None,
+        cache_hit=False, start=None, end=None, pid=None, tid=None
+    ):
+        self.resource_id = resource_id
+        self.exclusive_time = exclusive_time
+        self.inclusive_time = inclusive_time
+        self.memory = memory
+        self.cache_hit = cache_hit
+        self.n_reuses = 0
+        self.start = start
+        self.end = end
+        self.pid = pid
+        self.tid = tid
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class Profile(object):
+    """
+    Collects the exclusive time, inclusive time, peak memory and cache status
+    of every resource computed by `Metafeatures.compute`. Pass a Profile as
+    the `profile` argument of compute, then inspect `resources`, a dict from
+    resource id to ResourceProfile, or export the computation to the Chrome
+    trace event format with `save_chrome_trace` and open it in
+    chrome://tracing or https://ui.perfetto.dev.
+    """
+
+    def __init__(self, trace_memory=True):
+        """
+        Parameters
+        ----------
+        trace_memory: bool, default True. Whether to measure the memory
+            allocated by each resource with tracemalloc, which slows down the
+            computation. Memory is not attributed precisely to resources
+            computed concurrently by the thread backend.
+        """
+        if not type(trace_memory) is bool:
+            raise ValueError("`trace_memory` must be of type bool.")
+        self.trace_memory = trace_memory
+        self.resources = {}
+        self._started_tracing = False
+
+    def start(self):
+        """ Clears the profile and starts tracing memory if needed. """
+        self.resources = {}
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def add(self, resource_profile):
+        self.resources[resource_profile.resource_id] = resource_profile
+
+    def add_reuse(self, resource_id):
+        if resource_id in self.resources:
+            self.resources[resource_id].n_reuses += 1
+
+    def to_dataframe(self):
+        """
+        Returns a pandas.DataFrame with one row per resource, indexed by
+        resource id, in the order the computations of the resources started.
+        """
+        dataframe = pd.DataFrame(
+            [profile.to_dict() for profile in self.resources.values()],
+            columns=[
+                "resource_id", "exclusive_time", "inclusive_time", "memory",
+                "cache_hit", "n_reuses", "start", "end", "pid", "tid"
+            ]
+        )
+        return dataframe.sort_values("start", kind="mergesort").set_index(
+            "resource_id"
+        )
+
+    def to_chrome_trace(self):
+        """
+        Returns the profile as a json serializable dict in the Chrome trace
+        event format. Each computed resource is a complete event spanning its
+        computation, in which the events of the arguments it computed are
+        nested. Resources read from the persistent cache are instant events.
+        """
+        starts = [
+            profile.start for profile in self.resources.values()
+            if profile.start is not None
+        ]
+        origin = min(starts, default=0.)
+        events = []
+        for profile in self.resources.values():
+            event = {
+                "name": profile.resource_id,
+                "pid": profile.pid if profile.pid is not None else os.getpid(),
+                "tid": profile.tid if profile.tid is not None else
+                    threading.main_thread().ident,
+                "args": {
+                    "exclusive_time": profile.exclusive_time,
+                    "inclusive_time": profile.inclusive_time,
+                    "memory": profile.memory,
+                    "cache_hit": profile.cache_hit,
+                    "n_reuses": profile.n_reuses
+                }
+            }
+            if profile.cache_hit:
+                event.update({"cat": "cache", "ph": "i", "ts": 0, "s": "g"})
+            else:
+                event.update({
+                    "cat": "resource", "ph": "X",
+                    "ts": (profile.start - origin) * 1e6,
+                    "dur": (profile.end - profile.start) * 1e6
+                })
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+
+
+def _reset_peak_memory():
+    """
+    Resets the peak memory traced by tracemalloc to the current memory.
+    tracemalloc.reset_peak requires Python 3.9, so earlier versions restart
+    tracing instead, which also forgets the blocks allocated so far: the
+    current memory restarts from 0, and the peak is still the memory
+    allocated since the reset.
+    """
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.stop()
+        tracemalloc.start()
+
+def call_resource_function(f, args, trace_memory=False):
+    """
+    Calls the function of a resource on its arguments.
+
+    Returns
+    -------
+    (computed_resources, compute_time, trace), where trace is a dict of the
+    `start` timestamp of the call, the peak `memory` it allocated, or None
+    when trace_memory is False, and the `pid` and `tid` that called it
+    """
+    if trace_memory:
+        if not tracemalloc.is_tracing(): # in a worker process
+            tracemalloc.start()
+        _reset_peak_memory()
+        start_memory, _ = tracemalloc.get_traced_memory()
+    start_timestamp = time.time()
+    computed_resources = f(**args)
+    compute_time = time.time() - start_timestamp
+    memory = None
+    if trace_memory:
+        _, peak_memory = tracemalloc.get_traced_memory()
+        memory = peak_memory - start_memory
+    return computed_resources, compute_time, {
+        "start": start_timestamp,
+        "memory": memory,
+        "pid": os.getpid(),
+        "tid": threading.get_ident()
+    }
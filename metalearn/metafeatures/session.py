@@ -0,0 +1,101 @@
+import os
+
+from .profiling import Profile
+
+
+class MetafeatureSession(object):
+    """
+    A dataset bound to the resources of metafeatures.json computed on it,
+    returned by `Metafeatures.session`. The intermediate resources (samples,
+    preprocessed features, cross validation folds, ...) computed by one call
+    to `compute` are kept for the next calls, which only compute the
+    resources that are missing. Results are identical to those of
+    `Metafeatures.compute` with the same dataset and arguments.
+    """
+
+    def __init__(self, metafeatures, max_memory=None):
+        """
+        Parameters
+        ----------
+        metafeatures: Metafeatures, the instance holding the resources of the
+            session, whose resources were initialized with the dataset
+        max_memory: int, default None. The number of bytes the intermediate
+            resources may hold, see `get_memory_usage`. Intermediates are
+            released while computing metafeatures until they fit, as with the
+            `max_memory` argument of `Metafeatures.compute`. None keeps every
+            intermediate until `release` is called.
+        """
+        self._metafeatures = metafeatures
+        self.max_memory = max_memory
+
+    @property
+    def seed(self):
+        return self._metafeatures._resources["seed_base"][
+            self._metafeatures.VALUE_KEY
+        ]
+
+    def compute(
+        self, metafeature_ids=None, verbose=False, n_jobs=1,
+        backend="thread", time_budget=None, group_time_budgets=None,
+        profile=None
+    ) -> dict:
+        """
+        Computes `metafeature_ids` on the dataset of the session, default of
+        None indicating all metafeatures. The other parameters are those of
+        `Metafeatures.compute`. Metafeatures computed by a previous call are
+        returned as they were computed, with the same `compute_time`.
+        """
+        metafeatures = self._metafeatures
+        X, Y, column_types, sample_shape, seed, n_folds, approximate_knn = [
+            metafeatures._resources[resource_id][metafeatures.VALUE_KEY]
+            for resource_id in [
+                "X_raw", "Y", "column_types", "sample_shape", "seed_base",
+                "n_folds", "approximate_knn"
+            ]
+        ]
+        for f in [
+            metafeatures._validate_metafeature_ids,
+            metafeatures._validate_n_folds, metafeatures._validate_verbose
+        ]:
+            f(
+                X, Y, column_types, metafeature_ids, sample_shape, seed,
+                n_folds, verbose
+            )
+        if profile is not None and not isinstance(profile, Profile):
+            raise TypeError("`profile` must be a Profile")
+        metafeatures._validate_scheduler_arguments(n_jobs, backend)
+        metafeatures._validate_time_budgets(time_budget, group_time_budgets)
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+        plan = metafeatures.plan(metafeature_ids, Y is not None)
+        if Y is not None and column_types[Y.name] == metafeatures.NUMERIC:
+            skipped_ids = plan.target_dependent_ids
+        else:
+            skipped_ids = plan.skipped_ids
+
+        computed_metafeatures = metafeatures._compute_metafeatures(
+            list(plan.metafeature_ids), skipped_ids, verbose, n_jobs, backend,
+            time_budget, group_time_budgets, approximate_knn, profile,
+            self.max_memory
+        )
+        return {
+            mf_id: computed_metafeatures[mf_id]
+            for mf_id in plan.metafeature_ids
+        }
+
+    def get_memory_usage(self):
+        """
+        Returns the estimated number of bytes held by the intermediate
+        resources of the session, excluding the dataset itself and the
+        computed metafeatures.
+        """
+        return sum(self._metafeatures._get_intermediate_sizes().values())
+
+    def release(self):
+        """
+        Releases every intermediate resource. Computed metafeatures are kept,
+        while the intermediates are computed again when needed.
+        """
+        self._metafeatures._release_resources(
+            list(self._metafeatures._get_intermediate_sizes())
+        )
@@ -33,20 +33,23 @@ def get_missing_values(X):
 
 def get_class_stats(Y):
     classes = Y.unique()
-    number_of_classes = classes.shape[0]
     counts = [sum(Y == label) for label in classes]
-    probs = [count/Y.shape[0] for count in counts]
+    return get_class_stats_from_counts(counts, Y.shape[0])
+
+def get_class_stats_from_counts(counts, number_of_instances):
+    number_of_classes = len(counts)
+    probs = [count/number_of_instances for count in counts]
     mean_class_probability, stdev_class_probability, min_class_probability, _, _, _, max_class_probability = profile_distribution(probs)
     majority_class_size = max(counts)
     minority_class_size = min(counts)
     return (number_of_classes, mean_class_probability, stdev_class_probability, min_class_probability, max_class_probability, minority_class_size, majority_class_size)
 
-def get_categorical_cardinalities(X, column_types):
-    cardinalities = [X[feature].unique().shape[0] for feature in get_categorical_features(X, column_types)]
+def get_categorical_cardinalities(column_cardinalities, column_types):
+    cardinalities = [cardinality for feature, cardinality in column_cardinalities.items() if column_types[feature] == "CATEGORICAL"]
     mean_cardinality_of_categorical_features, stdev_cardinality_of_categorical_features, min_cardinality_of_categorical_features, _, _, _, max_cardinality_of_categorical_features = profile_distribution(cardinalities)
     return (mean_cardinality_of_categorical_features, stdev_cardinality_of_categorical_features, min_cardinality_of_categorical_features, max_cardinality_of_categorical_features)
 
-def get_numeric_cardinalities(X, column_types):
-    cardinalities = [X[feature].unique().shape[0] for feature in get_numeric_features(X, column_types)]
+def get_numeric_cardinalities(column_cardinalities, column_types):
+    cardinalities = [cardinality for feature, cardinality in column_cardinalities.items() if column_types[feature] == "NUMERIC"]
     mean_cardinality_of_numeric_features, stdev_cardinality_of_numeric_features, min_cardinality_of_numeric_features, _, _, _, max_cardinality_of_numeric_features = profile_distribution(cardinalities)
     return (mean_cardinality_of_numeric_features, stdev_cardinality_of_numeric_features, min_cardinality_of_numeric_features, max_cardinality_of_numeric_features)
@@ -0,0 +1,130 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+
+class HyperLogLog(object):
+    """
+    HyperLogLog sketches (Flajolet et al. 2007) estimating the number of
+    distinct values in each of several columns in constant memory. The
+    registers of all columns are held in one array, so a chunk of rows is
+    added to every sketch in a single vectorized pass. Sketches of the same
+    columns and precision are merged by taking the register-wise maximum,
+    which gives the sketch of the union of their values.
+    """
+
+    MIN_PRECISION = 4
+    MAX_PRECISION = 18
+
+    def __init__(self, n_columns, error=0.01):
+        """
+        Parameters
+        ----------
+        n_columns: int, the number of columns sketched
+        error: float, the target relative standard error of the estimates.
+            Smaller errors use more memory: 2**ceil(log2((1.04/error)**2))
+            bytes per column.
+        """
+        if not 0 < error < 1:
+            raise ValueError(f"`error` must be between 0 and 1, not {error}")
+        self.n_columns = n_columns
+        self.error = error
+        self.precision = int(min(max(
+            math.ceil(math.log2((1.04 / error)**2)), self.MIN_PRECISION
+        ), self.MAX_PRECISION))
+        self.n_registers = 2**self.precision
+        self.registers = np.zeros(
+            (n_columns, self.n_registers), dtype=np.uint8
+        )
+
+    def update(self, hashes):
+        """
+        Adds values to the sketches.
+
+        Parameters
+        ----------
+        hashes: 2-D uint64 array of shape (n_rows, n_columns), the hashes of
+            the values of each column, see `hash_columns`
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index_shift = np.uint64(64 - self.precision)
+        register_indices = (hashes >> index_shift).astype(np.int64)
+        # the guard bit bounds the number of leading zeros of the remaining
+        # 64 - precision bits
+        remaining = (hashes << np.uint64(self.precision)) | \
+            np.uint64(1 << (self.precision - 1))
+        ranks = _count_leading_zeros(remaining) + 1
+        flat_indices = register_indices + (
+            np.arange(self.n_columns) * self.n_registers
+        )
+        registers = self.registers.reshape(-1)
+        np.maximum.at(registers, flat_indices.ravel(), ranks.ravel())
+        return self
+
+    def merge(self, other):
+        """ Adds the values sketched by `other` to these sketches. """
+        if (
+            other.n_columns != self.n_columns or
+            other.precision != self.precision
+        ):
+            raise ValueError("Cannot merge sketches of different shapes")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def concatenate(self, other):
+        """ Appends the columns sketched by `other` to these sketches. """
+        if other.precision != self.precision:
+            raise ValueError(
+                "Cannot concatenate sketches of different precisions"
+            )
+        self.registers = np.concatenate([self.registers, other.registers])
+        self.n_columns += other.n_columns
+        return self
+
+    def estimate(self):
+        """ Returns an array of the estimated cardinality of each column. """
+        m = self.n_registers
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        raw_estimate = alpha * m**2 / np.sum(
+            np.power(2., -self.registers.astype(np.float64)), axis=1
+        )
+        n_zero_registers = np.sum(self.registers == 0, axis=1)
+        with np.errstate(divide="ignore"):
+            linear_count = m * np.log(m / n_zero_registers)
+        # small range correction
+        return np.where(
+            (raw_estimate <= 2.5 * m) & (n_zero_registers > 0),
+            linear_count, raw_estimate
+        )
+
+
+def hash_columns(X, column_types):
+    """
+    Returns a (n_rows, n_columns) uint64 array of the hashes of the values of
+    each column of the pandas.DataFrame X. Numeric columns are hashed as
+    floats, so that a value hashes the same whether or not the chunk it
+    belongs to has missing values. As in `pandas.Series.unique`, all missing
+    values of a numeric column hash to the same value, as do 0. and -0.
+    """
+    hashes = np.empty(X.shape, dtype=np.uint64)
+    for i, col in enumerate(X.columns):
+        values = X[col].values
+        if column_types[col] == "NUMERIC":
+            values = values.astype(np.float64) + 0. # -0. + 0. is 0.
+            values[np.isnan(values)] = np.nan
+        hashes[:, i] = pd.util.hash_array(values)
+    return hashes
+
+def _count_leading_zeros(values):
+    counts = np.zeros(values.shape, dtype=np.uint8)
+    for shift in [32, 16, 8, 4, 2, 1]:
+        has_leading_zeros = values < np.uint64(1 << (64 - shift))
+        counts[has_leading_zeros] += shift
+        values = np.where(
+            has_leading_zeros, values << np.uint64(shift), values
+        )
+    return counts
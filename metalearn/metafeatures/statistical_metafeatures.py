@@ -1,42 +1,36 @@
 import time
 import math
 import itertools
-import warnings
 
 import numpy as np
 import pandas as pd
-from scipy.stats import skew, kurtosis
-from sklearn.decomposition import PCA
-from sklearn.cross_decomposition import CCA
+from scipy.sparse import csr_matrix, issparse
 
 from .common_operations import *
 
-warnings.filterwarnings("ignore", category=RuntimeWarning) # suppress sklearn warnings
-warnings.filterwarnings("ignore", category=UserWarning) # suppress sklearn warnings
+def get_numeric_means(numeric_feature_moments):
+    return profile_distribution(numeric_feature_moments["mean"])
 
-def get_numeric_means(numeric_features_array):
-    means = [feature.mean() for feature in numeric_features_array]
-    return profile_distribution(means)
+def get_numeric_stdev(numeric_feature_moments):
+    return profile_distribution(numeric_feature_moments["stdev"])
 
-def get_numeric_stdev(numeric_features_array):
-    stdevs = [feature.std() for feature in numeric_features_array]
-    return profile_distribution(stdevs)
+def get_numeric_skewness(numeric_feature_moments):
+    return profile_distribution(numeric_feature_moments["skewness"])
 
-def get_numeric_skewness(numeric_features_array):
-    skews = [feature.skew() for feature in numeric_features_array]
-    return profile_distribution(skews)
-
-def get_numeric_kurtosis(numeric_features_array):
-    kurtoses = [feature.kurtosis() for feature in numeric_features_array]
-    return profile_distribution(kurtoses)
+def get_numeric_kurtosis(numeric_feature_moments):
+    return profile_distribution(numeric_feature_moments["kurtosis"])
 
 def get_pca(X_preprocessed):
     num_components = min(3, X_preprocessed.shape[1])
-    pca_data = PCA(n_components=num_components)
-    pca_data.fit_transform(X_preprocessed.values)
-    pred_pca = pca_data.explained_variance_ratio_
-    pred_eigen = pca_data.explained_variance_
-    pred_det = np.linalg.det(pca_data.get_covariance())
+    if issparse(X_preprocessed):
+        pred_pca, pred_eigen, pred_det = get_sparse_pca(X_preprocessed, num_components)
+    else:
+        from sklearn.decomposition import PCA
+        pca_data = PCA(n_components=num_components)
+        pca_data.fit_transform(X_preprocessed.values)
+        pred_pca = pca_data.explained_variance_ratio_
+        pred_eigen = pca_data.explained_variance_
+        pred_det = np.linalg.det(pca_data.get_covariance())
     variance_percentages = [0] * 3
     for i in range(len(pred_pca)):
         variance_percentages[i] = pred_pca[i]
@@ -45,6 +39,53 @@ def get_pca(X_preprocessed):
         eigenvalues[i] = pred_eigen[i]
     return (variance_percentages[0], variance_percentages[1], variance_percentages[2], eigenvalues[0], eigenvalues[1], eigenvalues[2], pred_det)
 
+def get_sparse_pca(X, n_components):
+    """
+    Computes the explained variance ratios, the explained variances and the
+    determinant of the model covariance of sklearn's PCA, for a scipy.sparse
+    matrix X. X is never centered (densified): the top eigenvalues of its
+    covariance matrix are found with ARPACK through the implicitly centered
+    product X.T X - n mean mean.T.
+    """
+    from scipy.sparse.linalg import LinearOperator, eigsh
+    X = csr_matrix(X, dtype=np.float64)
+    n_samples, n_features = X.shape
+    mean = np.asarray(X.mean(axis=0)).ravel()
+    total_variance = (
+        np.asarray(X.multiply(X).sum(axis=0)).ravel() - n_samples * mean**2
+    ).sum() / (n_samples - 1)
+
+    def covariance_product(v):
+        v = np.ravel(v)
+        return (X.T @ (X @ v) - n_samples * mean * (mean @ v)) / (n_samples - 1)
+
+    if n_components < n_features:
+        covariance = LinearOperator(
+            (n_features, n_features), matvec=covariance_product, dtype=np.float64
+        )
+        eigenvalues = eigsh(
+            covariance, k=n_components, which="LA", return_eigenvectors=False,
+            v0=np.random.RandomState(0).uniform(size=n_features)
+        )
+    else:
+        covariance = np.column_stack([
+            covariance_product(column) for column in np.eye(n_features)
+        ])
+        eigenvalues = np.linalg.eigvalsh(covariance)
+    explained_variance = np.maximum(np.sort(eigenvalues)[::-1][:n_components], 0)
+    explained_variance_ratio = explained_variance / total_variance
+
+    # the model covariance has the explained variances as eigenvalues along
+    # the components and the noise variance, the mean of the remaining
+    # variances, along the other n_features - n_components directions
+    rank = min(n_samples, n_features)
+    if n_components < rank:
+        noise_variance = (total_variance - explained_variance.sum()) / (rank - n_components)
+    else:
+        noise_variance = 0.
+    det = np.prod(explained_variance) * noise_variance**(n_features - n_components)
+    return (explained_variance_ratio, explained_variance, det)
+
 def get_correlations(X_sample, column_types):
     correlations = get_canonical_correlations(X_sample, column_types)
     mean_correlation, stdev_correlation, _, _, _, _, _ = profile_distribution(correlations)
@@ -68,46 +109,142 @@ def get_canonical_correlations(dataframe, column_types):
         categorical columns are replaced with one-hot encoded columns
         any columns which have only one distinct value (after dropping missing values) are skipped
     returns a list of the pairwise canonical correlation coefficients
-    '''
-
-    def preprocess(series):
-        if column_types[series.name] == 'CATEGORICAL':
-            series = pd.get_dummies(series)
-        array = series.values.reshape(series.shape[0], -1)
-        return array
 
+    Each column is encoded once. The first canonical correlation of every pair
+    is computed in closed form: numeric-numeric pairs from a pairwise-complete
+    correlation matrix, numeric-categorical pairs from the correlation ratio
+    and categorical-categorical pairs from the normalized contingency table.
+    These are the values a CCA fit on the pair's one-hot encoded columns
+    converges to.
+    '''
     if dataframe.shape[1] < 2:
         return []
 
+    columns = list(dataframe.columns)
+    is_categorical = np.array([
+        column_types[col] == 'CATEGORICAL' for col in columns
+    ])
+    valid = dataframe.notnull().values
+    codes = np.column_stack([
+        pd.factorize(dataframe[col])[0] for col in columns
+    ])
+    is_constant = get_pairwise_constant_columns(codes, valid)
+    pair_correlations = np.zeros((len(columns), len(columns)))
+
+    numeric_indices = np.nonzero(~is_categorical)[0]
+    categorical_indices = np.nonzero(is_categorical)[0]
+    if len(numeric_indices) > 1:
+        numeric_correlations = dataframe.iloc[:, numeric_indices].astype(
+            float
+        ).corr().abs().values
+        pair_correlations[np.ix_(numeric_indices, numeric_indices)] = \
+            numeric_correlations
+    if len(categorical_indices) > 0 and len(numeric_indices) > 0:
+        numeric_values = dataframe.iloc[:, numeric_indices].values.astype(
+            float
+        )
+        for i in categorical_indices:
+            ratios = get_correlation_ratios(codes[:, i], numeric_values)
+            pair_correlations[i, numeric_indices] = ratios
+            pair_correlations[numeric_indices, i] = ratios
+    for i, j in itertools.combinations(categorical_indices, 2):
+        c = get_contingency_correlation(codes[:, i], codes[:, j])
+        pair_correlations[i, j] = c
+        pair_correlations[j, i] = c
+
     correlations = []
     skip_cols = set()
-    for col_name_i, col_name_j in itertools.combinations(dataframe.columns, 2):
-        if col_name_i in skip_cols or col_name_j in skip_cols:
+    for i, j in itertools.combinations(range(len(columns)), 2):
+        if i in skip_cols or j in skip_cols:
             correlations.append(0)
-            continue
-
-        df_ij = dataframe[[col_name_i, col_name_j]].dropna(axis=0, how="any")
-        col_i = df_ij[col_name_i]
-        col_j = df_ij[col_name_j]
-
-        if np.unique(col_i).shape[0] <= 1:
-            skip_cols.add(col_name_i)
+        elif is_constant[i, j]:
+            skip_cols.add(i)
             correlations.append(0)
-            continue
-        if np.unique(col_j).shape[0] <= 1:
-            skip_cols.add(col_name_j)
+        elif is_constant[j, i]:
+            skip_cols.add(j)
             correlations.append(0)
-            continue
-
-        col_i = preprocess(col_i)
-        col_j = preprocess(col_j)
-
-        col_i_c, col_j_c = CCA(n_components=1).fit_transform(col_i,col_j)
-
-        if np.unique(col_i_c).shape[0] <= 1 or np.unique(col_j_c).shape[0] <= 1:
-            c = 0
         else:
-            c = np.corrcoef(col_i_c.T, col_j_c.T)[0,1]
-        correlations.append(c)
+            correlations.append(pair_correlations[i, j])
 
     return correlations
+
+def get_pairwise_constant_columns(codes, valid):
+    '''
+    codes: integer codes of each column, with -1 marking missing values
+    valid: boolean array marking the non-missing values of each column
+    returns a boolean matrix whose [i, j] entry tells whether column i has at
+    most one distinct value on the rows where columns i and j are both present
+    '''
+    n_rows, n_cols = codes.shape
+    n_distinct = np.array([
+        np.unique(codes[valid[:, i], i]).shape[0] for i in range(n_cols)
+    ])
+    is_constant = np.repeat((n_distinct <= 1)[:, np.newaxis], n_cols, axis=1)
+    # only rows where column i is present but column j is missing can make
+    # column i constant for the pair (i, j)
+    missing_overlap = valid.T.astype(float).dot((~valid).astype(float))
+    for i in np.nonzero(n_distinct > 1)[0]:
+        js = np.nonzero(missing_overlap[i] > 0)[0]
+        if len(js) == 0:
+            continue
+        pair_valid = valid[:, js] & valid[:, [i]]
+        column_codes = codes[:, [i]]
+        masked_max = np.where(pair_valid, column_codes, -1).max(axis=0)
+        masked_min = np.where(pair_valid, column_codes, n_rows).min(axis=0)
+        is_constant[i, js] = masked_max <= masked_min
+    return is_constant
+
+def get_correlation_ratios(category_codes, numeric_values):
+    '''
+    computes the correlation ratio between a categorical column and each
+    numeric column, over the rows where both are present. this is the first
+    canonical correlation between the numeric column and the one-hot encoded
+    categorical column.
+    '''
+    present = category_codes >= 0
+    n_categories = category_codes.max() + 1
+    numeric_values = numeric_values[present]
+    category_codes = category_codes[present]
+    valid = ~np.isnan(numeric_values)
+    centered = numeric_values - np.nanmean(numeric_values, axis=0)
+    centered[~valid] = 0.
+    one_hot = csr_matrix(
+        (np.ones(category_codes.shape[0]),
+        (category_codes, np.arange(category_codes.shape[0]))),
+        shape=(n_categories, category_codes.shape[0])
+    )
+    counts = one_hot.dot(valid.astype(float))
+    sums = one_hot.dot(centered)
+    total_count = counts.sum(axis=0)
+    total_sum = sums.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total_sum / total_count
+        category_means = np.where(counts > 0, sums / counts, 0.)
+        between = np.sum(counts * (category_means - mean)**2, axis=0)
+        total = np.sum(centered**2, axis=0) - total_count * mean**2
+        ratios = np.sqrt(np.clip(between / total, 0., 1.))
+    return np.nan_to_num(ratios)
+
+def get_contingency_correlation(codes_i, codes_j):
+    '''
+    computes the first canonical correlation between two one-hot encoded
+    categorical columns from their contingency table, over the rows where
+    both are present
+    '''
+    present = (codes_i >= 0) & (codes_j >= 0)
+    codes_i = codes_i[present]
+    codes_j = codes_j[present]
+    n_j = codes_j.max() + 1 if codes_j.shape[0] > 0 else 0
+    table = np.bincount(codes_i * n_j + codes_j).astype(float)
+    table = np.append(table, np.zeros(-table.shape[0] % max(n_j, 1)))
+    table = table.reshape(-1, max(n_j, 1))
+    counts_i = table.sum(axis=1)
+    counts_j = table.sum(axis=0)
+    table = table[counts_i > 0][:, counts_j > 0]
+    counts_i = counts_i[counts_i > 0]
+    counts_j = counts_j[counts_j > 0]
+    if table.shape[0] <= 1 or table.shape[1] <= 1:
+        return 0.
+    expected = np.outer(counts_i, counts_j) / codes_i.shape[0]
+    normalized = (table - expected) / np.sqrt(np.outer(counts_i, counts_j))
+    return min(np.linalg.svd(normalized, compute_uv=False)[0], 1.)
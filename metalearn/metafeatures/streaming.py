@@ -0,0 +1,497 @@
+import os
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from scipy.stats import entropy
+
+from .common_operations import *
+from .sketches import HyperLogLog, hash_columns
+from .simple_metafeatures import get_class_stats_from_counts
+from .statistical_metafeatures import (
+    get_numeric_means, get_numeric_stdev, get_numeric_skewness,
+    get_numeric_kurtosis
+)
+from .information_theoretic_metafeatures import (
+    profile_information_measures, get_joint_entropy_from_contingency_tables,
+    get_mutual_information_from_contingency_tables,
+    get_equivalent_number_features, get_noise_signal_ratio
+)
+
+
+class DatasetAccumulator(object):
+    """
+    Accumulates, one chunk of rows at a time, the statistics that the
+    chunk-mergeable metafeatures are computed from, along with a uniform
+    random sample (reservoir) of the rows for the remaining metafeatures.
+    Accumulators built over disjoint chunks of the same dataset can be
+    combined with `merge`. With `cardinality_error`, the distinct values of
+    each column are counted with mergeable HyperLogLog sketches instead of
+    sets of values.
+    """
+
+    # the first metafeature returned by each group of metafeatures that can
+    # be computed from the accumulated statistics
+    MERGEABLE_GROUPS = [
+        "NumberOfInstances", "Dimensionality", "NumberOfMissingValues",
+        "MeanCardinalityOfCategoricalFeatures",
+        "MeanCardinalityOfNumericFeatures", "MeanMeansOfNumericFeatures",
+        "MeanStdDevOfNumericFeatures", "MeanSkewnessOfNumericFeatures",
+        "MeanKurtosisOfNumericFeatures", "MeanCategoricalAttributeEntropy"
+    ]
+    MERGEABLE_TARGET_DEPENDENT_GROUPS = [
+        "NumberOfClasses", "ClassEntropy", "MeanCategoricalJointEntropy",
+        "MeanCategoricalMutualInformation",
+        "EquivalentNumberOfCategoricalFeatures",
+        "CategoricalNoiseToSignalRatio"
+    ]
+
+    def __init__(
+        self, column_types, target_name=None, reservoir_size=100000, seed=0,
+        cardinality_error=None, track_missing_rows=False
+    ):
+        """
+        Parameters
+        ----------
+        column_types: Dict[str, str], dict from column name to column type as
+            "NUMERIC" or "CATEGORICAL", must include the target column
+        target_name: str, the name of the target column in the chunks, or
+            None when the dataset has no targets
+        reservoir_size: int, the number of rows kept in the random sample,
+            or None to keep no sample
+        seed: int, the seed of the random sample
+        cardinality_error: float, the relative standard error of the
+            estimated cardinalities, or None to count them exactly
+        track_missing_rows: bool, whether to keep which rows have missing
+            values, one byte per row, so that columns can be added with
+            `add_columns`
+        """
+        if reservoir_size is not None and (
+            not type(reservoir_size) is int or reservoir_size < 1
+        ):
+            raise ValueError(
+                "`reservoir_size` must be a positive integer, not " +
+                f"{reservoir_size}"
+            )
+        self.column_types = column_types
+        self.target_name = target_name
+        self.reservoir_size = reservoir_size
+        self.cardinality_error = cardinality_error
+        self.track_missing_rows = track_missing_rows
+        self.columns = None
+        self.n_rows = 0
+        self._random_state = np.random.RandomState(seed)
+        self._reservoir = None
+        self._reservoir_keys = np.empty(0)
+        self._reservoir_positions = np.empty(0, dtype=np.int64)
+
+    def update(self, chunk):
+        """
+        Adds the rows of `chunk`, a pandas.DataFrame holding the features and
+        the target column, to the accumulated statistics.
+        """
+        if self.columns is None:
+            self._init_statistics(chunk)
+        X = chunk[self.columns]
+        if self.target_name is None:
+            Y = None
+        else:
+            Y = chunk[self.target_name]
+        self._update_statistics(X, Y)
+        if self.reservoir_size is not None:
+            self._update_reservoir(chunk)
+        self.n_rows += chunk.shape[0]
+        return self
+
+    def merge(self, other):
+        """
+        Adds the statistics accumulated by `other` over rows that follow the
+        rows accumulated by this accumulator.
+        """
+        if other.columns is None:
+            return self
+        if self.columns is None:
+            self._init_statistics(other._reservoir)
+        if other.columns != self.columns:
+            raise ValueError("Cannot merge accumulators of different columns")
+        self.number_missing += other.number_missing
+        self.number_instances_with_missing += \
+            other.number_instances_with_missing
+        self._instance_has_missing.extend(other._instance_has_missing)
+        self.missing_by_feature += other.missing_by_feature
+        self.class_counts.update(other.class_counts)
+        self.class_has_missing |= other.class_has_missing
+        if self.cardinality_error is None:
+            for col in self.columns:
+                self.unique_values[col].update(other.unique_values[col])
+        else:
+            self.cardinality_sketch.merge(other.cardinality_sketch)
+        for col in self.value_counts:
+            self.value_counts[col].update(other.value_counts[col])
+            self.contingency_counts[col].update(other.contingency_counts[col])
+        self.numeric_moments = merge_moments(
+            self.numeric_moments, other.numeric_moments
+        )
+        if self.reservoir_size is not None:
+            self._add_to_reservoir(
+                other._reservoir, other._reservoir_keys,
+                other._reservoir_positions + self.n_rows
+            )
+        self.n_rows += other.n_rows
+        return self
+
+    def add_columns(self, other):
+        """
+        Adds the columns accumulated by `other` over the same rows, in the
+        same order, as this accumulator. The statistics of the columns of
+        this accumulator are kept, so adding k columns to d columns only
+        costs the accumulation of the k new columns. The class statistics of
+        `other` are ignored.
+        """
+        if self.columns is None or other.columns is None:
+            raise ValueError("Cannot add columns to an empty accumulator")
+        if other.n_rows != self.n_rows:
+            raise ValueError(
+                "Cannot add columns accumulated over different rows"
+            )
+        added_columns = set(other.columns)
+        if any(col in added_columns for col in self.columns):
+            raise ValueError("Cannot add columns that are already accumulated")
+        if self.reservoir_size is not None:
+            raise ValueError(
+                "Cannot add columns to an accumulator keeping a sample"
+            )
+        if not (self.track_missing_rows and other.track_missing_rows):
+            raise ValueError(
+                "Cannot add columns to an accumulator not tracking the rows " +
+                "with missing values"
+            )
+        self.columns = self.columns + other.columns
+        self.column_types = {**self.column_types, **other.column_types}
+        self.numeric_features = \
+            self.numeric_features + other.numeric_features
+        self.categorical_features = \
+            self.categorical_features + other.categorical_features
+        self.number_missing += other.number_missing
+        instance_has_missing = \
+            np.concatenate(self._instance_has_missing) | \
+            np.concatenate(other._instance_has_missing)
+        self._instance_has_missing = [instance_has_missing]
+        self.number_instances_with_missing = int(instance_has_missing.sum())
+        self.missing_by_feature = np.concatenate([
+            self.missing_by_feature, other.missing_by_feature
+        ])
+        if self.cardinality_error is None:
+            self.unique_values.update(other.unique_values)
+        else:
+            self.cardinality_sketch.concatenate(other.cardinality_sketch)
+        self.value_counts.update(other.value_counts)
+        self.contingency_counts.update(other.contingency_counts)
+        self.numeric_moments = tuple(
+            np.concatenate([moment, other_moment]) for moment, other_moment in
+            zip(self.numeric_moments, other.numeric_moments)
+        )
+        return self
+
+    def get_sample(self):
+        """
+        Returns (X_sample, Y_sample), the rows of the reservoir in the order
+        they were accumulated. When no more than `reservoir_size` rows were
+        accumulated, this is the whole dataset.
+        """
+        if self.reservoir_size is None:
+            raise ValueError("The accumulator keeps no sample")
+        sample = self._reservoir.iloc[np.argsort(self._reservoir_positions)]
+        X_sample = sample[self.columns]
+        if self.target_name is None:
+            Y_sample = None
+        else:
+            Y_sample = sample[self.target_name]
+        return X_sample, Y_sample
+
+    def get_metafeatures(self):
+        """
+        Returns a dict from the first metafeature id of each mergeable group
+        of metafeatures to the tuple of values of the group, computed as on
+        the whole accumulated dataset. Target dependent groups are only
+        included when the dataset has categorical targets.
+        """
+        if self.n_rows == 0:
+            raise ValueError("Cannot compute metafeatures of an empty dataset")
+        # columns without any value are dropped, see Metafeatures.compute
+        present = set(
+            col for col, n_missing in zip(
+                self.columns, self.missing_by_feature
+            ) if n_missing < self.n_rows
+        )
+        categorical_present = [
+            col for col in self.categorical_features if col in present
+        ]
+        numeric_present = np.array([
+            col in present for col in self.numeric_features
+        ], dtype=bool)
+
+        n_features = len(self.columns)
+        n_numeric = len(self.numeric_features)
+        n_categorical = n_features - n_numeric
+        number_features_with_missing = int(
+            np.sum(self.missing_by_feature != 0)
+        )
+        metafeatures = {
+            "NumberOfInstances": (
+                self.n_rows, n_features, n_numeric, n_categorical,
+                n_numeric / n_features, n_categorical / n_features
+            ),
+            "Dimensionality": (n_features / self.n_rows,),
+            "NumberOfMissingValues": (
+                self.number_missing,
+                self.number_missing / (self.n_rows * n_features),
+                self.number_instances_with_missing,
+                self.number_instances_with_missing / self.n_rows,
+                number_features_with_missing,
+                number_features_with_missing / n_features
+            )
+        }
+
+        if self.cardinality_error is None:
+            cardinalities = [
+                len(self.unique_values[col]) + int(n_missing > 0)
+                for col, n_missing in zip(
+                    self.columns, self.missing_by_feature
+                )
+            ]
+        else:
+            cardinalities = self.cardinality_sketch.estimate()
+        cardinalities = {
+            col: cardinality
+            for col, cardinality in zip(self.columns, cardinalities)
+            if col in present
+        }
+        for group, col_type in [
+            ("MeanCardinalityOfCategoricalFeatures", "CATEGORICAL"),
+            ("MeanCardinalityOfNumericFeatures", "NUMERIC")
+        ]:
+            mean, stdev, min_value, _, _, _, max_value = profile_distribution([
+                cardinality for col, cardinality in cardinalities.items()
+                if self.column_types[col] == col_type
+            ])
+            metafeatures[group] = (mean, stdev, min_value, max_value)
+
+        mean, stdev, skewness, kurtosis = get_moment_statistics(*(
+            moment[numeric_present] for moment in self.numeric_moments
+        ))
+        numeric_feature_moments = {
+            "mean": mean, "stdev": stdev, "skewness": skewness,
+            "kurtosis": kurtosis
+        }
+        for group, f in [
+            ("MeanMeansOfNumericFeatures", get_numeric_means),
+            ("MeanStdDevOfNumericFeatures", get_numeric_stdev),
+            ("MeanSkewnessOfNumericFeatures", get_numeric_skewness),
+            ("MeanKurtosisOfNumericFeatures", get_numeric_kurtosis)
+        ]:
+            metafeatures[group] = f(numeric_feature_moments)
+
+        attribute_entropy = profile_information_measures([
+            entropy(list(self.value_counts[col].values()))
+            for col in categorical_present
+        ])
+        metafeatures["MeanCategoricalAttributeEntropy"] = attribute_entropy
+
+        if (
+            self.target_name is not None and
+            self.column_types[self.target_name] == "CATEGORICAL"
+        ):
+            class_counts = list(self.class_counts.values())
+            if self.class_has_missing:
+                # Metafeatures.compute counts missing targets as a class
+                # without instances
+                class_counts.append(0)
+            class_entropy = entropy(list(self.class_counts.values()))
+            contingency_tables = [
+                get_contingency_table(self.contingency_counts[col])
+                for col in categorical_present
+            ]
+            mutual_information = \
+                get_mutual_information_from_contingency_tables(
+                    contingency_tables
+                )
+            metafeatures.update({
+                "NumberOfClasses": get_class_stats_from_counts(
+                    class_counts, self.n_rows
+                ),
+                "ClassEntropy": (class_entropy,),
+                "MeanCategoricalJointEntropy":
+                    get_joint_entropy_from_contingency_tables(
+                        contingency_tables
+                    ),
+                "MeanCategoricalMutualInformation": mutual_information,
+                "EquivalentNumberOfCategoricalFeatures":
+                    get_equivalent_number_features(
+                        class_entropy, mutual_information[0]
+                    ),
+                "CategoricalNoiseToSignalRatio": get_noise_signal_ratio(
+                    attribute_entropy[0], mutual_information[0]
+                )
+            })
+        return metafeatures
+
+    def _init_statistics(self, chunk):
+        self.columns = [
+            col for col in chunk.columns if col != self.target_name
+        ]
+        self.numeric_features = get_numeric_features(
+            chunk[self.columns], self.column_types
+        )
+        self.categorical_features = get_categorical_features(
+            chunk[self.columns], self.column_types
+        )
+        self.number_missing = 0
+        self.number_instances_with_missing = 0
+        self.missing_by_feature = np.zeros(len(self.columns), dtype=np.int64)
+        # whether each row has a missing value, one array per chunk, when
+        # track_missing_rows is True
+        self._instance_has_missing = []
+        self.class_counts = Counter()
+        self.class_has_missing = False
+        if self.cardinality_error is None:
+            self.unique_values = {col: set() for col in self.columns}
+        else:
+            self.cardinality_sketch = HyperLogLog(
+                len(self.columns), self.cardinality_error
+            )
+        self.value_counts = {
+            col: Counter() for col in self.categorical_features
+        }
+        self.contingency_counts = {
+            col: Counter() for col in self.categorical_features
+        }
+        empty_moments = get_moments(np.empty((0, len(self.numeric_features))))
+        self.numeric_moments = empty_moments
+        self._reservoir = chunk.iloc[:0]
+
+    def _update_statistics(self, X, Y):
+        is_missing = X.isnull().values
+        missing_by_instance = is_missing.sum(axis=1)
+        self.number_missing += int(missing_by_instance.sum())
+        self.number_instances_with_missing += int(
+            np.sum(missing_by_instance != 0)
+        )
+        if self.track_missing_rows:
+            self._instance_has_missing.append(missing_by_instance != 0)
+        self.missing_by_feature += is_missing.sum(axis=0)
+
+        if self.cardinality_error is None:
+            for col in self.columns:
+                self.unique_values[col].update(X[col].dropna().unique())
+        else:
+            self.cardinality_sketch.update(hash_columns(X, self.column_types))
+        self.numeric_moments = merge_moments(
+            self.numeric_moments, get_moments(X[self.numeric_features].values)
+        )
+        for col in self.categorical_features:
+            self.value_counts[col].update(X[col].value_counts().to_dict())
+
+        if Y is not None:
+            self.class_counts.update(Y.value_counts().to_dict())
+            self.class_has_missing |= bool(Y.isnull().any())
+            for col in self.categorical_features:
+                self.contingency_counts[col].update(
+                    X[col].groupby([X[col], Y]).size().to_dict()
+                )
+
+    def _update_reservoir(self, chunk):
+        # the reservoir holds the rows with the smallest uniform random keys,
+        # a uniform sample without replacement of the rows seen so far
+        keys = self._random_state.random_sample(chunk.shape[0])
+        positions = np.arange(self.n_rows, self.n_rows + chunk.shape[0])
+        if len(self._reservoir_keys) >= self.reservoir_size:
+            candidates = keys < self._reservoir_keys.max()
+            chunk = chunk[candidates]
+            keys = keys[candidates]
+            positions = positions[candidates]
+        self._add_to_reservoir(chunk, keys, positions)
+
+    def _add_to_reservoir(self, rows, keys, positions):
+        reservoir = pd.concat([self._reservoir, rows])
+        keys = np.concatenate([self._reservoir_keys, keys])
+        positions = np.concatenate([self._reservoir_positions, positions])
+        if len(keys) > self.reservoir_size:
+            kept = np.argpartition(keys, self.reservoir_size - 1)[
+                :self.reservoir_size
+            ]
+            reservoir = reservoir.iloc[kept]
+            keys = keys[kept]
+            positions = positions[kept]
+        self._reservoir = reservoir
+        self._reservoir_keys = keys
+        self._reservoir_positions = positions
+
+
+class MetafeatureState(object):
+    """
+    The compact state of the metafeatures of a dataset that grows by
+    appending rows or columns, see `Metafeatures.init_state`,
+    `Metafeatures.update_state` and `Metafeatures.extend_state`. The
+    mergeable metafeatures (see `DatasetAccumulator`) are refreshed from the
+    accumulated statistics in time proportional to the appended values,
+    while the others keep the value computed on the data they were last
+    computed on and are marked stale.
+
+    Attributes
+    ----------
+    accumulator: DatasetAccumulator, the statistics of every row, keeping no
+        sample of the rows
+    metafeatures: dict, the latest results of every metafeature, as returned
+        by `Metafeatures.update_state`
+    mergeable_ids: frozenset, the metafeatures refreshed from the
+        accumulator
+    stale_ids: set, the metafeatures whose value does not account for every
+        row
+    """
+
+    def __init__(self, accumulator, metafeatures, mergeable_ids):
+        self.accumulator = accumulator
+        self.metafeatures = metafeatures
+        self.mergeable_ids = frozenset(mergeable_ids)
+        self.stale_ids = set()
+
+    @property
+    def n_rows(self):
+        return self.accumulator.n_rows
+
+
+def get_contingency_table(pair_counts):
+    """
+    Returns a 2-D array of counts from a dict from (feature value, class)
+    pairs to their number of occurrences.
+    """
+    feature_values = {}
+    classes = {}
+    for feature_value, label in pair_counts:
+        feature_values.setdefault(feature_value, len(feature_values))
+        classes.setdefault(label, len(classes))
+    table = np.zeros((len(feature_values), len(classes)), dtype=np.int64)
+    for (feature_value, label), count in pair_counts.items():
+        table[feature_values[feature_value], classes[label]] = count
+    return table
+
+def read_chunks(path, chunksize):
+    """
+    Reads a csv or parquet file as a generator of pandas.DataFrame chunks of
+    `chunksize` rows.
+    """
+    ext = os.path.splitext(os.fspath(path))[1].lower()
+    if ext == ".csv":
+        return pd.read_csv(path, chunksize=chunksize)
+    elif ext in [".parquet", ".pq"]:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Reading parquet files requires pyarrow")
+        return (
+            batch.to_pandas() for batch in
+            pq.ParquetFile(path).iter_batches(batch_size=chunksize)
+        )
+    else:
+        raise ValueError(f"Cannot read chunks from '{ext}' files")
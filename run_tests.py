@@ -11,6 +11,5 @@ if __name__ == '__main__':
     # compare_with_openml(10)
     # compute_dataset_metafeatures()
     unittest.TextTestRunner().run(metafeatures_suite())
-    # run_metafeature_benchmark("start")
-    # run_metafeature_benchmark("end")
-    # compare_metafeature_benchmarks("start", "end")
+    # run_metafeature_benchmark("metafeatures")
+    # compare_metafeature_benchmarks()
@@ -0,0 +1,313 @@
+"""
+A history of metafeature benchmark runs, stored in a SQLite file, and the
+detection of latency and memory regressions against the preceding runs.
+
+Usage:
+    python -m test.metalearn.metafeatures.benchmark_history record [--iters N]
+    python -m test.metalearn.metafeatures.benchmark_history check
+The check command exits with status 1 when the latest run regressed.
+"""
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+import platform
+import argparse
+import subprocess
+
+import numpy as np
+import pandas as pd
+import scipy
+import sklearn
+from scipy.stats import mannwhitneyu
+
+from metalearn.metafeatures.cache import get_version_hash
+
+
+HISTORY_PATH = "./benchmark_history.sqlite"
+# the id under which measurements of a whole dataset are stored
+TOTAL_ID = "__total__"
+
+
+class BenchmarkHistory(object):
+    """
+    Stores every measurement of every benchmark run, keyed by the commit, the
+    fingerprint of the machine and the versions of the libraries the run
+    used, so that runs can be compared across commits and library upgrades
+    on the same machine.
+    """
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT,
+                    timestamp REAL,
+                    commit_hash TEXT,
+                    machine TEXT,
+                    versions TEXT
+                );
+                CREATE TABLE IF NOT EXISTS measurements (
+                    run_id INTEGER REFERENCES runs(run_id),
+                    dataset TEXT,
+                    id TEXT,
+                    metric TEXT,
+                    value REAL
+                );
+                CREATE INDEX IF NOT EXISTS measurements_run
+                    ON measurements(run_id);
+            """)
+
+    def close(self):
+        self._connection.close()
+
+    def add_run(self, name, timestamp, measurements):
+        """
+        Stores a run and its `measurements`, an iterable of (dataset, id,
+        metric, value) tuples where id is a metafeature or resource id and
+        metric is e.g. "compute_time" or "memory". Repeated measurements of
+        the same item are stored as separate rows. Returns the id of the run.
+        """
+        with self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO runs " +
+                "(name, timestamp, commit_hash, machine, versions) " +
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    name, timestamp, get_commit_hash(),
+                    get_machine_fingerprint(),
+                    json.dumps(get_library_versions(), sort_keys=True)
+                )
+            )
+            run_id = cursor.lastrowid
+            self._connection.executemany(
+                "INSERT INTO measurements VALUES (?, ?, ?, ?, ?)",
+                (
+                    (run_id, dataset, id_, metric, float(value))
+                    for dataset, id_, metric, value in measurements
+                    if value is not None
+                )
+            )
+        return run_id
+
+    def get_runs(self):
+        """ Returns a pandas.DataFrame of the runs, oldest first. """
+        return pd.read_sql_query(
+            "SELECT * FROM runs ORDER BY run_id", self._connection,
+            index_col="run_id"
+        )
+
+    def get_measurements(self, run_ids):
+        """
+        Returns a pandas.DataFrame of the measurements of `run_ids`, with
+        columns run_id, dataset, id, metric and value.
+        """
+        run_ids = [int(run_id) for run_id in run_ids]
+        return pd.read_sql_query(
+            "SELECT * FROM measurements WHERE run_id IN (" +
+            ", ".join("?" * len(run_ids)) + ")",
+            self._connection, params=run_ids
+        )
+
+    def get_baseline_run_ids(self, run_id, n_runs):
+        """
+        Returns the ids of the last `n_runs` runs with the same name on the
+        same machine preceding `run_id`, the rolling baseline of that run.
+        """
+        runs = self.get_runs()
+        run = runs.loc[run_id]
+        baseline_runs = runs[
+            (runs.index < run_id) & (runs["name"] == run["name"]) &
+            (runs["machine"] == run["machine"])
+        ]
+        return list(baseline_runs.index[-n_runs:])
+
+
+def get_commit_hash():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, check=True,
+            text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def get_machine_fingerprint():
+    """
+    Returns a hash of the hardware and platform the benchmark runs on. Runs
+    are only compared to runs with the same fingerprint.
+    """
+    description = json.dumps([
+        platform.node(), platform.machine(), platform.processor(),
+        platform.system(), platform.release(), os.cpu_count(),
+        platform.python_implementation(), platform.python_version()
+    ])
+    return hashlib.blake2b(description.encode(), digest_size=8).hexdigest()
+
+def get_library_versions():
+    return {
+        "metalearn": get_version_hash(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scipy": scipy.__version__,
+        "sklearn": sklearn.__version__
+    }
+
+def compare_samples(candidate, baseline):
+    """
+    Tests whether the `candidate` measurements are greater than the
+    `baseline` measurements with a one-sided Mann-Whitney U test, which does
+    not assume that timings are normally distributed.
+
+    Returns
+    -------
+    (p_value, cliffs_delta, relative_change), where Cliff's delta, between -1
+    and 1, is the probability that a candidate measurement is greater than a
+    baseline measurement minus the probability that it is smaller, and the
+    relative change is that of the medians
+    """
+    candidate = np.asarray(candidate, dtype=np.float64)
+    baseline = np.asarray(baseline, dtype=np.float64)
+    values = np.concatenate([candidate, baseline])
+    if np.all(values == values[0]):
+        return 1., 0., 0.
+    u_statistic, p_value = mannwhitneyu(
+        candidate, baseline, alternative="greater"
+    )
+    cliffs_delta = 2 * u_statistic / (len(candidate) * len(baseline)) - 1
+    baseline_median = np.median(baseline)
+    if baseline_median == 0:
+        relative_change = np.inf if np.median(candidate) > 0 else 0.
+    else:
+        relative_change = np.median(candidate) / baseline_median - 1
+    return p_value, cliffs_delta, relative_change
+
+def detect_regressions(
+    history, run_id=None, n_baseline_runs=5, alpha=.01, min_delta=.5,
+    min_relative_change=.1, min_value=1e-3
+):
+    """
+    Compares every measurement of a run to the same measurements pooled over
+    its rolling baseline, see `BenchmarkHistory.get_baseline_run_ids`. The
+    p-values are adjusted for the number of comparisons with the Holm-
+    Bonferroni method. A measurement regressed when its adjusted p-value is
+    below `alpha`, its Cliff's delta is at least `min_delta`, its median grew
+    by at least `min_relative_change` and its median is at least `min_value`,
+    which ignores changes in measurements too small to matter.
+
+    Returns
+    -------
+    a pandas.DataFrame with one row per compared measurement, sorted by
+    adjusted p-value, and a boolean `regressed` column
+    """
+    if run_id is None:
+        run_id = history.get_runs().index[-1]
+    baseline_run_ids = history.get_baseline_run_ids(run_id, n_baseline_runs)
+    columns = [
+        "dataset", "id", "metric", "candidate_median", "baseline_median",
+        "relative_change", "cliffs_delta", "p_value", "adjusted_p_value",
+        "regressed"
+    ]
+    if len(baseline_run_ids) == 0:
+        return pd.DataFrame(columns=columns)
+    measurements = history.get_measurements([run_id] + baseline_run_ids)
+    measurements["is_candidate"] = measurements["run_id"] == run_id
+    comparisons = []
+    for (dataset, id_, metric), group in measurements.groupby(
+        ["dataset", "id", "metric"], sort=True
+    ):
+        candidate = group["value"][group["is_candidate"]].values
+        baseline = group["value"][~group["is_candidate"]].values
+        if len(candidate) == 0 or len(baseline) == 0:
+            continue
+        p_value, cliffs_delta, relative_change = compare_samples(
+            candidate, baseline
+        )
+        comparisons.append({
+            "dataset": dataset, "id": id_, "metric": metric,
+            "candidate_median": np.median(candidate),
+            "baseline_median": np.median(baseline),
+            "relative_change": relative_change, "cliffs_delta": cliffs_delta,
+            "p_value": p_value
+        })
+    comparisons = pd.DataFrame(comparisons, columns=columns[:-2])
+    comparisons["adjusted_p_value"] = _holm_adjust(
+        comparisons["p_value"].values
+    )
+    comparisons["regressed"] = (
+        (comparisons["adjusted_p_value"] < alpha) &
+        (comparisons["cliffs_delta"] >= min_delta) &
+        (comparisons["relative_change"] >= min_relative_change) &
+        (comparisons["candidate_median"] >= min_value)
+    )
+    return comparisons.sort_values("adjusted_p_value", kind="mergesort")
+
+def _holm_adjust(p_values):
+    order = np.argsort(p_values, kind="mergesort")
+    n = len(p_values)
+    adjusted = np.empty(n)
+    adjusted[order] = np.minimum(np.maximum.accumulate(
+        (n - np.arange(n)) * p_values[order]
+    ), 1.)
+    return adjusted
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--history", default=HISTORY_PATH)
+    parser.add_argument("--name", default="metafeatures")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record_parser = subparsers.add_parser(
+        "record", help="benchmark the test datasets and store the run"
+    )
+    record_parser.add_argument("--iters", type=int, default=20)
+    record_parser.add_argument("--memory-iters", type=int, default=5)
+    check_parser = subparsers.add_parser(
+        "check", help="compare the latest run to its rolling baseline"
+    )
+    check_parser.add_argument("--baseline-runs", type=int, default=5)
+    check_parser.add_argument("--alpha", type=float, default=.01)
+    args = parser.parse_args(argv)
+
+    history = BenchmarkHistory(args.history)
+    try:
+        if args.command == "record":
+            from test.metalearn.metafeatures.benchmark_metafeatures import (
+                run_metafeature_benchmark
+            )
+            run_metafeature_benchmark(
+                args.name, args.iters, args.memory_iters, history
+            )
+            return 0
+        runs = history.get_runs()
+        runs = runs[runs["name"] == args.name]
+        if len(runs) == 0:
+            print(f"no {args.name} runs in {args.history}")
+            return 1
+        comparisons = detect_regressions(
+            history, runs.index[-1], args.baseline_runs, args.alpha
+        )
+        regressions = comparisons[comparisons["regressed"]]
+        for _, regression in regressions.iterrows():
+            print(
+                f"{regression['dataset']} {regression['id']} " +
+                f"{regression['metric']}: {regression['baseline_median']:.4g}" +
+                f" -> {regression['candidate_median']:.4g} " +
+                f"({regression['relative_change']:+.0%}, Cliff's delta " +
+                f"{regression['cliffs_delta']:.2f}, adjusted p " +
+                f"{regression['adjusted_p_value']:.2g})"
+            )
+        print(
+            f"{len(regressions)} regressions in {len(comparisons)} " +
+            "measurements"
+        )
+        return 1 if len(regressions) > 0 else 0
+    finally:
+        history.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
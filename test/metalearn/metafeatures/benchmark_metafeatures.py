@@ -1,10 +1,17 @@
+import sys
 import json
 import time
+import subprocess
 
 import numpy as np
+import pandas as pd
 
-from metalearn import Metafeatures
+from metalearn import Metafeatures, Profile
+from metalearn.metafeatures.cost_model import CostModel
 from test.data.dataset import read_dataset
+from test.metalearn.metafeatures.benchmark_history import (
+    BenchmarkHistory, detect_regressions, TOTAL_ID
+)
 from test.config import CORRECTNESS_SEED, METADATA_PATH
 
 
@@ -20,88 +27,321 @@ def write_benchmark_data(benchmark_name, benchmark_data):
 def read_benchmark_data(benchmark_name):
     return json.load(open(get_benchmark_path(benchmark_name), "r"))
 
-def run_metafeature_benchmark(benchmark_name, iters=100):
+def run_metafeature_benchmark(
+    benchmark_name, iters=100, memory_iters=5, history=None
+):
     """
     Computes metafeatures `iters` times over the test datasets and stores
-    comparable information in ./<benchmark_name>.json.
+    every measurement as a run named `benchmark_name` in a BenchmarkHistory,
+    by default ./benchmark_history.sqlite, see `detect_regressions`. The
+    measurements are the init time and total compute time of each dataset,
+    the compute time of each metafeature and the exclusive time of each
+    resource. The memory of each resource is measured in `memory_iters`
+    separate runs, since tracing memory slows down the computation. The time
+    taken to import metalearn is measured `iters` times too.
     """
     with open(METADATA_PATH, "r") as f:
         dataset_descriptions = json.load(f)
-    benchmark_data = {}
+    measurements = []
+    start_timestamp = time.time()
+    measurements.extend(
+        (TOTAL_ID, "metalearn", "import_time", get_import_time("metalearn"))
+        for i in range(iters)
+    )
     for dataset_metadata in dataset_descriptions:
-        print(dataset_metadata["filename"])
+        dataset = dataset_metadata["filename"]
+        print(dataset)
         X, Y, column_types = read_dataset(dataset_metadata)
-        init_times = []
-        total_compute_times = []
-        metafeature_compute_times = {
-            mf_id: [] for mf_id in Metafeatures.IDS
-        }
-        for i in range(iters):
+        for i in range(iters + memory_iters):
             print(f"iter {i}")
-            start_timestamp = time.time()
-            mf = Metafeatures()
+            trace_memory = i >= iters
             init_timestamp = time.time()
+            mf = Metafeatures()
+            profile = Profile(trace_memory=trace_memory)
+            compute_timestamp = time.time()
             computed_mfs = mf.compute(
-                X=X, Y=Y, column_types=column_types, seed=CORRECTNESS_SEED
+                X=X, Y=Y, column_types=column_types, seed=CORRECTNESS_SEED,
+                profile=profile
             )
-            compute_timestamp = time.time()
-            init_times.append(init_timestamp - start_timestamp)
-            total_compute_times.append(compute_timestamp - init_timestamp)
-            for mf_id, result in computed_mfs.items():
-                metafeature_compute_times[mf_id].append(
-                    result[Metafeatures.COMPUTE_TIME_KEY]
+            end_timestamp = time.time()
+            if trace_memory:
+                measurements.extend(
+                    (dataset, resource_id, "memory", resource.memory)
+                    for resource_id, resource in profile.resources.items()
                 )
-        benchmark_data[dataset_metadata["filename"]] = {
-            "init_time": {
-                "mean": np.mean(init_times),
-                "std_dev": np.std(init_times)
-            },
-            "total_compute_time": {
-                "mean": np.mean(total_compute_times),
-                "std_dev": np.std(total_compute_times)
-            },
-            "metafeature_compute_time": {
-                mf_id: {
-                    "mean": np.mean(mf_times),
-                    "std_dev": np.std(mf_times)
-                } for mf_id, mf_times in metafeature_compute_times.items()
-            }
-        }
-    write_benchmark_data(benchmark_name, benchmark_data)
+                continue
+            measurements.append((
+                dataset, TOTAL_ID, "init_time",
+                compute_timestamp - init_timestamp
+            ))
+            measurements.append((
+                dataset, TOTAL_ID, "total_compute_time",
+                end_timestamp - compute_timestamp
+            ))
+            measurements.extend(
+                (
+                    dataset, mf_id, "compute_time",
+                    result[Metafeatures.COMPUTE_TIME_KEY]
+                ) for mf_id, result in computed_mfs.items()
+            )
+            measurements.extend(
+                (dataset, resource_id, "exclusive_time", resource.exclusive_time)
+                for resource_id, resource in profile.resources.items()
+            )
+    if history is None:
+        history = BenchmarkHistory()
+    return history.add_run(benchmark_name, start_timestamp, measurements)
 
-def compare_metafeature_benchmarks(bm_1_name, bm_2_name, n_std_dev=3):
-    """
-    Compares two benchmark tests from the run_metafeature_benchmark function.
-    Identifies significant differences in individual metafeature computation
-    time and aggregate computation time. Reports the items that are more than
-    n_std_dev standard deviations different from each other. Does not test for
-    correctness.
-    """
-
-    def compare(item_name, bm_1, bm_2):
-        if (bm_2["mean"] - bm_1["mean"]) < -bm_1["std_dev"] * n_std_dev:
-            rel_imp = (bm_2["mean"] - bm_1["mean"]) / -bm_1["std_dev"]
-            print(f"{item_name} faster by {rel_imp} standard deviations")
-        if (bm_1["mean"] - bm_2["mean"]) < -bm_2["std_dev"] * n_std_dev:
-            rel_imp = (bm_1["mean"] - bm_2["mean"]) / -bm_2["std_dev"]
-            print(f"{item_name} slower by {rel_imp} standard deviations")
-
-    bm_1_data = read_benchmark_data(bm_1_name)
-    bm_2_data = read_benchmark_data(bm_2_name)
-    for dataset_filename, benchmark_data_1 in bm_1_data.items():
-        print(f"{dataset_filename} benchmarks beginning")
-        benchmark_data_2 = bm_2_data[dataset_filename]
-        compare(
-            "init_time", benchmark_data_1["init_time"],
-            benchmark_data_2["init_time"]
+def get_import_time(module_name):
+    """
+    Returns the number of seconds taken to import `module_name` in a new
+    Python interpreter.
+    """
+    return float(subprocess.run(
+        [
+            sys.executable, "-c",
+            "import time; start = time.perf_counter(); " +
+            f"import {module_name}; print(time.perf_counter() - start)"
+        ], capture_output=True, check=True, text=True
+    ).stdout)
+
+def compare_metafeature_benchmarks(
+    history=None, run_id=None, n_baseline_runs=5, alpha=.01
+):
+    """
+    Compares a run of `run_metafeature_benchmark`, by default the latest, to
+    the preceding runs on the same machine, and prints the metafeatures,
+    resources and datasets whose compute time or memory regressed according
+    to a two-sample test, see `detect_regressions`.
+    """
+    if history is None:
+        history = BenchmarkHistory()
+    comparisons = detect_regressions(
+        history, run_id, n_baseline_runs, alpha
+    )
+    regressions = comparisons[comparisons["regressed"]]
+    print(regressions.to_string())
+    return regressions
+
+def make_synthetic_dataset(
+    n_rows, n_numeric, n_categorical, cardinality, missing_fraction,
+    n_classes, seed
+):
+    """
+    Returns a random (X, Y, column_types) dataset with the given shape, where
+    the class depends on the first feature so that the landmarkers have
+    something to learn.
+    """
+    random_state = np.random.RandomState(seed)
+    columns = {}
+    column_types = {}
+    for i in range(n_numeric):
+        columns[f"numeric_{i}"] = random_state.randn(n_rows)
+        column_types[f"numeric_{i}"] = "NUMERIC"
+    for i in range(n_categorical):
+        columns[f"categorical_{i}"] = random_state.randint(
+            cardinality, size=n_rows
+        ).astype(str)
+        column_types[f"categorical_{i}"] = "CATEGORICAL"
+    X = pd.DataFrame(columns)
+    if missing_fraction > 0:
+        X = X.mask(random_state.rand(*X.shape) < missing_fraction)
+    signal = pd.factorize(X.iloc[:, 0])[0] if n_numeric == 0 else \
+        np.argsort(np.argsort(X.iloc[:, 0].values))
+    labels = (signal * n_classes // n_rows + random_state.randint(
+        2, size=n_rows
+    )) % n_classes
+    # every class has enough instances to be cross validated
+    labels[:n_classes * 2] = np.repeat(np.arange(n_classes), 2)
+    Y = pd.Series(labels.astype(str), name="target")
+    column_types["target"] = "CATEGORICAL"
+    return X, Y, column_types
+
+def run_cost_model_calibration(
+    path=CostModel.USER_PATH, n_datasets=60, seed=0
+):
+    """
+    Computes every metafeature on `n_datasets` synthetic datasets of random
+    shapes and fits a cost model to the compute time of each resource, which
+    is saved to `path`. By default, saves it to the user cache directory,
+    where `CostModel` loads it instead of the model shipped with metalearn,
+    so that `sample_shape="auto"` is calibrated to this machine without
+    modifying the installed package.
+    """
+    random_state = np.random.RandomState(seed)
+    cost_model = CostModel({})
+    for i in range(n_datasets):
+        n_features = random_state.randint(1, 60)
+        n_categorical = random_state.binomial(
+            n_features, random_state.choice([0., .5, 1.])
         )
-        compare(
-            "total_compute_time", benchmark_data_1["total_compute_time"],
-            benchmark_data_2["total_compute_time"]
+        dataset_args = {
+            "n_rows": int(np.exp(random_state.uniform(np.log(50), np.log(20000)))),
+            "n_numeric": n_features - n_categorical,
+            "n_categorical": n_categorical,
+            "cardinality": random_state.choice([2, 5, 20, 100]),
+            "missing_fraction": random_state.choice([0., 0., .05, .3]),
+            "n_classes": random_state.choice([2, 3, 10]),
+        }
+        print(f"dataset {i}: {dataset_args}")
+        X, Y, column_types = make_synthetic_dataset(
+            seed=random_state.randint(2**32), **dataset_args
+        )
+        Metafeatures().compute(
+            X, Y, column_types, seed=CORRECTNESS_SEED, cost_model=cost_model
         )
-        for mf_id, bm_1 in benchmark_data_1["metafeature_compute_time"].items():
-            compare(
-                mf_id, bm_1,
-                benchmark_data_2["metafeature_compute_time"][mf_id]
+    cost_model.fit()
+    cost_model.save(path)
+    return cost_model
+
+
+# the dataset around which each axis of the scaling benchmark is swept
+SCALING_BASE = {
+    "n_rows": 2000,
+    "n_columns": 16,
+    "categorical_fraction": .5,
+    "cardinality": 10,
+    "missing_fraction": .05,
+    "n_classes": 4
+}
+SCALING_AXES = {
+    "n_rows": [500, 1000, 2000, 4000, 8000, 16000],
+    "n_columns": [4, 8, 16, 32, 64, 128],
+    "categorical_fraction": [.0625, .125, .25, .5, 1.],
+    "cardinality": [2, 4, 8, 16, 32, 64, 128],
+    "missing_fraction": [.0125, .025, .05, .1, .2, .4],
+    "n_classes": [2, 4, 8, 16, 32]
+}
+# compute times are clipped to this many seconds before taking their log
+MIN_SCALING_TIME = 1e-5
+
+def make_scaling_dataset(
+    n_rows, n_columns, categorical_fraction, cardinality, missing_fraction,
+    n_classes, seed
+):
+    n_categorical = int(round(n_columns * categorical_fraction))
+    return make_synthetic_dataset(
+        n_rows, n_columns - n_categorical, n_categorical, cardinality,
+        missing_fraction, n_classes, seed
+    )
+
+def run_scaling_benchmark(
+    benchmark_name, axes=None, base=None, iters=3, seed=0
+):
+    """
+    Sweeps each axis of the synthetic dataset generator independently,
+    holding the others at their `base` value, and stores in
+    ./<benchmark_name>.json the median over `iters` runs of the exclusive
+    compute time of every resource, i.e. of each group of metafeatures
+    computed by the same function in isolation from its arguments, of the
+    end-to-end compute time of every metafeature and of the whole compute
+    call at each point of each axis.
+    """
+    if axes is None:
+        axes = SCALING_AXES
+    if base is None:
+        base = SCALING_BASE
+    benchmark_data = {"base": base, "axes": {}}
+    for axis, values in axes.items():
+        axis_data = []
+        for value in values:
+            dataset_args = dict(base, **{axis: value})
+            print(f"{axis}={value}")
+            X, Y, column_types = make_scaling_dataset(
+                seed=seed, **dataset_args
             )
-        print(f"{dataset_filename} benchmarks finished")
+            exclusive_times = {}
+            inclusive_times = {}
+            total_compute_times = []
+            for i in range(iters):
+                profile = Profile(trace_memory=False)
+                start_timestamp = time.time()
+                computed_mfs = Metafeatures().compute(
+                    X, Y, column_types, seed=CORRECTNESS_SEED,
+                    profile=profile
+                )
+                total_compute_times.append(time.time() - start_timestamp)
+                for resource_id, resource in profile.resources.items():
+                    exclusive_times.setdefault(resource_id, []).append(
+                        resource.exclusive_time
+                    )
+                for mf_id, result in computed_mfs.items():
+                    inclusive_times.setdefault(mf_id, []).append(
+                        result[Metafeatures.COMPUTE_TIME_KEY]
+                    )
+            axis_data.append({
+                "value": value,
+                "total_compute_time": np.median(total_compute_times),
+                "resource_compute_time": {
+                    resource_id: np.median(times)
+                    for resource_id, times in exclusive_times.items()
+                },
+                "metafeature_compute_time": {
+                    mf_id: np.median(times)
+                    for mf_id, times in inclusive_times.items()
+                    if not None in times
+                }
+            })
+        benchmark_data["axes"][axis] = axis_data
+    benchmark_data["scaling_exponents"] = get_scaling_exponents(
+        benchmark_data
+    )
+    write_benchmark_data(benchmark_name, benchmark_data)
+    return benchmark_data
+
+def get_scaling_exponents(benchmark_data):
+    """
+    Fits log(time) = exponent * log(axis value) + c by least squares for
+    every resource, metafeature and the whole compute call along each axis
+    of a scaling benchmark. An exponent of 1 means the time grows linearly
+    with the axis, 2 quadratically.
+
+    Returns
+    -------
+    a dict from axis to a dict with the "total_compute_time" exponent and
+    dicts from resource or metafeature id to exponent under
+    "resource_compute_time" and "metafeature_compute_time"
+    """
+    def fit(values, times):
+        return float(np.polyfit(
+            np.log(values), np.log(np.maximum(times, MIN_SCALING_TIME)), 1
+        )[0])
+
+    exponents = {}
+    for axis, axis_data in benchmark_data["axes"].items():
+        values = [point["value"] for point in axis_data]
+        axis_exponents = {
+            "total_compute_time": fit(
+                values, [point["total_compute_time"] for point in axis_data]
+            )
+        }
+        for key in ["resource_compute_time", "metafeature_compute_time"]:
+            # ids measured at every point of the axis
+            ids = set.intersection(
+                *(set(point[key]) for point in axis_data)
+            )
+            axis_exponents[key] = {
+                id_: fit(values, [point[key][id_] for point in axis_data])
+                for id_ in sorted(ids)
+            }
+        exponents[axis] = axis_exponents
+    return exponents
+
+def report_scaling_exponents(benchmark_name, min_exponent=1.5):
+    """
+    Prints the resources and metafeatures of a scaling benchmark whose
+    compute time grows faster than value**min_exponent along some axis, e.g.
+    to catch a kernel going from O(d) to O(d**2) before it is deployed.
+    """
+    benchmark_data = read_benchmark_data(benchmark_name)
+    for axis, axis_exponents in benchmark_data["scaling_exponents"].items():
+        print(
+            f"{axis}: total compute time exponent " +
+            f"{axis_exponents['total_compute_time']:.2f}"
+        )
+        for key in ["resource_compute_time", "metafeature_compute_time"]:
+            for id_, exponent in sorted(
+                axis_exponents[key].items(), key=lambda item: -item[1]
+            ):
+                if exponent >= min_exponent:
+                    print(f"    {id_} {key} exponent {exponent:.2f}")
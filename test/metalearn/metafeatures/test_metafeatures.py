@@ -1,17 +1,33 @@
 """ Contains unit tests for the Metafeatures class. """
+import functools
+import importlib.util
 import inspect
+import itertools
 import json
 import jsonschema
 import math
 import os
 import random
+import subprocess
+import sys
+import tempfile
 import time
 import unittest
 
 import pandas as pd
 import numpy as np
 
-from metalearn import Metafeatures
+from metalearn import Metafeatures, MetafeatureCache
+from metalearn.metafeatures.common_operations import (
+    get_moments, get_moment_statistics
+)
+from metalearn.metafeatures.streaming import DatasetAccumulator
+from metalearn.metafeatures.sketches import HyperLogLog, hash_columns
+from metalearn.metafeatures.cost_model import CostModel
+from metalearn.metafeatures.profiling import Profile
+from metalearn.metafeatures.statistical_metafeatures import (
+    get_canonical_correlations
+)
 from test.config import CORRECTNESS_SEED, METADATA_PATH
 from test.data.dataset import read_dataset
 from test.data.compute_dataset_metafeatures import get_dataset_metafeatures_path
@@ -301,6 +317,232 @@ class MetafeaturesWithDataTestCase(unittest.TestCase):
             test_failures.update(self._perform_checks(required_checks))
         self._report_test_failures(test_failures, test_name)
 
+    def test_concurrent_compute(self):
+        """
+        Tests that scheduling the resource graph on a pool of workers gives
+        the same metafeatures as the serial computation.
+        """
+        for dataset_filename, dataset in self.datasets.items():
+            serial_mfs = Metafeatures().compute(
+                X=dataset["X"], Y=dataset["Y"], seed=CORRECTNESS_SEED,
+                column_types=dataset["column_types"]
+            )
+            for backend in ["thread", "process"]:
+                concurrent_mfs = Metafeatures().compute(
+                    X=dataset["X"], Y=dataset["Y"], seed=CORRECTNESS_SEED,
+                    column_types=dataset["column_types"], n_jobs=4,
+                    backend=backend
+                )
+                self.assertEqual(
+                    list(serial_mfs.keys()), list(concurrent_mfs.keys())
+                )
+                for mf_id, result in serial_mfs.items():
+                    serial_value = result[Metafeatures.VALUE_KEY]
+                    concurrent_value = concurrent_mfs[mf_id][
+                        Metafeatures.VALUE_KEY
+                    ]
+                    if type(serial_value) is str:
+                        self.assertEqual(serial_value, concurrent_value)
+                    elif not np.isnan(serial_value):
+                        self.assertTrue(
+                            math.isclose(serial_value, concurrent_value),
+                            f"{mf_id} differs with {backend} backend on " +
+                            f"{dataset_filename}"
+                        )
+
+    def test_compute_many(self):
+        """
+        Tests that computing a batch of datasets gives the same metafeatures
+        as computing each dataset individually, and that a failing dataset
+        is reported without aborting the batch.
+        """
+        with open(METADATA_PATH, "r") as fh:
+            dataset_descriptions = json.load(fh)
+        datasets = [
+            functools.partial(read_dataset, dataset_description)
+            for dataset_description in dataset_descriptions
+        ]
+        datasets.append((None, None, None))
+        metafeature_ids = [
+            "NumberOfInstances", "MeanCardinalityOfNumericFeatures",
+            "ClassEntropy"
+        ]
+        for n_jobs in [1, 2]:
+            results = list(Metafeatures().compute_many(
+                datasets, n_jobs=n_jobs, metafeature_ids=metafeature_ids,
+                seed=CORRECTNESS_SEED
+            ))
+            self.assertEqual(
+                sorted(index for index, _, _ in results),
+                list(range(len(datasets)))
+            )
+            for index, computed_mfs, error in results:
+                if index == len(datasets) - 1:
+                    self.assertIsNone(computed_mfs)
+                    self.assertIn("X must be of type pandas.DataFrame", error)
+                    continue
+                self.assertIsNone(error)
+                dataset_filename = dataset_descriptions[index]["filename"]
+                test_failures = self._check_correctness(
+                    computed_mfs,
+                    self.datasets[dataset_filename]["known_metafeatures"],
+                    dataset_filename
+                )
+                self.assertEqual(test_failures, {})
+        # invalid arguments raise when compute_many is called, not iterated
+        for kwargs in [{"chunksize": 0}, {"n_jobs": 0}]:
+            with self.assertRaises(ValueError):
+                Metafeatures().compute_many([], **kwargs)
+
+    def test_sparse_preprocessing(self):
+        """
+        Tests that the metafeatures computed on sparse preprocessed features
+        match those computed on dense ones.
+        """
+        from scipy.sparse import issparse
+
+        mf_ids = [
+            mf_id for mf_id in Metafeatures.list_metafeatures()
+            if "PCA" in mf_id or "Eigen" in mf_id or "Det" in mf_id or
+            "ErrRate" in mf_id or "Kappa" in mf_id
+        ]
+        for dataset_filename, dataset in self.datasets.items():
+            dense_mfs = Metafeatures().compute(
+                X=dataset["X"], Y=dataset["Y"],
+                column_types=dataset["column_types"], metafeature_ids=mf_ids,
+                seed=CORRECTNESS_SEED, sparse_threshold=None
+            )
+            metafeatures = Metafeatures()
+            sparse_mfs = metafeatures.compute(
+                X=dataset["X"], Y=dataset["Y"],
+                column_types=dataset["column_types"], metafeature_ids=mf_ids,
+                seed=CORRECTNESS_SEED, sparse_threshold=0
+            )
+            self.assertTrue(issparse(
+                metafeatures._resources["XPreprocessed"][
+                    Metafeatures.VALUE_KEY
+                ]
+            ))
+            for mf_id in mf_ids:
+                self.assertTrue(math.isclose(
+                    dense_mfs[mf_id][Metafeatures.VALUE_KEY],
+                    sparse_mfs[mf_id][Metafeatures.VALUE_KEY],
+                    rel_tol=1e-6, abs_tol=1e-9
+                ), f"{mf_id} differs on {dataset_filename}")
+
+    def test_compute_streaming(self):
+        """
+        Tests that computing metafeatures over chunks of a dataset gives the
+        same metafeatures as computing them on the whole dataset, both when
+        the random sample holds the whole dataset and, for the accumulated
+        metafeatures, when it does not.
+        """
+        test_failures = {}
+        test_name = inspect.stack()[0][3]
+        accumulated_mf_ids = [
+            mf_id for group in DatasetAccumulator.MERGEABLE_GROUPS +
+            DatasetAccumulator.MERGEABLE_TARGET_DEPENDENT_GROUPS
+            for mf_id in Metafeatures._resources_info[group]["returns"]
+        ]
+        for dataset_filename, dataset in self.datasets.items():
+            data = pd.concat([dataset["X"], dataset["Y"]], axis=1)
+            known_mfs = Metafeatures().compute(
+                X=dataset["X"], Y=dataset["Y"], seed=CORRECTNESS_SEED,
+                column_types=dataset["column_types"]
+            )
+            for reservoir_size, metafeature_ids in [
+                (data.shape[0], None), (10, accumulated_mf_ids)
+            ]:
+                chunks = (
+                    data.iloc[i:i+100] for i in range(0, data.shape[0], 100)
+                )
+                computed_mfs = Metafeatures().compute_streaming(
+                    chunks, dataset["Y"].name, dataset["column_types"],
+                    metafeature_ids=metafeature_ids, seed=CORRECTNESS_SEED,
+                    reservoir_size=reservoir_size
+                )
+                test_failures.update(self._check_correctness(
+                    computed_mfs, known_mfs, dataset_filename
+                ))
+        self._report_test_failures(test_failures, test_name)
+
+    def test_update_state(self):
+        """
+        Tests that appending rows to a dataset refreshes the mergeable
+        metafeatures to their values on the whole dataset and marks the
+        others stale.
+        """
+        test_failures = {}
+        test_name = inspect.stack()[0][3]
+        for dataset_filename, dataset in self.datasets.items():
+            known_mfs = Metafeatures().compute(
+                X=dataset["X"], Y=dataset["Y"], seed=CORRECTNESS_SEED,
+                column_types=dataset["column_types"]
+            )
+            # about half of the rows are appended, keeping enough instances
+            # of each class in the initial rows to cross validate
+            position_in_class = dataset["Y"].groupby(dataset["Y"]).cumcount()
+            is_appended = (position_in_class >= 2) & \
+                (position_in_class % 2 == 1)
+            state = Metafeatures().init_state(
+                dataset["X"][~is_appended], dataset["Y"][~is_appended],
+                dataset["column_types"], seed=CORRECTNESS_SEED
+            )
+            self.assertEqual(len(state.stale_ids), 0)
+            computed_mfs = Metafeatures().update_state(
+                state, dataset["X"][is_appended], dataset["Y"][is_appended]
+            )
+            self.assertEqual(state.n_rows, dataset["X"].shape[0])
+            self.assertIn("PredPCA1", state.stale_ids)
+            self.assertIn("NaiveBayesErrRate", state.stale_ids)
+            for mf_id, result in computed_mfs.items():
+                self.assertEqual(
+                    result[Metafeatures.STALE_KEY], mf_id in state.stale_ids
+                )
+            test_failures.update(self._check_correctness(
+                {
+                    mf_id: computed_mfs[mf_id]
+                    for mf_id in state.mergeable_ids
+                }, known_mfs, dataset_filename
+            ))
+        self._report_test_failures(test_failures, test_name)
+
+    def test_extend_state(self):
+        """
+        Tests that adding columns to a dataset refreshes the mergeable
+        metafeatures to their values on every column.
+        """
+        test_failures = {}
+        test_name = inspect.stack()[0][3]
+        for dataset_filename, dataset in self.datasets.items():
+            known_mfs = Metafeatures().compute(
+                X=dataset["X"], Y=dataset["Y"], seed=CORRECTNESS_SEED,
+                column_types=dataset["column_types"]
+            )
+            columns = list(dataset["X"].columns)
+            n_columns = len(columns) // 2
+            state = Metafeatures().init_state(
+                dataset["X"][columns[:n_columns]], dataset["Y"],
+                dataset["column_types"], seed=CORRECTNESS_SEED
+            )
+            computed_mfs = Metafeatures().extend_state(
+                state, dataset["X"][columns[n_columns:]], dataset["Y"],
+                dataset["column_types"]
+            )
+            self.assertEqual(state.accumulator.columns, columns)
+            self.assertIn("PredPCA1", state.stale_ids)
+            test_failures.update(self._check_correctness(
+                {
+                    mf_id: computed_mfs[mf_id]
+                    for mf_id in state.mergeable_ids
+                }, known_mfs, dataset_filename
+            ))
+            with self.assertRaises(ValueError):
+                Metafeatures().extend_state(
+                    state, dataset["X"][columns[:1]], dataset["Y"]
+                )
+        self._report_test_failures(test_failures, test_name)
+
     def test_output_format(self):
         with open("./metalearn/metafeatures/metafeatures_schema.json") as f:
             mf_schema = json.load(f)
@@ -358,7 +600,7 @@ class MetafeaturesTestCase(unittest.TestCase):
         self.assertEqual(str(cm.exception), expected_error_message1, fail_message1)
 
         with self.assertRaises(TypeError) as cm:
-            Metafeatures().compute(X=np.zeros((500, 50)), Y=pd.Series(np.zeros(500)))
+            Metafeatures().compute(X=np.zeros((500, 50)).tolist(), Y=pd.Series(np.zeros(500)))
         self.assertEqual(str(cm.exception), expected_error_message1, fail_message1)
 
         with self.assertRaises(TypeError) as cm:
@@ -557,6 +799,813 @@ class MetafeaturesTestCase(unittest.TestCase):
                 )
             self.assertEqual(str(cm.exception), test["message"])
 
+    def test_n_jobs_invalid_input(self):
+        tests = [
+            {
+                "kwargs": {"n_jobs": 0},
+                "message": "`n_jobs` must be a positive integer or -1, not 0"
+            },
+            {
+                "kwargs": {"n_jobs": 1.5},
+                "message": "`n_jobs` must be a positive integer or -1, not 1.5"
+            },
+            {
+                "kwargs": {"n_jobs": 2, "backend": "gpu"},
+                "message": "`backend` must be one of thread or process, not gpu"
+            }
+        ]
+        for test in tests:
+            with self.assertRaises(ValueError) as cm:
+                Metafeatures().compute(
+                    self.dummy_features, self.dummy_target, **test["kwargs"]
+                )
+            self.assertEqual(str(cm.exception), test["message"])
+
+    def test_cache(self):
+        first_ids = ["NumberOfInstances", "MeanSkewnessOfNumericFeatures", "PredPCA1"]
+        second_ids = ["PredPCA1", "NaiveBayesErrRate", "ClassEntropy"]
+        all_ids = first_ids + second_ids[1:]
+        expected_mfs = Metafeatures().compute(
+            self.dummy_features, self.dummy_target, seed=0,
+            metafeature_ids=all_ids
+        )
+        with tempfile.TemporaryDirectory() as cache_dir:
+            first_mfs = Metafeatures().compute(
+                self.dummy_features, self.dummy_target, seed=0,
+                metafeature_ids=first_ids, cache_dir=cache_dir
+            )
+            # a partial hit reuses the cached metafeatures
+            second_mfs = Metafeatures().compute(
+                self.dummy_features, self.dummy_target, seed=0,
+                metafeature_ids=second_ids, cache_dir=cache_dir
+            )
+            self.assertEqual(first_mfs["PredPCA1"], second_mfs["PredPCA1"])
+            # a full hit does not compute anything
+            metafeatures = Metafeatures()
+            cached_mfs = metafeatures.compute(
+                self.dummy_features, self.dummy_target, seed=0,
+                metafeature_ids=all_ids, cache_dir=cache_dir
+            )
+            # only the base resources, which have no function, are present
+            self.assertTrue(all(
+                Metafeatures._resources_info[resource_id]["function"] == ""
+                for resource_id in metafeatures._resources
+            ))
+            self.assertEqual(list(cached_mfs.keys()), all_ids)
+            for mf_id, result in expected_mfs.items():
+                self.assertTrue(math.isclose(
+                    result[Metafeatures.VALUE_KEY],
+                    cached_mfs[mf_id][Metafeatures.VALUE_KEY]
+                ))
+            # a different seed or dataset is a miss
+            metafeatures.compute(
+                self.dummy_features, self.dummy_target, seed=1,
+                metafeature_ids=first_ids, cache_dir=cache_dir
+            )
+            self.assertTrue("XPreprocessed" in metafeatures._resources)
+            self.assertEqual(len(os.listdir(cache_dir)), 3) # 2 entries, lock
+
+    def test_compute_streaming_from_file(self):
+        data = pd.concat([self.dummy_features, self.dummy_target], axis=1)
+        data.columns = [str(col) for col in data.columns]
+        with tempfile.TemporaryDirectory() as data_dir:
+            path = os.path.join(data_dir, "data.csv")
+            data.to_csv(path, index=False)
+            computed_mfs = Metafeatures().compute_streaming(
+                path, "target", metafeature_ids=["NumberOfInstances"],
+                chunksize=7
+            )
+        self.assertEqual(
+            computed_mfs["NumberOfInstances"][Metafeatures.VALUE_KEY], 50
+        )
+
+    def test_cache_eviction(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = MetafeatureCache(cache_dir, max_size=1)
+            for seed in range(3):
+                Metafeatures().compute(
+                    self.dummy_features, self.dummy_target, seed=seed,
+                    metafeature_ids=["NumberOfInstances"], cache_dir=cache
+                )
+            # every entry is larger than max_size, so all are evicted
+            self.assertEqual(os.listdir(cache_dir), [cache.LOCK_FILENAME])
+
+    @unittest.skipUnless(
+        hasattr(pd, "Float64Dtype"), "requires pandas nullable dtypes"
+    )
+    def test_cache_key_extension_dtypes(self):
+        X = pd.DataFrame({
+            "nullable_int": pd.array([1, None, 3, 4], dtype="Int64"),
+            "nullable_float": pd.array([1., None, 2., 3.], dtype="Float64"),
+            "nullable_bool": pd.array(
+                [True, None, False, True], dtype="boolean"
+            ),
+            "datetime_tz": pd.date_range("2020", periods=4, tz="UTC")
+        })
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = MetafeatureCache(cache_dir)
+            key = cache.get_key(X, None, {})
+            self.assertEqual(key, cache.get_key(X.copy(), None, {}))
+            # a missing value and a value are distinct
+            changed_X = X.copy()
+            changed_X.loc[1, "nullable_int"] = 0
+            self.assertNotEqual(key, cache.get_key(changed_X, None, {}))
+
+    def test_moments_match_pandas(self):
+        X = pd.DataFrame(np.random.rand(50, 5) * 100)
+        X[1] = 3. # constant
+        X.loc[::2, 2] = np.nan
+        X.loc[3:, 3] = np.nan # fewer values than the kurtosis needs
+        X[4] = np.random.randint(5, size=50)
+        mean, stdev, skewness, kurtosis = get_moment_statistics(
+            *get_moments(X.values)
+        )
+        for i, col in enumerate(X.columns):
+            feature = X[col].dropna()
+            for expected, computed in [
+                (feature.mean(), mean[i]), (feature.std(), stdev[i]),
+                (feature.skew(), skewness[i]),
+                (feature.kurtosis(), kurtosis[i])
+            ]:
+                if np.isnan(expected):
+                    self.assertTrue(np.isnan(computed))
+                else:
+                    self.assertAlmostEqual(expected, computed, places=10)
+
+    def test_approximate_cardinalities(self):
+        rng = np.random.RandomState(0)
+        n_rows = 20000
+        X = pd.DataFrame({
+            "id": np.arange(n_rows).astype(str),
+            "num": rng.randint(1000, size=n_rows).astype(float),
+            "cat": rng.choice(["a", "b", "c"], size=n_rows)
+        })
+        X.loc[::10, "num"] = np.nan
+        column_types = {
+            "id": "CATEGORICAL", "num": "NUMERIC", "cat": "CATEGORICAL"
+        }
+        exact = np.array([X[col].unique().shape[0] for col in X.columns])
+        error = .01
+        sketch = HyperLogLog(X.shape[1], error)
+        sketch.update(hash_columns(X, column_types))
+        relative_errors = np.abs(sketch.estimate() / exact - 1)
+        self.assertTrue(
+            np.all(relative_errors < 4 * error), relative_errors
+        )
+
+        # sketches of disjoint chunks merge into the sketch of the whole
+        merged_sketch = HyperLogLog(X.shape[1], error)
+        for chunk in [X.iloc[:5000], X.iloc[5000:]]:
+            chunk_sketch = HyperLogLog(X.shape[1], error)
+            merged_sketch.merge(chunk_sketch.update(
+                hash_columns(chunk, column_types)
+            ))
+        self.assertTrue(
+            np.array_equal(merged_sketch.registers, sketch.registers)
+        )
+
+        mf_ids = [
+            "MaxCardinalityOfCategoricalFeatures",
+            "MeanCardinalityOfNumericFeatures"
+        ]
+        for kwargs in [{}, {"cardinality_error": error}]:
+            computed = Metafeatures().compute(
+                X, column_types=column_types, metafeature_ids=mf_ids,
+                **kwargs
+            )
+            streamed = Metafeatures().compute_streaming(
+                [X.iloc[:5000], X.iloc[5000:]], column_types=column_types,
+                metafeature_ids=mf_ids, **kwargs
+            )
+            for mf_id, expected in zip(mf_ids, exact[:2]):
+                value = computed[mf_id][Metafeatures.VALUE_KEY]
+                streamed_value = streamed[mf_id][Metafeatures.VALUE_KEY]
+                if kwargs:
+                    self.assertTrue(math.isclose(value, expected, rel_tol=.04))
+                else:
+                    self.assertEqual(value, expected)
+                self.assertTrue(math.isclose(value, streamed_value))
+
+        for cardinality_error in [0, 1, -.5, "0.1"]:
+            with self.assertRaises(ValueError):
+                Metafeatures().compute(
+                    X, column_types=column_types, metafeature_ids=mf_ids,
+                    cardinality_error=cardinality_error
+                )
+
+    def test_landmarkers_match_cross_validate(self):
+        from sklearn.model_selection import cross_validate, StratifiedKFold
+        from sklearn.metrics import make_scorer, cohen_kappa_score
+        from sklearn.neighbors import KNeighborsClassifier
+
+        Y = pd.Series(
+            np.random.choice(["a", "b", "c"], size=50), name="target"
+        )
+        seed, n_folds = 0, 3
+        computed_mfs = Metafeatures().compute(
+            self.dummy_features, Y, seed=seed, n_folds=n_folds,
+            metafeature_ids=["kNN1NErrRate", "kNN1NKappa"]
+        )
+        cv = StratifiedKFold(
+            n_splits=n_folds, shuffle=True, random_state=seed + 1 # cv_seed
+        )
+        scores = cross_validate(
+            KNeighborsClassifier(n_neighbors=1), self.dummy_features.values,
+            Y.values, cv=cv, scoring={
+                "accuracy": "accuracy",
+                "kappa": make_scorer(cohen_kappa_score)
+            }
+        )
+        self.assertTrue(math.isclose(
+            computed_mfs["kNN1NErrRate"][Metafeatures.VALUE_KEY],
+            1. - np.mean(scores["test_accuracy"])
+        ))
+        self.assertTrue(math.isclose(
+            computed_mfs["kNN1NKappa"][Metafeatures.VALUE_KEY],
+            np.mean(scores["test_kappa"]), abs_tol=1e-12
+        ))
+
+    def test_approximate_knn(self):
+        rng = np.random.RandomState(0)
+        Y = pd.Series(rng.randint(3, size=2000), name="target").astype(str)
+        X = pd.DataFrame(
+            rng.randn(2000, 5) + 4 * Y.astype(int).values[:, np.newaxis]
+        )
+        mf_ids = ["kNN1NErrRate", "kNN1NKappa"]
+        exact_mfs = Metafeatures().compute(
+            X, Y, metafeature_ids=mf_ids, seed=0
+        )
+        approximate_mfs = Metafeatures().compute(
+            X, Y, metafeature_ids=mf_ids, seed=0, approximate_knn=True
+        )
+        for mf_id in mf_ids:
+            self.assertNotIn(Metafeatures.RECALL_KEY, exact_mfs[mf_id])
+            recall = approximate_mfs[mf_id][Metafeatures.RECALL_KEY]
+            self.assertTrue(.5 < recall <= 1., recall)
+            self.assertTrue(math.isclose(
+                exact_mfs[mf_id][Metafeatures.VALUE_KEY],
+                approximate_mfs[mf_id][Metafeatures.VALUE_KEY],
+                abs_tol=.05
+            ))
+        with self.assertRaises(ValueError):
+            Metafeatures().compute(
+                X, Y, metafeature_ids=mf_ids, approximate_knn="yes"
+            )
+
+    def test_time_budget(self):
+        class SlowLandmarkingMetafeatures(Metafeatures):
+            def _get_cv_folds(self, **kwargs):
+                time.sleep(3)
+                return super()._get_cv_folds(**kwargs)
+
+        landmarking_ids = Metafeatures.list_metafeatures("landmarking")
+        for kwargs in [
+            {"time_budget": 1}, {"group_time_budgets": {"landmarking": .5}},
+            {"time_budget": 1, "n_jobs": 2}
+        ]:
+            start = time.time()
+            computed_mfs = SlowLandmarkingMetafeatures().compute(
+                self.dummy_features, self.dummy_target, seed=0, **kwargs
+            )
+            self.assertLess(time.time() - start, 3, kwargs)
+            self.assertEqual(
+                list(computed_mfs.keys()), Metafeatures.list_metafeatures()
+            )
+            for mf_id, result in computed_mfs.items():
+                if mf_id in landmarking_ids:
+                    self.assertEqual(
+                        result[Metafeatures.VALUE_KEY], Metafeatures.TIMEOUT
+                    )
+                    self.assertIsNone(result[Metafeatures.COMPUTE_TIME_KEY])
+                else:
+                    self.assertNotEqual(
+                        result[Metafeatures.VALUE_KEY], Metafeatures.TIMEOUT
+                    )
+
+        for kwargs in [
+            {"time_budget": 0}, {"time_budget": "1"},
+            {"group_time_budgets": {"unknown": 1}},
+            {"group_time_budgets": {"landmarking": -1}}
+        ]:
+            with self.assertRaises(ValueError):
+                Metafeatures().compute(
+                    self.dummy_features, self.dummy_target, **kwargs
+                )
+
+    def test_time_budget_interrupts_landmarking_fits(self):
+        from metalearn.metafeatures import landmarking_metafeatures
+
+        clone = landmarking_metafeatures.clone
+
+        def slow_clone(estimator):
+            time.sleep(1)
+            return clone(estimator)
+
+        landmarking_ids = Metafeatures.list_metafeatures("landmarking")
+        with tempfile.TemporaryDirectory() as cache_dir:
+            landmarking_metafeatures.clone = slow_clone
+            try:
+                # the fits catch their exceptions, which must not include the
+                # timeout
+                computed_mfs = Metafeatures().compute(
+                    self.dummy_features, self.dummy_target, seed=0,
+                    metafeature_ids=landmarking_ids, cache_dir=cache_dir,
+                    group_time_budgets={"landmarking": .5}
+                )
+            finally:
+                landmarking_metafeatures.clone = clone
+            for mf_id in landmarking_ids:
+                self.assertEqual(
+                    computed_mfs[mf_id][Metafeatures.VALUE_KEY],
+                    Metafeatures.TIMEOUT, mf_id
+                )
+            # nothing was cached
+            profile = Profile()
+            Metafeatures().compute(
+                self.dummy_features, self.dummy_target, seed=0,
+                metafeature_ids=landmarking_ids, cache_dir=cache_dir,
+                profile=profile
+            )
+            self.assertFalse(any(
+                resource_profile.cache_hit
+                for resource_profile in profile.resources.values()
+            ))
+
+    def test_auto_sample_shape(self):
+        cost_model = CostModel()
+        computed_mfs = Metafeatures().compute(
+            self.dummy_features, self.dummy_target, seed=0,
+            cost_model=cost_model
+        )
+        for mf_id, result in computed_mfs.items():
+            self.assertGreaterEqual(
+                result[Metafeatures.PREDICTED_COMPUTE_TIME_KEY], 0, mf_id
+            )
+        self.assertEqual(len(cost_model.observations), 2)
+
+        # recalibrating on a machine 10 times slower
+        cost_model.fit([
+            (features, {
+                resource_id: compute_time * 10
+                for resource_id, compute_time in compute_times.items()
+            })
+            for features, compute_times in cost_model.observations
+        ])
+        features = CostModel.get_dataset_features(
+            self.dummy_features, self.dummy_target,
+            {**{col: "NUMERIC" for col in self.dummy_features.columns},
+            self.dummy_target.name: "CATEGORICAL"}
+        )
+        self.assertGreater(
+            cost_model.predict("NumericFeatureMoments", features),
+            CostModel().predict("NumericFeatureMoments", features)
+        )
+        # a calibrated model saved to the user path replaces the shipped one
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            class UserCostModel(CostModel):
+                USER_PATH = os.path.join(
+                    tmp_dir, "metalearn", "cost_model.json"
+                )
+
+            cost_model.save(UserCostModel.USER_PATH)
+            self.assertEqual(
+                UserCostModel().predict("NumericFeatureMoments", features),
+                cost_model.predict("NumericFeatureMoments", features)
+            )
+        # every resource of metafeatures.json is in the shipped model
+        self.assertEqual(
+            set(CostModel.load(CostModel.DEFAULT_PATH).coefficients), set(
+                resource_info["returns"][0]
+                for resource_info in Metafeatures._resources_info.values()
+                if resource_info["function"] != ""
+            )
+        )
+
+        for target_seconds, sampled in [(1e3, False), (1e-6, True)]:
+            mf = Metafeatures()
+            computed_mfs = mf.compute(
+                self.dummy_features, self.dummy_target, seed=0,
+                sample_shape="auto", target_seconds=target_seconds
+            )
+            sample_shape, _ = mf._get_resource("sample_shape")
+            self.assertEqual(sample_shape != (None, None), sampled)
+            for result in computed_mfs.values():
+                self.assertIn(Metafeatures.PREDICTED_COMPUTE_TIME_KEY, result)
+
+        for kwargs in [
+            {"sample_shape": "auto"},
+            {"sample_shape": "auto", "target_seconds": 0},
+            {"target_seconds": 1}
+        ]:
+            with self.assertRaises(ValueError):
+                Metafeatures().compute(
+                    self.dummy_features, self.dummy_target, **kwargs
+                )
+
+    def test_trace_memory_without_reset_peak(self):
+        import tracemalloc
+        from metalearn.metafeatures.profiling import call_resource_function
+
+        def allocate():
+            return (np.ones(10**6),)
+
+        reset_peak = getattr(tracemalloc, "reset_peak", None)
+        tracemalloc.start()
+        try:
+            # tracemalloc.reset_peak does not exist before Python 3.9
+            if reset_peak is not None:
+                del tracemalloc.reset_peak
+            _, _, trace = call_resource_function(allocate, {}, True)
+        finally:
+            if reset_peak is not None:
+                tracemalloc.reset_peak = reset_peak
+            tracemalloc.stop()
+        self.assertGreaterEqual(trace["memory"], 8 * 10**6)
+
+    def test_profile(self):
+        profile = Profile()
+        computed_mfs = Metafeatures().compute(
+            self.dummy_features, self.dummy_target, seed=0, profile=profile
+        )
+        for mf_id in ["PredPCA1", "XPreprocessed", "XSample"]:
+            self.assertIn(mf_id, profile.resources)
+        pca = profile.resources["PredPCA1"]
+        preprocessing = profile.resources["XPreprocessed"]
+        self.assertLess(pca.exclusive_time, pca.inclusive_time)
+        self.assertEqual(
+            pca.inclusive_time,
+            computed_mfs["PredPCA1"][Metafeatures.COMPUTE_TIME_KEY]
+        )
+        self.assertGreater(preprocessing.memory, 0)
+        self.assertGreater(profile.resources["XSample"].n_reuses, 0)
+        # arguments are computed within the span of the resource needing them
+        self.assertLessEqual(pca.start, preprocessing.start)
+        self.assertLessEqual(preprocessing.end, pca.end)
+        profile_dataframe = profile.to_dataframe()
+        self.assertEqual(set(profile_dataframe.index), set(profile.resources))
+        self.assertTrue(profile_dataframe["start"].is_monotonic_increasing)
+
+        trace = json.loads(json.dumps(profile.to_chrome_trace()))
+        self.assertEqual(len(trace["traceEvents"]), len(profile.resources))
+        for event in trace["traceEvents"]:
+            self.assertEqual(event["ph"], "X")
+            self.assertGreaterEqual(event["ts"], 0)
+
+        for kwargs in [{"n_jobs": 2}, {"n_jobs": 2, "backend": "process"}]:
+            profile = Profile(trace_memory=False)
+            Metafeatures().compute(
+                self.dummy_features, self.dummy_target, seed=0,
+                profile=profile, **kwargs
+            )
+            self.assertIn("XPreprocessed", profile.resources)
+            self.assertIsNone(profile.resources["XPreprocessed"].memory)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for cache_hit in [False, True]:
+                Metafeatures().compute(
+                    self.dummy_features, self.dummy_target, seed=0,
+                    metafeature_ids=["ClassEntropy"], cache_dir=cache_dir,
+                    profile=profile
+                )
+                self.assertEqual(
+                    profile.resources["ClassEntropy"].cache_hit, cache_hit
+                )
+
+    def test_lazy_imports(self):
+        for resource_id, resource_info in Metafeatures._resources_info.items():
+            if resource_info["function"] != "":
+                self.assertTrue(callable(
+                    Metafeatures()._get_function(resource_info["function"])
+                ), resource_id)
+
+        # simple metafeatures are computed without loading sklearn
+        loaded_modules = subprocess.run(
+            [
+                sys.executable, "-c",
+                "import sys\n" +
+                "import pandas as pd\n" +
+                "from metalearn import Metafeatures\n" +
+                "X = pd.DataFrame({'a': [1., 2., 3.], 'b': ['x', 'y', 'x']})\n" +
+                "Metafeatures().compute(X, metafeature_ids=[\n" +
+                "    'NumberOfInstances', 'RatioOfMissingValues',\n" +
+                "    'MeanCardinalityOfCategoricalFeatures'\n" +
+                "])\n" +
+                "print(' '.join(sys.modules))"
+            ], capture_output=True, check=True, text=True
+        ).stdout.split()
+        for module_name in [
+            "sklearn", "scipy.stats",
+            "metalearn.metafeatures.landmarking_metafeatures"
+        ]:
+            self.assertNotIn(module_name, loaded_modules)
+
+    def test_plan(self):
+        plan = Metafeatures.plan()
+        self.assertIs(plan, Metafeatures.plan(Metafeatures.list_metafeatures()))
+        # the memo is bounded and can be cleared
+        from metalearn.metafeatures import metafeatures as metafeatures_module
+        mf_ids = Metafeatures.list_metafeatures()
+        requests = [mf_ids[:i + 1] for i in range(len(mf_ids))] + [
+            mf_ids[i:] for i in range(1, len(mf_ids))
+        ]
+        for request in requests[:metafeatures_module.PLAN_CACHE_SIZE + 1]:
+            Metafeatures.plan(request)
+        self.assertEqual(
+            metafeatures_module._get_plan.cache_info().currsize,
+            metafeatures_module.PLAN_CACHE_SIZE
+        )
+        Metafeatures.clear_plans()
+        self.assertEqual(metafeatures_module._get_plan.cache_info().currsize, 0)
+        self.assertIsNot(plan, Metafeatures.plan())
+        positions = {
+            resource_id: i for i, resource_id in enumerate(plan.resource_ids)
+        }
+        for resource_id in plan.resource_ids:
+            for dependency in plan.dependencies[resource_id]:
+                if dependency in Metafeatures._resources_info and \
+                    Metafeatures._resources_info[dependency]["function"] != "":
+                    dependency = Metafeatures._resources_info[dependency][
+                        "returns"
+                    ][0]
+                    self.assertLess(
+                        positions[dependency], positions[resource_id]
+                    )
+        self.assertEqual(
+            plan.target_dependent_ids,
+            set(Metafeatures.list_metafeatures("target_dependent"))
+        )
+
+        no_targets_plan = Metafeatures.plan(has_targets=False)
+        self.assertEqual(
+            no_targets_plan.skipped_ids, no_targets_plan.target_dependent_ids
+        )
+        self.assertTrue(no_targets_plan.skipped_ids.isdisjoint(
+            no_targets_plan.resource_ids
+        ))
+        simple_plan = Metafeatures.plan(["NumberOfInstances", "ClassEntropy"])
+        self.assertFalse(simple_plan.includes_landmarking)
+        self.assertNotIn("XPreprocessed", simple_plan.resource_ids)
+
+        for Y, plan_Y in [(self.dummy_target, plan), (None, no_targets_plan)]:
+            planned_mfs = Metafeatures().compute(
+                self.dummy_features, Y, seed=0, plan=plan_Y
+            )
+            computed_mfs = Metafeatures().compute(
+                self.dummy_features, Y, seed=0
+            )
+            self.assertEqual(list(planned_mfs), list(computed_mfs))
+            for mf_id, result in computed_mfs.items():
+                value = result[Metafeatures.VALUE_KEY]
+                if type(value) is str or not np.isnan(value):
+                    self.assertEqual(
+                        planned_mfs[mf_id][Metafeatures.VALUE_KEY], value,
+                        mf_id
+                    )
+
+        with self.assertRaises(ValueError):
+            Metafeatures.plan(["NotAMetafeature"])
+        with self.assertRaises(ValueError):
+            Metafeatures().compute(
+                self.dummy_features, self.dummy_target, plan=plan,
+                metafeature_ids=["NumberOfInstances"]
+            )
+        with self.assertRaises(ValueError):
+            Metafeatures().compute(self.dummy_features, plan=plan)
+
+    def test_session(self):
+        mf_ids = ["PredPCA1", "kNN1NErrRate"]
+        computed_mfs = Metafeatures().compute(
+            self.dummy_features, self.dummy_target, seed=0,
+            metafeature_ids=mf_ids
+        )
+        session = Metafeatures().session(
+            self.dummy_features, self.dummy_target, seed=0
+        )
+        pca_mfs = session.compute(["PredPCA1"])
+        self.assertGreater(session.get_memory_usage(), 0)
+        profile = Profile(trace_memory=False)
+        knn_mfs = session.compute(["kNN1NErrRate"], profile=profile)
+        # the samples and preprocessed features of PredPCA1 are reused
+        for resource_id in ["XSample", "YSample", "XPreprocessed"]:
+            self.assertNotIn(resource_id, profile.resources)
+        self.assertIn("CVFolds", profile.resources)
+        for mf_id, result in [
+            ("PredPCA1", pca_mfs["PredPCA1"]),
+            ("kNN1NErrRate", knn_mfs["kNN1NErrRate"])
+        ]:
+            self.assertEqual(
+                result[Metafeatures.VALUE_KEY],
+                computed_mfs[mf_id][Metafeatures.VALUE_KEY]
+            )
+        self.assertEqual(session.compute(["PredPCA1"]), pca_mfs)
+
+        session.release()
+        self.assertEqual(session.get_memory_usage(), 0)
+        self.assertEqual(session.compute(mf_ids).keys(), set(mf_ids))
+        session = Metafeatures().session(
+            self.dummy_features, self.dummy_target, max_memory=0
+        )
+        session.compute(mf_ids)
+        self.assertEqual(session.get_memory_usage(), 0)
+        with self.assertRaises(ValueError):
+            Metafeatures().session(self.dummy_features, sample_shape="auto")
+
+    def test_max_memory(self):
+        X = self.dummy_features.copy()
+        X.iloc[::7, 3] = np.nan
+        computed_mfs = Metafeatures().compute(X, self.dummy_target, seed=0)
+        metafeatures = Metafeatures()
+        limited_mfs = metafeatures.compute(
+            X, self.dummy_target, seed=0, max_memory=0
+        )
+        self.assertEqual(metafeatures._get_intermediate_sizes(), {})
+        for mf_id, result in computed_mfs.items():
+            value = result[Metafeatures.VALUE_KEY]
+            if type(value) is str or not np.isnan(value):
+                self.assertEqual(
+                    limited_mfs[mf_id][Metafeatures.VALUE_KEY], value, mf_id
+                )
+        with self.assertRaises(ValueError):
+            Metafeatures().compute(
+                self.dummy_features, self.dummy_target, max_memory=-1
+            )
+
+    def test_release_intermediates(self):
+        metafeatures = Metafeatures()
+        kept_mfs = metafeatures.compute(
+            self.dummy_features, self.dummy_target, seed=0
+        )
+        # intermediates are kept by default
+        self.assertIn("XPreprocessed", metafeatures._resources)
+        metafeatures = Metafeatures()
+        released_mfs = metafeatures.compute(
+            self.dummy_features, self.dummy_target, seed=0,
+            release_intermediates=True
+        )
+        # every intermediate is consumed by the end of compute
+        self.assertEqual(metafeatures._get_intermediate_sizes(), {})
+        with tempfile.TemporaryDirectory() as spill_dir:
+            spilled_mfs = Metafeatures().compute(
+                self.dummy_features, self.dummy_target, seed=0, max_memory=0,
+                spill_dir=spill_dir
+            )
+            self.assertEqual(os.listdir(spill_dir), [])
+        for mf_id, result in kept_mfs.items():
+            value = result[Metafeatures.VALUE_KEY]
+            if type(value) is str or not np.isnan(value):
+                for computed_mfs in [released_mfs, spilled_mfs]:
+                    self.assertEqual(
+                        computed_mfs[mf_id][Metafeatures.VALUE_KEY], value,
+                        mf_id
+                    )
+        with self.assertRaises(ValueError):
+            Metafeatures().compute(
+                self.dummy_features, self.dummy_target, spill_dir=spill_dir
+            )
+
+    def test_ndarray_input(self):
+        X = self.dummy_features.values.astype(np.float64)
+        X[::7, 3] = np.nan
+        Y = self.dummy_target.values
+        column_types = [Metafeatures.NUMERIC] * X.shape[1] + [
+            Metafeatures.CATEGORICAL
+        ]
+        expected_mfs = Metafeatures().compute(
+            pd.DataFrame(X), pd.Series(Y, name=X.shape[1]), seed=0,
+            column_types=dict(enumerate(column_types))
+        )
+        metafeatures = Metafeatures()
+        computed_mfs = metafeatures.compute(
+            X, Y, column_types=column_types, seed=0
+        )
+        # the numeric kernels run on X itself
+        self.assertTrue(np.shares_memory(
+            metafeatures._resources["NumericFeatureValues"][
+                Metafeatures.VALUE_KEY
+            ], X
+        ))
+        for mf_id, result in expected_mfs.items():
+            value = result[Metafeatures.VALUE_KEY]
+            if type(value) is str or not np.isnan(value):
+                self.assertEqual(
+                    computed_mfs[mf_id][Metafeatures.VALUE_KEY], value, mf_id
+                )
+        with self.assertRaises(ValueError):
+            Metafeatures().compute(X, Y, column_types=column_types[:-1])
+        with self.assertRaises(ValueError):
+            Metafeatures().compute(X, Y[:-1])
+        with self.assertRaises(ValueError):
+            Metafeatures().compute(X[:, 0], Y)
+
+    @unittest.skipUnless(
+        importlib.util.find_spec("pyarrow"), "requires pyarrow"
+    )
+    def test_arrow_input(self):
+        import pyarrow as pa
+        from metalearn.metafeatures import arrow
+
+        X = self.dummy_features.copy()
+        X.columns = [f"feature_{col}" for col in X.columns]
+        X.iloc[::7, 3] = np.nan
+        X["empty"] = np.nan
+        data = pd.concat([X, self.dummy_target], axis=1)
+        sample_shape = (None, 5)
+        mf_ids = [
+            "MeanMeansOfNumericFeatures", "MeanSkewnessOfNumericFeatures",
+            "NumberOfClasses"
+        ]
+        read_columns = []
+        read = arrow.ArrowSource.read
+
+        def record_read(source, columns):
+            read_columns.append(list(columns))
+            return read(source, columns)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            parquet_path = os.path.join(tmp_dir, "data.parquet")
+            data.to_parquet(parquet_path)
+            for source in [pa.Table.from_pandas(data), parquet_path]:
+                for ids, shape in [(None, None), (mf_ids, sample_shape)]:
+                    expected_mfs = Metafeatures().compute(
+                        X, self.dummy_target, metafeature_ids=ids,
+                        sample_shape=shape, seed=0
+                    )
+                    arrow.ArrowSource.read = record_read
+                    try:
+                        computed_mfs = Metafeatures().compute(
+                            source, "target", metafeature_ids=ids,
+                            sample_shape=shape, seed=0
+                        )
+                    finally:
+                        arrow.ArrowSource.read = read
+                    for mf_id, result in expected_mfs.items():
+                        value = result[Metafeatures.VALUE_KEY]
+                        if type(value) is str or not np.isnan(value):
+                            self.assertEqual(
+                                computed_mfs[mf_id][Metafeatures.VALUE_KEY],
+                                value, mf_id
+                            )
+                # only the sampled columns and the targets are read
+                self.assertEqual(len(read_columns[-1]), sample_shape[1] + 1)
+        with self.assertRaises(ValueError):
+            Metafeatures().compute(pa.Table.from_pandas(data), "class")
+
+    def test_joint_entropy_distinct_pairs(self):
+        # ("1", "12") and ("11", "2") are distinct pairs, even though their
+        # string concatenations are equal
+        X = pd.DataFrame({"feature": ["1", "11"] * 10})
+        Y = pd.Series(["12", "2"] * 10, name="class")
+        mf_ids = [
+            "MeanCategoricalJointEntropy", "MeanCategoricalMutualInformation"
+        ]
+        computed_mfs = Metafeatures().compute(
+            X, Y, metafeature_ids=mf_ids
+        )
+        for mf_id in mf_ids:
+            self.assertTrue(math.isclose(
+                computed_mfs[mf_id][Metafeatures.VALUE_KEY], np.log(2)
+            ))
+
+    def test_canonical_correlations_match_cca(self):
+        """
+        Tests the closed form canonical correlations against fitting a CCA
+        model on each pair of (one-hot encoded) columns.
+        """
+        from sklearn.cross_decomposition import CCA
+
+        rng = np.random.RandomState(0)
+        X = pd.DataFrame({
+            "num_1": rng.randn(100),
+            "cat_1": rng.choice(["a", "b", "c"], size=100),
+            "num_2": rng.randn(100),
+            "cat_2": rng.choice(["d", "e"], size=100)
+        })
+        X["num_2"] += X["num_1"]
+        X.loc[rng.rand(100) < .2, "num_1"] = np.nan
+        X.loc[rng.rand(100) < .2, "cat_2"] = np.nan
+        column_types = {
+            "num_1": "NUMERIC", "cat_1": "CATEGORICAL", "num_2": "NUMERIC",
+            "cat_2": "CATEGORICAL"
+        }
+
+        expected = []
+        for col_i, col_j in itertools.combinations(X.columns, 2):
+            X_ij = X[[col_i, col_j]].dropna()
+            encoded = [
+                pd.get_dummies(X_ij[col]).values.astype(float)
+                if column_types[col] == "CATEGORICAL" else
+                X_ij[[col]].values for col in [col_i, col_j]
+            ]
+            col_i_c, col_j_c = CCA(
+                n_components=1, max_iter=5000, tol=1e-12
+            ).fit_transform(*encoded)
+            expected.append(np.corrcoef(col_i_c.T, col_j_c.T)[0,1])
+
+        computed = get_canonical_correlations(X, column_types)
+        self.assertEqual(len(expected), len(computed))
+        for expected_value, computed_value in zip(expected, computed):
+            self.assertAlmostEqual(expected_value, computed_value, places=8)
+
     def test_n_folds_with_small_dataset(self):
         # should raise error with small (few instances) dataset
         # unless not computing landmarking mfs